@@ -11,6 +11,7 @@ from django.contrib import messages
 
 # 引入自定义Admin基类
 from anime_rec_system.admin import BaseModelAdmin
+from .covers import cover_thumbnail_url
 from .models import AnimeType, Anime
 
 
@@ -144,7 +145,7 @@ class AnimeAdmin(BaseModelAdmin):
         if obj.cover:
             return format_html(
                 '<img src="{}" width="50" height="70" style="object-fit: cover;" />',
-                obj.cover.url
+                cover_thumbnail_url(obj.cover, 'list')
             )
         return format_html('<span style="color: #999;">无封面</span>')
 
@@ -0,0 +1,186 @@
+# anime/counter_shards.py
+# 动漫计数分片 - 浏览/点赞/收藏/评分的增量随机写入 AnimeCounters 的某个分片行，
+# 热门动漫的并发更新分散到多行；读取时求和叠加，周期任务折叠回 Anime 后从分片中扣回
+
+import logging
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger('django')
+
+# 分片中的计数列(均为增量)
+SHARD_FIELDS = ('view_count', 'like_count', 'favorite_count', 'rating_count', 'rating_sum')
+
+# 折叠时影响热门度的列 - 同一条UPDATE标记热门度待重算
+POPULARITY_FIELDS = {'view_count', 'favorite_count', 'rating_count', 'rating_sum'}
+
+# 全为零的分片行没有待折叠的增量
+_ZERO = Q(**{field: 0 for field in SHARD_FIELDS})
+
+
+def shard_count():
+    return max(1, getattr(settings, 'ANIME_COUNTER_SHARDS', 8))
+
+
+def add(anime_id, **deltas):
+    """单部动漫的增量写入随机分片"""
+    add_many({anime_id: deltas})
+
+
+def add_many(changes):
+    """
+    增量写入随机分片 - 增量组合相同的动漫合并为一条 UPDATE ... WHERE anime_id IN (...) AND shard = s
+
+    分片行按需创建；写入只锁随机选中的一行，不触碰 Anime 行
+
+    Args:
+        changes: {动漫ID: {列: 增量}}
+    """
+    from anime.models import Anime, AnimeCounters
+
+    groups = defaultdict(list)
+    for anime_id, deltas in changes.items():
+        deltas = tuple(sorted((field, delta) for field, delta in deltas.items() if delta))
+        if deltas:
+            groups[deltas].append(int(anime_id))
+
+    for deltas, anime_ids in groups.items():
+        shard = random.randrange(shard_count())
+        updates = {field: F(field) + delta for field, delta in deltas}
+        rows = AnimeCounters.objects.filter(anime_id__in=anime_ids, shard=shard)
+        if rows.update(**updates) == len(anime_ids):
+            continue
+
+        # 首次落到该分片 - 补建缺失的行(并发补建由唯一约束去重)，再写入这部分动漫
+        existing = set(rows.values_list('anime_id', flat=True))
+        missing = list(Anime.objects.filter(pk__in=set(anime_ids) - existing).values_list('pk', flat=True))
+        AnimeCounters.objects.bulk_create(
+            [AnimeCounters(anime_id=anime_id, shard=shard) for anime_id in missing], ignore_conflicts=True)
+        AnimeCounters.objects.filter(anime_id__in=missing, shard=shard).update(**updates)
+
+
+def totals(anime_ids):
+    """
+    未折叠的增量合计
+
+    Returns:
+        {动漫ID: {列: 合计}}，只包含存在非零分片的动漫
+    """
+    from anime.models import AnimeCounters
+
+    anime_ids = list(anime_ids)
+    if not anime_ids:
+        return {}
+    rows = (AnimeCounters.objects.filter(anime_id__in=anime_ids).exclude(_ZERO)
+            .values('anime_id').annotate(**{f'{field}__sum': Sum(field) for field in SHARD_FIELDS}))
+    return {row['anime_id']: {field: row[f'{field}__sum'] or 0 for field in SHARD_FIELDS} for row in rows}
+
+
+def apply_shards(animes, fields):
+    """
+    把未折叠的增量叠加到动漫实例上(只改内存，不保存) - 一次聚合查询覆盖整批实例
+
+    Args:
+        fields: Anime上的计数字段；rating_avg/rating_count按 (平均*数量+增量总和)/(数量+增量数量) 合并
+
+    Returns:
+        animes(便于链式使用)
+    """
+    animes = [anime for anime in animes if anime is not None]
+    pending = totals(anime.pk for anime in animes)
+    if not pending:
+        return animes
+
+    rating = 'rating_avg' in fields or 'rating_count' in fields
+    for anime in animes:
+        deltas = pending.get(anime.pk)
+        if not deltas:
+            continue
+        for field in fields:
+            if field in ('view_count', 'like_count', 'favorite_count') and deltas[field]:
+                setattr(anime, field, max(0, (getattr(anime, field) or 0) + deltas[field]))
+        if rating and (deltas['rating_count'] or deltas['rating_sum']):
+            count = anime.rating_count or 0
+            total = (anime.rating_avg or 0) * count + deltas['rating_sum']
+            count = max(0, count + deltas['rating_count'])
+            if 'rating_avg' in fields:
+                anime.rating_avg = total / count if count else 0
+            if 'rating_count' in fields:
+                anime.rating_count = count
+    return animes
+
+
+def _fold_updates(deltas):
+    """折叠到 Anime 的 SET 子句 - rating_avg 必须排在 rating_count 之前(MySQL按顺序求值)"""
+    deltas = dict(deltas)
+    updates = {}
+    rating_count = deltas.pop('rating_count', 0)
+    rating_sum = deltas.pop('rating_sum', 0.0)
+    if rating_count or rating_sum:
+        new_count = F('rating_count') + rating_count
+        updates['rating_avg'] = Case(
+            When(Q(rating_count__lte=-rating_count), then=Value(0.0)),
+            default=ExpressionWrapper((F('rating_avg') * F('rating_count') + float(rating_sum)) / new_count,
+                                      output_field=FloatField()),
+            output_field=FloatField())
+        if rating_count:
+            updates['rating_count'] = new_count if rating_count > 0 else Greatest(new_count, Value(0))
+    for field, delta in deltas.items():
+        updates[field] = F(field) + delta if delta > 0 else Greatest(F(field) + delta, Value(0))
+    return updates
+
+
+def fold(chunk_size=500):
+    """
+    把分片中的增量折叠回 Anime
+
+    读取分片值后按读到的值扣回(而不是清零)，折叠期间新写入的增量留在分片中；
+    每块的扣回与 Anime 更新在同一事务内，中途失败不会重复计数
+
+    Returns:
+        {'anime': 折叠的动漫数, 'shards': 扣回的分片行数}
+    """
+    from anime.models import Anime, AnimeCounters
+
+    anime_ids = list(AnimeCounters.objects.exclude(_ZERO).values_list('anime_id', flat=True).distinct())
+    stats = {'anime': 0, 'shards': 0}
+    for start in range(0, len(anime_ids), chunk_size):
+        chunk = anime_ids[start:start + chunk_size]
+        with transaction.atomic():
+            rows = list(AnimeCounters.objects.filter(anime_id__in=chunk).exclude(_ZERO)
+                        .values_list('pk', 'anime_id', *SHARD_FIELDS))
+
+            shard_groups = defaultdict(list)
+            anime_totals = defaultdict(lambda: defaultdict(int))
+            for pk, anime_id, *values in rows:
+                vector = tuple((field, value) for field, value in zip(SHARD_FIELDS, values) if value)
+                shard_groups[vector].append(pk)
+                for field, value in vector:
+                    anime_totals[anime_id][field] += value
+
+            for vector, pks in shard_groups.items():
+                AnimeCounters.objects.filter(pk__in=pks).update(
+                    **{field: F(field) - value for field, value in vector})
+
+            anime_groups = defaultdict(list)
+            for anime_id, deltas in anime_totals.items():
+                vector = tuple(sorted((field, value) for field, value in deltas.items() if value))
+                if vector:
+                    anime_groups[vector].append(anime_id)
+            for vector, ids in anime_groups.items():
+                updates = _fold_updates(vector)
+                if POPULARITY_FIELDS.intersection(field for field, _ in vector):
+                    updates['popularity_dirty'] = True
+                Anime.objects.filter(pk__in=ids).update(**updates)
+
+        stats['anime'] += len(anime_totals)
+        stats['shards'] += len(rows)
+
+    if stats['anime']:
+        logger.info(f"计数分片折叠完成: 动漫 {stats['anime']} 部, 分片 {stats['shards']} 行")
+    return stats
@@ -0,0 +1,146 @@
+# anime/covers.py
+# 封面存储 - 按内容哈希去重存储原图，并用Pillow生成固定尺寸缩略图(列表/卡片/详情)
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger('django')
+
+# 缩略图规格 - 宽×高，统一2:3竖版海报比例，按中心裁剪填满
+THUMBNAIL_SIZES = {
+    'list': (160, 240),
+    'card': (300, 450),
+    'detail': (600, 900),
+}
+
+# 内容寻址存储目录: anime_covers/sha/<前两位>/<sha256>.<扩展名>
+COVER_HASH_DIR = 'anime_covers/sha'
+
+_FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+# 已确认存在的缩略图 - 缩略图生成后不会变化，进程内记忆避免重复stat
+_known_thumbnails = set()
+# 确认尚未生成的缩略图 -> 到期时刻(time.monotonic)；短期记忆，到期后重新stat，以便及时切到新生成的缩略图
+_missing_thumbnails = {}
+MISSING_THUMBNAIL_TTL = 30
+_known_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _thumbnail_format():
+    """缩略图格式 - Pillow支持WebP时用WebP，否则JPEG"""
+    from PIL import features
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def thumbnail_name(cover_name, size):
+    """缩略图存储路径 - 与原图同目录: <原图名>.<规格>.<webp|jpg>"""
+    stem = os.path.splitext(cover_name)[0]
+    return f"{stem}.{size}.{_thumbnail_format()[1]}"
+
+
+def store_cover(content, storage=None):
+    """
+    按内容哈希存储封面原图 - 相同图片只存一份
+
+    Args:
+        content: 图片二进制内容
+
+    Returns:
+        存储相对路径(可直接赋给Anime.cover)，内容不是可识别的图片时返回None
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    storage = storage or default_storage
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.warning(f"封面不是有效图片: {str(e)}")
+        return None
+
+    digest = hashlib.sha256(content).hexdigest()
+    extension = _FORMAT_EXTENSIONS.get(image_format, 'jpg')
+    name = f"{COVER_HASH_DIR}/{digest[:2]}/{digest}.{extension}"
+    if not storage.exists(name):
+        # 并发写入同一内容时存储后端会改名，以实际保存的路径为准
+        name = storage.save(name, ContentFile(content))
+    return name
+
+
+def generate_thumbnails(cover_name, storage=None, sizes=None):
+    """
+    为封面生成全部规格的缩略图，已存在的跳过
+
+    Returns:
+        {规格: 缩略图路径}，原图无法读取时返回空字典
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    sizes = sizes or THUMBNAIL_SIZES
+    image_format, _ = _thumbnail_format()
+    generated = {}
+
+    pending = {size: thumbnail_name(cover_name, size) for size in sizes}
+    pending = {size: name for size, name in pending.items() if not storage.exists(name)}
+    if not pending:
+        return {size: thumbnail_name(cover_name, size) for size in sizes}
+
+    try:
+        with storage.open(cover_name, 'rb') as f:
+            with Image.open(f) as source:
+                source = ImageOps.exif_transpose(source).convert('RGB')
+    except (OSError, ValueError) as e:
+        logger.error(f"读取封面失败: {cover_name}, 错误: {str(e)}")
+        return {}
+
+    for size, name in pending.items():
+        thumbnail = ImageOps.fit(source, THUMBNAIL_SIZES[size], Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, image_format, quality=82, optimize=image_format == 'JPEG')
+        if not storage.exists(name):
+            storage.save(name, ContentFile(buffer.getvalue()))
+        generated[size] = name
+
+    with _known_lock:
+        _known_thumbnails.update(generated.values())
+        for name in generated.values():
+            _missing_thumbnails.pop(name, None)
+    return {size: thumbnail_name(cover_name, size) for size in sizes}
+
+
+def cover_thumbnail_url(cover, size='card'):
+    """
+    封面缩略图URL - 缩略图尚未生成时回退到原图URL
+
+    Args:
+        cover: Anime.cover(FieldFile)或存储相对路径
+        size: list / card / detail
+    """
+    name = getattr(cover, 'name', cover)
+    if not name:
+        return None
+    storage = getattr(cover, 'storage', None) or default_storage
+    thumb = thumbnail_name(name, size)
+    if thumb not in _known_thumbnails:
+        now = time.monotonic()
+        if _missing_thumbnails.get(thumb, 0) > now:
+            return storage.url(name)
+        if not storage.exists(thumb):
+            with _known_lock:
+                _missing_thumbnails[thumb] = now + MISSING_THUMBNAIL_TTL
+            return storage.url(name)
+        with _known_lock:
+            _known_thumbnails.add(thumb)
+            _missing_thumbnails.pop(thumb, None)
+    return storage.url(thumb)
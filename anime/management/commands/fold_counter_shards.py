@@ -0,0 +1,16 @@
+# anime/management/commands/fold_counter_shards.py
+from django.core.management.base import BaseCommand
+
+from anime.counter_shards import fold
+
+
+class Command(BaseCommand):
+    help = '把动漫计数分片折叠回动漫表 - 供cron等未启用Celery beat的环境定期调用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每个事务折叠的动漫数')
+
+    def handle(self, *args, **options):
+        stats = fold(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"计数分片折叠完成: 动漫 {stats['anime']} 部, 分片 {stats['shards']} 行"))
@@ -0,0 +1,44 @@
+# anime/management/commands/generate_cover_thumbnails.py
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+
+from anime.covers import COVER_HASH_DIR, store_cover, generate_thumbnails
+from anime.models import Anime
+
+
+class Command(BaseCommand):
+    help = '为已有封面补生成缩略图，可选按内容哈希迁移并去重原图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dedupe', action='store_true',
+                            help='将未按内容哈希存储的封面迁移到哈希目录(相同图片合并为一份)')
+
+    def handle(self, *args, **options):
+        covers = (Anime.objects.exclude(cover='').exclude(cover__isnull=True)
+                  .values_list('cover', flat=True).distinct())
+        processed = moved = failed = 0
+
+        for cover_name in covers.iterator():
+            if not default_storage.exists(cover_name):
+                self.stderr.write(f"封面文件不存在: {cover_name}")
+                failed += 1
+                continue
+
+            target = cover_name
+            if options['dedupe'] and not cover_name.startswith(COVER_HASH_DIR):
+                with default_storage.open(cover_name, 'rb') as f:
+                    target = store_cover(f.read())
+                if not target:
+                    self.stderr.write(f"无法识别的封面图片: {cover_name}")
+                    failed += 1
+                    continue
+                # 原文件保留，避免误删仍被外部引用的图片
+                moved += Anime.objects.filter(cover=cover_name).update(cover=target)
+
+            if generate_thumbnails(target):
+                processed += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"处理封面 {processed} 张, 迁移动漫 {moved} 部, 失败 {failed} 张"))
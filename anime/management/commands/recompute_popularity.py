@@ -0,0 +1,20 @@
+# anime/management/commands/recompute_popularity.py
+from django.core.management.base import BaseCommand
+
+from anime.popularity import recompute_popularity
+
+
+class Command(BaseCommand):
+    help = '批量重算动漫热门度 - 供cron等未启用Celery beat的环境定期调用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='没有待重算标记时也整表重算')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='bulk_update每批行数')
+
+    def handle(self, *args, **options):
+        stats = recompute_popularity(force=options['force'], chunk_size=options['chunk_size'])
+        if not stats['dirty'] and not options['force']:
+            self.stdout.write("没有待重算的动漫")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"热门度重算完成: 标记 {stats['dirty']} 部, 共 {stats['total']} 部, 回写 {stats['updated']} 部"))
@@ -0,0 +1,57 @@
+# 外部ID映射表 + 从描述文本标记回填
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 历史标记: quantum_id_mapper写入"Kaggle ID: N"，爬虫描述回退文本写入"ID: N"(MyAnimeList)
+KAGGLE_MARKER = re.compile(r'Kaggle ID: (\d+)')
+SCRAPER_MARKER = re.compile(r'(?<!Kaggle )\bID: (\d+)')
+
+
+def backfill_external_ids(apps, schema_editor):
+    Anime = apps.get_model('anime', 'Anime')
+    AnimeExternalId = apps.get_model('anime', 'AnimeExternalId')
+
+    batch = []
+    rows = Anime.objects.filter(description__contains='ID: ').values_list('id', 'description')
+    for anime_id, description in rows.iterator(chunk_size=2000):
+        for source, pattern in (('kaggle', KAGGLE_MARKER), ('myanimelist', SCRAPER_MARKER)):
+            match = pattern.search(description or '')
+            if match:
+                batch.append(AnimeExternalId(anime_id=anime_id, source=source, external_id=match.group(1)))
+        if len(batch) >= 1000:
+            AnimeExternalId.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+
+    if batch:
+        AnimeExternalId.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimeExternalId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('source', models.CharField(choices=[('myanimelist', 'MyAnimeList'), ('kaggle', 'Kaggle')], max_length=30, verbose_name='数据源')),
+                ('external_id', models.CharField(max_length=64, verbose_name='外部ID')),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='external_ids', to='anime.anime', verbose_name='动漫')),
+            ],
+            options={
+                'verbose_name': '外部ID映射',
+                'verbose_name_plural': '外部ID映射列表',
+                'indexes': [models.Index(fields=['anime', 'source'], name='anime_extid_anime_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'external_id'), name='anime_extid_source_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_external_ids, migrations.RunPython.noop),
+    ]
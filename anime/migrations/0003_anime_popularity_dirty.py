@@ -0,0 +1,25 @@
+# 热门度待重算标记 - 信号只置位，周期任务批量重算
+
+from django.db import migrations, models
+
+
+def mark_all_dirty(apps, schema_editor):
+    # 已有数据全部标记，首次周期任务按统一口径重算一遍
+    Anime = apps.get_model('anime', 'Anime')
+    Anime.objects.update(popularity_dirty=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0002_animeexternalid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anime',
+            name='popularity_dirty',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='热门度待重算'),
+        ),
+        migrations.RunPython(mark_all_dirty, migrations.RunPython.noop),
+    ]
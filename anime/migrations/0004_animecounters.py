@@ -0,0 +1,32 @@
+# 动漫计数分片表 - 计数写入分散到多行，周期折叠回动漫表
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0003_anime_popularity_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimeCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='分片号')),
+                ('view_count', models.IntegerField(default=0, verbose_name='浏览次数增量')),
+                ('like_count', models.IntegerField(default=0, verbose_name='点赞次数增量')),
+                ('favorite_count', models.IntegerField(default=0, verbose_name='收藏次数增量')),
+                ('rating_count', models.IntegerField(default=0, verbose_name='评分数量增量')),
+                ('rating_sum', models.FloatField(default=0, verbose_name='评分总和增量')),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='anime.anime', verbose_name='动漫')),
+            ],
+            options={
+                'verbose_name': '动漫计数分片',
+                'verbose_name_plural': '动漫计数分片列表',
+                'constraints': [models.UniqueConstraint(fields=('anime', 'shard'), name='anime_counter_shard_uniq')],
+            },
+        ),
+    ]
@@ -36,17 +36,34 @@ class AnimeType(TimeStampedModel):
         verbose_name_plural = "动漫类型列表"
         ordering = ['name']  # 默认按名称排序
 
+    @staticmethod
+    def slug_base(name):
+        """slug基础部分 - 批量导入预先计算slug时与save()保持一致"""
+        # 尝试基于name生成slug
+        slug_base = slugify(name)
+
+        # 如果slugify结果为空（例如纯中文名称）
+        if not slug_base:
+            # 使用name哈希值作为备选，确保确定性
+            name_hash = abs(hash(name)) % 100000
+            slug_base = f"type-{name_hash}"
+        return slug_base
+
+    @classmethod
+    def unique_slug(cls, name, taken):
+        """在已占用slug集合taken中为name分配唯一slug(递增计数器)"""
+        slug_base = cls.slug_base(name)
+        counter = 0
+        slug = slug_base
+        while slug in taken:
+            counter += 1
+            slug = f"{slug_base}-{counter}"
+        return slug
+
     def save(self, *args, **kwargs):
         # 0x01: 量子加固版slug生成器 - 支持多语言与边缘情况处理
         if not self.slug:
-            # 尝试基于name生成slug
-            slug_base = slugify(self.name)
-
-            # 如果slugify结果为空（例如纯中文名称）
-            if not slug_base:
-                # 使用name哈希值作为备选，确保确定性
-                name_hash = abs(hash(self.name)) % 100000
-                slug_base = f"type-{name_hash}"
+            slug_base = self.slug_base(self.name)
 
             # 确保唯一性的递增计数器
             counter = 0
@@ -100,6 +117,8 @@ class Anime(TimeStampedModel):
     view_count = models.PositiveIntegerField(default=0, verbose_name="浏览次数")
     favorite_count = models.PositiveIntegerField(default=0, verbose_name="收藏次数")
     like_count = models.PositiveIntegerField(default=0, verbose_name="点赞次数") #动漫点赞
+    # 计数器变化后置位，由周期任务批量重算热门度后清除
+    popularity_dirty = models.BooleanField(default=False, db_index=True, verbose_name="热门度待重算")
 
     # 内容标识
     is_featured = models.BooleanField(default=False, verbose_name="是否推荐")
@@ -119,30 +138,40 @@ class Anime(TimeStampedModel):
         ]
         ordering = ['-popularity', '-release_date']
 
+    @staticmethod
+    def build_slug(title, anime_uuid):
+        """
+        由标题与UUID计算slug，不访问数据库 - save()与批量导入共用
+
+        Returns:
+            "标题slug-uuid前8位"，标题无法slugify时以标题md5代替
+        """
+        # 获取基本slug部分（从标题）
+        base_slug = slugify(title) if title else 'anime'
+
+        # 如果slugify结果为空（纯中文等）
+        if not base_slug or base_slug == 'anime':
+            # 使用拼音转换或直接基于ID生成
+            import hashlib
+            # 使用标题的哈希作为备选
+            title_hash = hashlib.md5((title or '').encode('utf-8')).hexdigest()[:8]
+            base_slug = f"anime-{title_hash}"
+
+        # 从UUID中提取前8位十六进制数作为唯一标识
+        uuid_hex = str(anime_uuid).replace('-', '')[:8]
+
+        # 组合最终slug：标题-uuid前8位
+        return f"{base_slug}-{uuid_hex}"
+
     def save(self, *args, **kwargs):
         # 0x02: 量子级增强slug生成器 - 高防碰撞与容错设计
         if not self.slug:
-            # 获取基本slug部分（从标题）
-            base_slug = slugify(self.title) if self.title else 'anime'
-
-            # 如果slugify结果为空（纯中文等）
-            if not base_slug or base_slug == 'anime':
-                # 使用拼音转换或直接基于ID生成
-                import hashlib
-                # 使用标题的哈希作为备选
-                title_hash = hashlib.md5(self.title.encode('utf-8')).hexdigest()[:8]
-                base_slug = f"anime-{title_hash}"
-
             # 加入UUID前8位作为确保唯一性的量子指纹
             # 确保UUID已经存在，否则生成新的
             if not self.uuid:
                 self.uuid = uuid.uuid4()
 
-            # 从UUID中提取前8位十六进制数作为唯一标识
-            uuid_hex = str(self.uuid).replace('-', '')[:8]
-
-            # 组合最终slug：标题-uuid前8位
-            self.slug = f"{base_slug}-{uuid_hex}"
+            self.slug = self.build_slug(self.title, self.uuid)
 
             # 诊断日志
             logger.info(f"为动漫 '{self.title}' 生成slug: {self.slug}")
@@ -157,6 +186,73 @@ class Anime(TimeStampedModel):
         计算动漫热门指数
         热门指数 = 平均评分*0.4 + 标准化评分数*0.3 + 标准化浏览数*0.2 + 标准化收藏数*0.1
         """
-        # 这里仅占位，实际计算将在信号或后台任务中完成
+        # 只标记待重算，实际计算由周期任务(anime.popularity.recompute_popularity)批量完成
         # 避免高频更新导致的性能问题
-        pass
\ No newline at end of file
+        from anime.popularity import mark_popularity_dirty
+        mark_popularity_dirty(self.pk)
+
+
+class AnimeExternalId(TimeStampedModel):
+    """
+    外部数据源ID映射：(数据源, 外部ID) → 动漫
+    替代原先追加在描述中的"ID: xxx"/"Kaggle ID: xxx"文本标记，查重和跨源关联走索引
+    """
+    SOURCE_MYANIMELIST = 'myanimelist'
+    SOURCE_KAGGLE = 'kaggle'
+    SOURCE_CHOICES = [
+        (SOURCE_MYANIMELIST, 'MyAnimeList'),
+        (SOURCE_KAGGLE, 'Kaggle'),
+    ]
+
+    anime = models.ForeignKey(
+        Anime,
+        on_delete=models.CASCADE,
+        related_name='external_ids',
+        verbose_name="动漫"
+    )
+    source = models.CharField(max_length=30, choices=SOURCE_CHOICES, verbose_name="数据源")
+    external_id = models.CharField(max_length=64, verbose_name="外部ID")
+
+    class Meta:
+        verbose_name = "外部ID映射"
+        verbose_name_plural = "外部ID映射列表"
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'external_id'], name='anime_extid_source_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['anime', 'source'], name='anime_extid_anime_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source}:{self.external_id} → {self.anime_id}"
+
+
+class AnimeCounters(models.Model):
+    """
+    动漫计数分片 - 每部动漫最多 COUNTER_SHARDS 行，写入随机落到其中一行，
+    热门动漫的并发计数更新分散到多行，不再争用 Anime 行锁
+
+    各列保存尚未折叠回 Anime 的增量(可为负)，读取时求和叠加，周期任务折叠后扣回
+    """
+    anime = models.ForeignKey(
+        Anime,
+        on_delete=models.CASCADE,
+        related_name='counter_shards',
+        verbose_name="动漫"
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name="分片号")
+    view_count = models.IntegerField(default=0, verbose_name="浏览次数增量")
+    like_count = models.IntegerField(default=0, verbose_name="点赞次数增量")
+    favorite_count = models.IntegerField(default=0, verbose_name="收藏次数增量")
+    rating_count = models.IntegerField(default=0, verbose_name="评分数量增量")
+    rating_sum = models.FloatField(default=0, verbose_name="评分总和增量")
+
+    class Meta:
+        verbose_name = "动漫计数分片"
+        verbose_name_plural = "动漫计数分片列表"
+        constraints = [
+            models.UniqueConstraint(fields=['anime', 'shard'], name='anime_counter_shard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.anime_id}#{self.shard}"
@@ -0,0 +1,99 @@
+# anime/popularity.py
+# 热门度批量重算 - 写入路径只把动漫标记为"待重算"，
+# 周期任务一次载入全部动漫的计数器，用NumPy向量化归一化后分块bulk_update
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger('django')
+
+# 热门度 = 平均评分*0.4 + 标准化评分数*0.3 + 标准化浏览数*0.2 + 标准化收藏数*0.1
+POPULARITY_WEIGHTS = (
+    ('rating_avg', 0.4),
+    ('rating_count', 0.3),
+    ('view_count', 0.2),
+    ('favorite_count', 0.1),
+)
+
+# 平均评分满分 - 评分按满分归一化，其余计数按全表最大值归一化
+RATING_SCALE = 5.0
+
+# 变化小于该值的行不回写
+CHANGE_EPSILON = 1e-9
+
+
+def mark_popularity_dirty(anime_id):
+    """标记动漫热门度待重算 - 已标记时不产生写入"""
+    from anime.models import Anime
+
+    Anime.objects.filter(pk=anime_id, popularity_dirty=False).update(popularity_dirty=True)
+
+
+def compute_popularity(rating_avg, rating_count, view_count, favorite_count):
+    """
+    向量化计算热门度(0-1)
+
+    Args:
+        各参数为等长的NumPy数组，对应全部动漫的计数器
+    """
+    popularity = np.clip(rating_avg, 0, None) / RATING_SCALE * POPULARITY_WEIGHTS[0][1]
+    for values, (_, weight) in zip((rating_count, view_count, favorite_count), POPULARITY_WEIGHTS[1:]):
+        # 最大值至少为1，防止除零
+        popularity += values / max(1.0, float(values.max(initial=0))) * weight
+    return popularity
+
+
+def recompute_popularity(force=False, chunk_size=1000):
+    """
+    重算全部动漫热门度
+
+    归一化基准(各计数的最大值)随任意动漫变化而移动，因此只要有动漫被标记就整表重算；
+    先清除本轮读到的标记再读计数器，重算期间新增的标记留给下一轮
+
+    Args:
+        force: 没有待重算标记时也执行
+        chunk_size: bulk_update每批行数
+
+    Returns:
+        {'dirty': 本轮处理的标记数, 'total': 动漫总数, 'updated': 实际回写行数}
+    """
+    from anime.models import Anime
+    from anime.counter_shards import fold
+    from recommendation.counters import flush
+    from users.browse_log import rollup
+
+    # 先回写缓冲中的收藏增量、汇总浏览事件并折叠计数分片，保证本轮读到最新计数
+    flush()
+    rollup()
+    fold()
+
+    dirty_ids = list(Anime.objects.filter(popularity_dirty=True).values_list('pk', flat=True))
+    stats = {'dirty': len(dirty_ids), 'total': 0, 'updated': 0}
+    if not dirty_ids and not force:
+        return stats
+
+    for start in range(0, len(dirty_ids), chunk_size):
+        Anime.objects.filter(pk__in=dirty_ids[start:start + chunk_size]).update(popularity_dirty=False)
+
+    fields = ['pk', 'popularity'] + [name for name, _ in POPULARITY_WEIGHTS]
+    rows = np.array(list(Anime.objects.values_list(*fields).iterator(chunk_size=5000)), dtype=np.float64)
+    stats['total'] = len(rows)
+    if not len(rows):
+        return stats
+
+    rows = np.nan_to_num(rows)
+    pks = rows[:, 0].astype(np.int64)
+    current = rows[:, 1]
+    popularity = compute_popularity(rows[:, 2], rows[:, 3], rows[:, 4], rows[:, 5])
+
+    changed = np.flatnonzero(np.abs(popularity - current) > CHANGE_EPSILON)
+    for start in range(0, len(changed), chunk_size):
+        batch = changed[start:start + chunk_size]
+        Anime.objects.bulk_update(
+            [Anime(pk=int(pks[i]), popularity=float(popularity[i])) for i in batch],
+            ['popularity'])
+    stats['updated'] = int(len(changed))
+
+    logger.info(f"热门度重算完成: 标记 {stats['dirty']} 部, 共 {stats['total']} 部, 回写 {stats['updated']} 部")
+    return stats
@@ -0,0 +1,16 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def cover_thumb(cover, size='card'):
+    """
+    封面缩略图URL，缩略图尚未生成时回退到原图
+    用法: {{ anime.cover|cover_thumb:'card' }}  (list / card / detail)
+    """
+    from anime.covers import cover_thumbnail_url
+
+    if not cover:
+        return ''
+    return cover_thumbnail_url(cover, size) or ''
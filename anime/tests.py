@@ -1,3 +1,92 @@
-from django.test import TestCase
-#anine/tests.py
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from anime import counter_shards
+from anime.counter_shards import add, apply_shards, fold, totals
+from anime.models import Anime, AnimeType
+from recommendation.models import UserRating
+from recommendation.signals import suspend_signals
+
+RATING_FIELDS = ['rating_avg', 'rating_count']
+
+
+class CounterShardFoldTests(TestCase):
+    """计数分片折叠 - 折叠后的 Anime 与读取时叠加分片得到的值一致，分片按读到的值扣回"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with suspend_signals():
+            anime_type = AnimeType.objects.create(name='TV')
+            cls.anime = Anime.objects.create(title='Test', type=anime_type, description='x',
+                                             release_date='2020-01-01')
+        cls.first = User.objects.create_user('first', password='x')
+        cls.second = User.objects.create_user('second', password='x')
+
+    def fold_and_compare(self, fields):
+        """叠加分片读到的值与折叠后的 Anime 一致，折叠后分片清空；返回折叠后的 Anime"""
+        overlaid = apply_shards([Anime.objects.get(pk=self.anime.pk)], fields)[0]
+        fold()
+        folded = Anime.objects.get(pk=self.anime.pk)
+        for field in fields:
+            self.assertAlmostEqual(getattr(folded, field), getattr(overlaid, field), msg=field)
+        self.assertEqual(totals([self.anime.pk]), {})
+        return folded
+
+    def test_rating_insert_update_delete(self):
+        first = UserRating.objects.create(user=self.first, anime=self.anime, rating=4.0)
+        second = UserRating.objects.create(user=self.second, anime=self.anime, rating=2.0)
+        anime = self.fold_and_compare(RATING_FIELDS)
+        self.assertEqual(anime.rating_count, 2)
+        self.assertAlmostEqual(anime.rating_avg, 3.0)
+        self.assertTrue(anime.popularity_dirty)
+
+        # 修改与删除的增量在同一次折叠中合并: (3.0*2 + (5-4) - 2) / (2 - 1)
+        first.rating = 5.0
+        first.save()
+        second.delete()
+        anime = self.fold_and_compare(RATING_FIELDS)
+        self.assertEqual(anime.rating_count, 1)
+        self.assertAlmostEqual(anime.rating_avg, 5.0)
+
+        # 删除最后一个评分 - 数量归零时平均评分为0，不做除零
+        first.delete()
+        anime = self.fold_and_compare(RATING_FIELDS)
+        self.assertEqual((anime.rating_count, anime.rating_avg), (0, 0))
+
+    def test_insert_and_delete_before_fold(self):
+        UserRating.objects.create(user=self.first, anime=self.anime, rating=3.0)
+        UserRating.objects.get(user=self.first).delete()
+        UserRating.objects.create(user=self.second, anime=self.anime, rating=4.0)
+        anime = self.fold_and_compare(RATING_FIELDS)
+        self.assertEqual(anime.rating_count, 1)
+        self.assertAlmostEqual(anime.rating_avg, 4.0)
+
+    def test_negative_deltas_are_clamped_at_zero(self):
+        Anime.objects.filter(pk=self.anime.pk).update(like_count=2)
+        add(self.anime.pk, like_count=-5, view_count=3)
+        # 评分数量已为0时的删除增量(如全量重算与增量交错)
+        add(self.anime.pk, rating_count=-1, rating_sum=-4.0)
+        anime = self.fold_and_compare(['like_count', 'view_count'] + RATING_FIELDS)
+        self.assertEqual((anime.like_count, anime.view_count), (0, 3))
+        self.assertEqual((anime.rating_count, anime.rating_avg), (0, 0))
+
+    @override_settings(ANIME_COUNTER_SHARDS=1)
+    def test_fold_subtracts_read_values(self):
+        add(self.anime.pk, view_count=2, favorite_count=1)
+        fold_updates = counter_shards._fold_updates
+
+        def write_during_fold(vector):
+            # 折叠读取分片之后、提交之前又写入的增量 - 扣回读到的值而不是清零，新增量留在分片中
+            add(self.anime.pk, view_count=5)
+            return fold_updates(vector)
+
+        with mock.patch.object(counter_shards, '_fold_updates', side_effect=write_during_fold):
+            self.assertEqual(fold(), {'anime': 1, 'shards': 1})
+        anime = Anime.objects.get(pk=self.anime.pk)
+        self.assertEqual((anime.view_count, anime.favorite_count), (2, 1))
+        self.assertEqual(totals([self.anime.pk])[self.anime.pk]['view_count'], 5)
+
+        fold()
+        self.assertEqual(Anime.objects.get(pk=self.anime.pk).view_count, 7)
@@ -4,19 +4,20 @@ from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg
 from django.views.decorators.http import require_POST
 from django.urls import reverse
-from django.utils import timezone
 from django.views.decorators.cache import cache_page
 from django.conf import settings
 import json
 import logging
 import traceback
 
+from .covers import cover_thumbnail_url, generate_thumbnails
 from .models import Anime, AnimeType
 from .forms import AnimeForm, AnimeTypeForm, AnimeSearchForm
-from users.models import UserBrowsing, UserPreference
+from users import browse_log
+from recommendation import counters, services
 
 # 配置日志记录器
 logger = logging.getLogger('django')
@@ -133,29 +134,14 @@ def toggle_like(request, anime_id):
     """
     anime = get_object_or_404(Anime, id=anime_id)
 
-    # 使用AnimeLike而不是UserLike
-    from recommendation.models import AnimeLike
-
-    like, created = AnimeLike.objects.get_or_create(
-        user=request.user,
-        anime=anime,
-    )
-
-    # 如果已存在则删除（取消点赞）
-    if not created:
-        like.delete()
-        action = 'removed'
-        message = f'已取消点赞《{anime.title}》'
-    else:
+    # 点赞记录、计数与偏好由写入服务一次完成，点赞数为 数据库值+未回写增量
+    liked, like_count = services.toggle_anime_like(request.user, anime)
+    if liked:
         action = 'added'
         message = f'已成功点赞《{anime.title}》'
-
-    # 获取动漫当前点赞数
-    like_count = AnimeLike.objects.filter(anime=anime).count()
-
-    # 更新动漫的点赞计数
-    anime.like_count = like_count
-    anime.save(update_fields=['like_count'])
+    else:
+        action = 'removed'
+        message = f'已取消点赞《{anime.title}》'
 
     return JsonResponse({
         'status': 'success',
@@ -207,49 +193,18 @@ def anime_detail(request, slug):
             raise Http404("动漫不存在")
 
         # ===== 记录用户浏览历史 =====
+        # 只追加浏览事件(不访问数据库)，浏览记录与动漫浏览数由周期汇总任务更新
         if request.user.is_authenticated:
             try:
-                # 引入事务管理
-                from django.db import transaction
-
-                # 使用原子事务确保浏览记录和计数的一致性
-                with transaction.atomic():
-                    # 更新或创建浏览记录
-                    browse_record, created = UserBrowsing.objects.get_or_create(
-                        user=request.user,
-                        anime=anime,
-                        defaults={'browse_count': 1}
-                    )
-
-                    logger.debug(f"浏览记录: user={request.user.id}, anime={anime.id}, created={created}, "
-                                 f"当前browse_count={browse_record.browse_count if not created else 1}")
-
-                    # 如果记录已存在，增加浏览次数
-                    if not created:
-                        # 直接使用F表达式进行原子更新，避免竞态条件
-                        UserBrowsing.objects.filter(
-                            user=request.user,
-                            anime=anime
-                        ).update(
-                            browse_count=F('browse_count') + 1,
-                            last_browsed=timezone.now()
-                        )
-
-                        # 重新获取更新后的记录，用于日志记录
-                        browse_record.refresh_from_db()
-                        logger.debug(f"更新后browse_count={browse_record.browse_count}")
-
-                    # 增加动漫的总浏览次数
-                    Anime.objects.filter(pk=anime.pk).update(view_count=F('view_count') + 1)
-
-                # 刷新对象以获取更新的值
-                anime.refresh_from_db()
-                logger.debug(f"动漫'{anime.title}'总浏览次数更新为: {anime.view_count}")
-
+                browse_log.record(request.user.id, anime.pk)
             except Exception as e:
                 # 浏览记录失败不影响主流程
                 logger.error(f"记录浏览历史失败: {str(e)}\n{traceback.format_exc()}")
 
+        # 计数与评分叠加未回写/未折叠的增量
+        counters.apply_pending('anime', [anime],
+                               ['view_count', 'like_count', 'favorite_count', 'rating_avg', 'rating_count'])
+
         # ===== 加载相关数据 =====
         # 获取同类型的相关推荐（排除当前动漫）
         try:
@@ -286,6 +241,9 @@ def anime_detail(request, slug):
                 paginated_comments = comment_paginator.page(comment_paginator.num_pages)
                 recent_comments = paginated_comments
 
+            paginated_comments.object_list = counters.apply_pending(
+                'comment', paginated_comments.object_list, ['like_count'])
+
         except Exception as e:
             logger.error(f"获取评论失败: {str(e)}\n{traceback.format_exc()}")
             # 设置默认空值以避免模板错误
@@ -379,6 +337,8 @@ def anime_create(request):
             # 将初始热门度设为0
             anime.popularity = 0
             anime.save()
+            if anime.cover:
+                generate_thumbnails(anime.cover.name)
 
             messages.success(request, f'动漫《{anime.title}》已成功添加！')
             return redirect('anime:anime_detail', slug=anime.slug)
@@ -420,6 +380,9 @@ def anime_edit(request, slug):
         form = AnimeForm(request.POST, request.FILES, instance=anime)
         if form.is_valid():
             updated_anime = form.save()
+            # 上传了新封面时同步生成缩略图
+            if 'cover' in form.changed_data and updated_anime.cover:
+                generate_thumbnails(updated_anime.cover.name)
             messages.success(request, f'动漫《{updated_anime.title}》已成功更新！')
             return redirect('anime:anime_detail', slug=updated_anime.slug)
         else:
@@ -585,7 +548,7 @@ def anime_search(request):
 
         # 处理封面图片URL
         if item['cover']:
-            result_item['cover'] = f"{settings.MEDIA_URL}{item['cover']}"
+            result_item['cover'] = cover_thumbnail_url(item['cover'], 'list')
 
         results_list.append(result_item)
 
@@ -746,20 +709,12 @@ def rate_anime(request, anime_id):
     if not (0 < rating <= 5):
         return JsonResponse({'status': 'error', 'message': '评分必须在1-5之间'}, status=400)
 
-    # 更新或创建评分
-    from recommendation.models import UserRating
-
-    UserRating.objects.update_or_create(
-        user=request.user,
-        anime=anime,
-        defaults={'rating': rating}
-    )
-
-    # 触发信号处理器更新动漫评分统计
-    # 在signals.py中已实现
+    # 评分服务完成upsert、增量统计、偏好与推荐刷新
+    _, _, new_avg = services.rate_anime(request.user, anime, rating)
 
     return JsonResponse({
         'status': 'success',
+        'new_avg': round(new_avg, 1),
         'message': f'成功为《{anime.title}》评分'
     })
 
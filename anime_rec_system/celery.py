@@ -7,6 +7,34 @@ app.autodiscover_tasks()
 
 @app.task
 def update_recommendations(user_id):
-    """量子异步更新用户推荐数据"""
-    from recommendation.engine.recommendation_engine import recommendation_engine
-    recommendation_engine.update_recommendations_cache(user_id)
\ No newline at end of file
+    """量子异步更新用户推荐数据 - 由交互写入去抖后入队(recommendation.services.refresh_recommendations)"""
+    from recommendation.services import run_recommendation_refresh
+    run_recommendation_refresh(user_id)
+
+
+@app.task
+def recompute_popularity(force=False):
+    """周期重算全部动漫热门度 - 只有存在待重算标记时才执行"""
+    from anime.popularity import recompute_popularity as recompute
+    return recompute(force=force)
+
+
+@app.task
+def flush_counters():
+    """周期回写浏览/点赞/收藏计数缓冲"""
+    from recommendation.counters import flush
+    return flush()
+
+
+@app.task
+def fold_counter_shards():
+    """周期把动漫计数分片折叠回动漫表"""
+    from anime.counter_shards import fold
+    return fold()
+
+
+@app.task
+def rollup_browse_events():
+    """周期把浏览事件汇总进浏览记录与动漫浏览数"""
+    from users.browse_log import rollup
+    return rollup()
@@ -245,6 +245,51 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 爬虫HTTP磁盘缓存(gzip正文 + ETag/Last-Modified条件请求)
+SCRAPER_HTTP_CACHE_DIR = os.path.join(BASE_DIR, 'scraper_cache', 'http')
+
+# 爬取前沿(SQLite) - 记录列表页与详情URL处理进度，支持中断后续爬
+SCRAPER_FRONTIER_PATH = os.path.join(BASE_DIR, 'scraper_cache', 'frontier.sqlite3')
+
+# 热门度批量重算周期(秒) - 由Celery beat调度 recompute_popularity 任务
+POPULARITY_RECOMPUTE_INTERVAL = 300
+
+# 写后缓冲计数器 - 浏览/点赞/收藏增量的回写间隔(秒)与使用的缓存别名
+COUNTER_FLUSH_INTERVAL = 30
+COUNTER_CACHE_ALIAS = 'counters'
+
+# 动漫计数分片 - 每部动漫的分片行数，以及分片折叠回动漫表的间隔(秒)
+ANIME_COUNTER_SHARDS = 8
+ANIME_COUNTER_FOLD_INTERVAL = 120
+
+# 浏览事件 - 缓冲批量插入的间隔(秒)，以及汇总进浏览记录与动漫浏览数的间隔(秒)
+BROWSE_EVENT_FLUSH_INTERVAL = 10
+BROWSE_ROLLUP_INTERVAL = 60
+
+# 推荐刷新去抖窗口(秒) - 评分/收藏/点赞/评论后，窗口内的多次交互合并为一次异步推荐缓存刷新；
+# 去抖标记与推荐结果都在默认缓存中，Web进程与Celery worker需共用Redis/Memcached才能命中刷新结果
+RECOMMENDATION_REFRESH_DEBOUNCE = 60
+
+# Celery beat 周期任务
+CELERY_BEAT_SCHEDULE = {
+    'recompute-popularity': {
+        'task': 'anime_rec_system.celery.recompute_popularity',
+        'schedule': POPULARITY_RECOMPUTE_INTERVAL,
+    },
+    'flush-counters': {
+        'task': 'anime_rec_system.celery.flush_counters',
+        'schedule': COUNTER_FLUSH_INTERVAL,
+    },
+    'fold-counter-shards': {
+        'task': 'anime_rec_system.celery.fold_counter_shards',
+        'schedule': ANIME_COUNTER_FOLD_INTERVAL,
+    },
+    'rollup-browse-events': {
+        'task': 'anime_rec_system.celery.rollup_browse_events',
+        'schedule': BROWSE_ROLLUP_INTERVAL,
+    },
+}
+
 # 默认主键字段类型
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -271,7 +316,17 @@ CACHES = {
             'MAX_ENTRIES': 1000,
             'CULL_FREQUENCY': 3,  # 三振出局策略
         },
-    }
+    },
+    # 计数缓冲 - 条目不能被淘汰，也不设过期: 进程内后端用不淘汰的LocMemCache子类(MAX_ENTRIES只触发清理过期条目)；
+    # 多进程部署需换成共享的Redis(关闭maxmemory淘汰)，否则各进程只回写自己的增量，读取时也只能叠加本进程的增量
+    'counters': {
+        'BACKEND': 'anime_rec_system.utils.cache_backends.NonEvictingLocMemCache',
+        'LOCATION': 'counters',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
 
 # 或者更优选择 - Redis
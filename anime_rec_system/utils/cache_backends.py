@@ -0,0 +1,23 @@
+import logging
+
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger('django')
+
+
+class NonEvictingLocMemCache(LocMemCache):
+    """
+    不淘汰的进程内缓存 - 供计数缓冲/浏览事件日志使用
+
+    LocMemCache条目数达到MAX_ENTRIES时会按CULL_FREQUENCY删掉最旧的一批，
+    缓冲中的增量与槽位会被静默丢弃；这里只清理已过期的条目，未过期的一律保留，
+    清理后仍然超限时把上限翻倍并记录警告(说明缓冲回写跟不上或该换Redis)
+    """
+
+    def _cull(self):
+        expired = [key for key in self._cache if self._has_expired(key)]
+        for key in expired:
+            self._delete(key)
+        if len(self._cache) >= self._max_entries:
+            self._max_entries *= 2
+            logger.warning(f"计数缓存条目超过上限，上限调整为 {self._max_entries}")
@@ -3,11 +3,105 @@
 import pandas as pd
 import numpy as np
 from django.db import models
-from typing import List, Dict, Tuple, Optional, Any, Union
+from typing import List, Dict, Tuple, Optional, Any, Union, Iterator
 import logging
 
 logger = logging.getLogger('django')
 
+PAIR_COLUMNS = ['user_id', 'anime_id', 'rating']
+
+
+class PairKeySet:
+    """
+    紧凑(user_id, anime_id)哈希集合 - 流式去重用
+
+    两个ID打包成一个int64键，存放于开放寻址(线性探测)的numpy数组中，
+    每个键仅占8字节；Python set存同样的键约需十倍内存
+    """
+
+    EMPTY = -1
+    MAX_LOAD = 0.7
+    # Fibonacci哈希乘子
+    HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, capacity: int = 1 << 16):
+        bits = max(4, int(np.ceil(np.log2(max(capacity, 16) / self.MAX_LOAD))))
+        self._allocate(bits)
+        self.size = 0
+
+    def _allocate(self, bits: int) -> None:
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.table = np.full(1 << bits, self.EMPTY, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def pack(user_ids, anime_ids) -> np.ndarray:
+        """打包键 - 高32位用户ID，低32位动漫ID(ID须为非负)"""
+        return (np.asarray(user_ids, dtype=np.int64) << 32) | \
+            (np.asarray(anime_ids, dtype=np.int64) & 0xFFFFFFFF)
+
+    def _slots(self, keys: np.ndarray) -> np.ndarray:
+        hashed = keys.astype(np.uint64) * self.HASH_MULTIPLIER
+        return (hashed >> np.uint64(64 - self.bits)).astype(np.int64)
+
+    def _grow(self, required: int) -> None:
+        old_keys = self.table[self.table != self.EMPTY]
+        bits = self.bits
+        while required > (1 << bits) * self.MAX_LOAD:
+            bits += 1
+        self._allocate(bits)
+        self._insert(old_keys)
+
+    def _insert(self, keys: np.ndarray) -> np.ndarray:
+        """向量化线性探测插入(keys需已批内去重)，返回各键是否为新键"""
+        is_new = np.zeros(len(keys), dtype=bool)
+        pending = np.arange(len(keys))
+        slots = self._slots(keys)
+
+        while pending.size:
+            pending_keys = keys[pending]
+            pending_slots = slots[pending]
+            current = self.table[pending_slots]
+
+            resolved = current == pending_keys
+            empty = np.flatnonzero(current == self.EMPTY)
+            if empty.size:
+                # 同批键争抢同一空槽时只有一个写入成功，其余继续探测
+                self.table[pending_slots[empty]] = pending_keys[empty]
+                won = empty[self.table[pending_slots[empty]] == pending_keys[empty]]
+                is_new[pending[won]] = True
+                resolved[won] = True
+
+            pending = pending[~resolved]
+            slots[pending] = (slots[pending] + 1) & self.mask
+
+        return is_new
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """
+        批量插入
+
+        Returns:
+            与keys对齐的布尔掩码 - True表示首次出现(批内重复只保留第一次)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if keys.size == 0:
+            return np.zeros(0, dtype=bool)
+
+        unique_keys, first_index = np.unique(keys, return_index=True)
+        if self.size + len(unique_keys) > len(self.table) * self.MAX_LOAD:
+            self._grow(self.size + len(unique_keys))
+
+        inserted = self._insert(unique_keys)
+        self.size += int(inserted.sum())
+
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[first_index[inserted]] = True
+        return mask
+
 
 class QuantumDataAdapter:
     """
@@ -23,10 +117,23 @@ class QuantumDataAdapter:
     def __init__(self):
         self.db_data = None
         self.raw_data = None
+        self.db_queryset = None
+        self.db_fields = None
         self.fusion_mode = "concat"  # 可选: concat, merge, weighted
 
-    def load_from_database(self, queryset, value_fields) -> None:
-        """从数据库加载训练数据"""
+    def load_from_database(self, queryset, value_fields, lazy: bool = False) -> None:
+        """
+        从数据库加载训练数据
+
+        lazy=True时只记录查询，由iter_fused_chunks分批游标读取，不整表载入内存
+        """
+        if lazy:
+            self.db_data = None
+            self.db_queryset = queryset
+            self.db_fields = list(value_fields)
+            logger.info("数据库通道设置为流式读取")
+            return
+
         self.db_data = pd.DataFrame(list(queryset.values(*value_fields)))
         logger.info(f"从数据库加载了 {len(self.db_data)} 条记录")
 
@@ -56,8 +163,9 @@ class QuantumDataAdapter:
                 logger.error(f"文件不存在: {normalized_path}")
                 raise FileNotFoundError(f"找不到文件: {normalized_path}")
 
-            # 尝试读取CSV
-            df = pd.read_csv(normalized_path)
+            # 尝试读取CSV - 经列式缓存，重复加载同一文件时免去全量解析
+            from recommendation.columnar_cache import read_csv_cached
+            df = read_csv_cached(normalized_path)
             logger.info(f"成功读取CSV，列名: {list(df.columns)}")
 
             # 更健壮的列映射逻辑
@@ -112,6 +220,10 @@ class QuantumDataAdapter:
 
     def get_fused_data(self) -> pd.DataFrame:
         """获取融合后的训练数据"""
+        if self.db_data is None and self.db_queryset is not None:
+            # 流式设置下请求全量数据 - 按需一次性载入
+            self.load_from_database(self.db_queryset, self.db_fields)
+
         if self.db_data is None and self.raw_data is None:
             raise ValueError("无可用数据源 - 请先加载数据")
 
@@ -133,18 +245,107 @@ class QuantumDataAdapter:
 
         elif self.fusion_mode == "weighted":
             # 高级加权融合 - 数据库数据权重更高
-            merged = pd.concat([self.db_data, self.raw_data])
-            # 标记来源
-            self.db_data['source'] = 'db'
-            self.raw_data['source'] = 'raw'
+            # 标记来源 - 须在合并前标记
+            merged = pd.concat([self.db_data.assign(source='db'),
+                                self.raw_data.assign(source='raw')])
             # 按用户和动漫分组，优先保留数据库记录
-            return merged.sort_values('source').drop_duplicates(
+            return merged.sort_values('source', kind='stable').drop_duplicates(
                 subset=['user_id', 'anime_id'], keep='first').drop('source', axis=1)
 
         return None
 
-    def prepare_training_data(self) -> Tuple[np.ndarray, np.ndarray]:
-        """准备训练数据并进行特征工程"""
+    # ==================== 流式融合 ====================
+
+    def _iter_db_blocks(self, block_size: int) -> Iterator[pd.DataFrame]:
+        """数据库通道分块 - 已载入的DataFrame直接切片，否则走服务端游标"""
+        if self.db_data is not None:
+            yield from self._iter_frame_blocks(self.db_data, block_size)
+            return
+        if self.db_queryset is None:
+            return
+
+        rows = []
+        for row in self.db_queryset.values_list(*self.db_fields).iterator(chunk_size=block_size):
+            rows.append(row)
+            if len(rows) >= block_size:
+                yield pd.DataFrame(rows, columns=self.db_fields)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=self.db_fields)
+
+    @staticmethod
+    def _iter_frame_blocks(df: Optional[pd.DataFrame], block_size: int) -> Iterator[pd.DataFrame]:
+        """DataFrame分块 - load_from_csv得到的是内存映射列，切片不复制整表"""
+        if df is None:
+            return
+        for start in range(0, len(df), block_size):
+            yield df.iloc[start:start + block_size]
+
+    def iter_fused_chunks(self, chunk_size: int = 100_000,
+                          columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        流式融合 - 逐块产出固定大小的训练数据(最后一块可能不足)
+
+        数据库通道在前、原始数据通道在后；merge/weighted模式下
+        (user_id, anime_id)重复时保留先出现的记录，即优先数据库数据，
+        与get_fused_data语义一致，但任意时刻只持有一个块和紧凑键集合
+        """
+        if self.db_data is None and self.db_queryset is None and self.raw_data is None:
+            raise ValueError("无可用数据源 - 请先加载数据")
+
+        columns = list(columns or PAIR_COLUMNS)
+        seen = PairKeySet() if self.fusion_mode in ("merge", "weighted") else None
+
+        sources = (self._iter_db_blocks(chunk_size),
+                   self._iter_frame_blocks(self.raw_data, chunk_size))
+
+        buffer: List[pd.DataFrame] = []
+        buffered = 0
+        total = 0
+        for source in sources:
+            for block in source:
+                block = block[columns]
+                if seen is not None:
+                    keep = seen.add(PairKeySet.pack(block['user_id'].to_numpy(),
+                                                    block['anime_id'].to_numpy()))
+                    block = block[keep]
+                if block.empty:
+                    continue
+
+                buffer.append(block)
+                buffered += len(block)
+                while buffered >= chunk_size:
+                    merged = pd.concat(buffer, ignore_index=True)
+                    yield merged.iloc[:chunk_size]
+                    total += chunk_size
+                    rest = merged.iloc[chunk_size:]
+                    buffer = [rest] if len(rest) else []
+                    buffered = len(rest)
+
+        if buffered:
+            total += buffered
+            yield pd.concat(buffer, ignore_index=True)
+
+        logger.info(f"流式融合完成: 共产出 {total} 条记录"
+                    + (f"，去重键 {len(seen)} 个" if seen is not None else ""))
+
+    def iter_training_data(self, chunk_size: int = 100_000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """逐块产出(X, y) - 供partial_fit等增量学习器使用"""
+        for chunk in self.iter_fused_chunks(chunk_size=chunk_size):
+            yield chunk[['user_id', 'anime_id']].to_numpy(), chunk['rating'].to_numpy()
+
+    def prepare_training_data(self, chunk_size: Optional[int] = None):
+        """
+        准备训练数据并进行特征工程
+
+        Args:
+            chunk_size: 指定时改为返回(X, y)块迭代器，不在内存中拼接全量数据，
+                        例如: for X, y in adapter.prepare_training_data(chunk_size=100000):
+                                  estimator.partial_fit(X, y)
+        """
+        if chunk_size:
+            return self.iter_training_data(chunk_size=chunk_size)
+
         data = self.get_fused_data()
 
         if data is None or len(data) < 50:  # 保留最小数据量检查
@@ -176,4 +377,11 @@ adapter.set_fusion_mode('concat')
 
 # 获取训练数据
 X, y = adapter.prepare_training_data()
+
+# 海量数据流式训练 - 数据库通道游标读取，CSV通道内存映射
+adapter.load_from_database(UserRating.objects.all(),
+                          ['user_id', 'anime_id', 'rating'], lazy=True)
+adapter.set_fusion_mode('merge')
+for X_batch, y_batch in adapter.prepare_training_data(chunk_size=100000):
+    estimator.partial_fit(X_batch, y_batch)
 """
\ No newline at end of file
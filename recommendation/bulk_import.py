@@ -0,0 +1,185 @@
+# recommendation/bulk_import.py
+# 批量导入模式 - 代码块内挂起推荐系统的信号处理，逐行create不再触发计数/偏好/热门度的级联；
+# 退出时用少量基于集合的SQL对账全部冗余计数与用户偏好
+
+import logging
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Avg, Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .services import LIKE_STRENGTH, REPLY_STRENGTH
+from .signals import preference_value_expression, suspend_signals
+
+logger = logging.getLogger('django')
+
+
+@contextmanager
+def bulk_import(reconcile=True):
+    """
+    批量导入上下文
+
+        with bulk_import():
+            for row in rows:
+                UserRating.objects.create(...)
+
+    Args:
+        reconcile: 退出时是否执行 reconcile_aggregates(代码块抛出异常时不执行)
+    """
+    with suspend_signals():
+        yield
+    if reconcile:
+        reconcile_aggregates()
+
+
+def _count(queryset, group_by):
+    """按group_by分组计数的关联子查询，无记录时为0"""
+    return Coalesce(Subquery(
+        queryset.order_by().values(group_by).annotate(total=Count('pk')).values('total')[:1],
+        output_field=IntegerField()), Value(0))
+
+
+def reconcile_aggregates():
+    """
+    全量对账冗余计数与用户偏好 - 每张表一条带关联子查询的UPDATE
+
+    - 动漫: 评分均值/数量、点赞数、收藏数，并标记热门度待重算(浏览数无明细来源，保持不变)
+    - 评论: 点赞数、回复数
+    - 档案: 评分/评论/回复/点赞(发出、获得)计数，以及影响力与社交活跃度
+    - 互动记录: 补建缺失的点赞/回复互动
+    - 用户偏好: 补建缺失的(用户, 动漫)行，整表按偏好公式重算
+
+    开始前先回写计数缓冲、汇总浏览事件并折叠计数分片，避免未落库的增量在对账后被重复计入；
+    对账期间的并发写入不在一致性保证之内，应在维护窗口或导入脚本中调用
+
+    Returns:
+        {表: 更新行数}
+    """
+    from anime.counter_shards import fold
+    from anime.models import Anime, AnimeCounters
+    from anime.popularity import recompute_popularity
+    from users.browse_log import rollup
+    from users.models import Profile, UserPreference
+    from .counters import flush
+    from .models import AnimeLike, UserComment, UserFavorite, UserInteraction, UserLike, UserRating
+
+    stats = {}
+    try:
+        flush()
+        rollup()
+        fold()
+
+        anime = OuterRef('pk')
+        user = OuterRef('user_id')
+        with transaction.atomic():
+            stats['anime'] = Anime.objects.update(
+                # rating_avg排在rating_count之前，与增量路径保持一致的求值顺序
+                rating_avg=Coalesce(Subquery(
+                    UserRating.objects.filter(anime=anime).order_by().values('anime')
+                    .annotate(avg=Avg('rating')).values('avg')[:1]), Value(0.0)),
+                rating_count=_count(UserRating.objects.filter(anime=anime), 'anime'),
+                like_count=_count(AnimeLike.objects.filter(anime=anime), 'anime'),
+                favorite_count=_count(UserFavorite.objects.filter(anime=anime), 'anime'),
+                popularity_dirty=True,
+            )
+            # 分片中残留的评分/点赞/收藏增量已被全量值覆盖
+            AnimeCounters.objects.update(rating_count=0, rating_sum=0, like_count=0, favorite_count=0)
+
+            stats['comment'] = UserComment.objects.update(
+                like_count=_count(UserLike.objects.filter(comment=OuterRef('pk')), 'comment'),
+                reply_count=0,
+            )
+            _reconcile_reply_counts(UserComment)
+
+            counts = {
+                'rating_count': _count(UserRating.objects.filter(user=user), 'user'),
+                'comment_count': _count(UserComment.objects.filter(user=user), 'user'),
+                'replies_count': _count(UserComment.objects.filter(user=user, is_reply=True), 'user'),
+                'likes_given_count': _count(UserLike.objects.filter(user=user), 'user'),
+                'likes_received_count': _count(UserLike.objects.filter(comment__user=user), 'comment__user'),
+            }
+            stats['profile'] = Profile.objects.update(
+                **counts,
+                influence_score=_score(counts, Profile.INFLUENCE_WEIGHTS),
+                social_activity_score=_score(counts, Profile.SOCIAL_ACTIVITY_WEIGHTS),
+            )
+
+            stats['interaction'] = _create_missing_interactions(UserInteraction, UserLike, UserComment)
+            stats['preference'] = _reconcile_preferences(
+                UserPreference, (UserRating, UserComment, UserFavorite, AnimeLike))
+
+        recompute_popularity()
+        logger.info(f"冗余计数对账完成: {stats}")
+        return stats
+    except Exception as e:
+        logger.error(f"冗余计数对账失败: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
+
+
+def _score(counts, weights):
+    """分数 = Σ 计数 * 权重 - 计数用本条UPDATE中的同一子查询(而不是更新前的列值)"""
+    total = Value(0.0)
+    for field, weight in weights:
+        total = total + counts[field] * Value(weight)
+    return total
+
+
+def _reconcile_reply_counts(UserComment):
+    """
+    回复数 - MySQL不允许UPDATE的子查询读取被更新的表本身，改为一次分组查询，
+    回复数相同的父评论合并为一条 UPDATE ... WHERE id IN (...)
+    """
+    groups = defaultdict(list)
+    rows = (UserComment.objects.filter(parent_comment__isnull=False).order_by()
+            .values_list('parent_comment_id').annotate(total=Count('pk')))
+    for comment_id, total in rows:
+        groups[total].append(comment_id)
+    for total, comment_ids in groups.items():
+        for start in range(0, len(comment_ids), 1000):
+            UserComment.objects.filter(pk__in=comment_ids[start:start + 1000]).update(reply_count=total)
+
+
+def _create_missing_interactions(UserInteraction, UserLike, UserComment):
+    """补建信号挂起期间缺失的点赞/回复互动记录"""
+    likes = (UserLike.objects.filter(~Exists(UserInteraction.objects.filter(like=OuterRef('pk'))))
+             .values_list('pk', 'user_id', 'comment_id', 'comment__user_id'))
+    replies = (UserComment.objects.filter(is_reply=True, parent_comment__isnull=False)
+               .filter(~Exists(UserInteraction.objects.filter(comment=OuterRef('pk'), interaction_type='reply')))
+               .values_list('pk', 'user_id', 'parent_comment__user_id'))
+
+    interactions = [
+        UserInteraction(from_user_id=user_id, to_user_id=to_user_id, interaction_type='like',
+                        comment_id=comment_id, like_id=like_id, strength=LIKE_STRENGTH)
+        for like_id, user_id, comment_id, to_user_id in likes.iterator(chunk_size=2000)
+    ]
+    interactions += [
+        UserInteraction(from_user_id=user_id, to_user_id=to_user_id, interaction_type='reply',
+                        comment_id=comment_id, strength=REPLY_STRENGTH)
+        for comment_id, user_id, to_user_id in replies.iterator(chunk_size=2000)
+    ]
+    UserInteraction.objects.bulk_create(interactions, batch_size=1000)
+    return len(interactions)
+
+
+def _reconcile_preferences(UserPreference, sources):
+    """有交互而缺少偏好行的(用户, 动漫)补建，然后整表一条UPDATE按偏好公式重算"""
+    from users.models import UserBrowsing
+    from .models import UserLike
+
+    pairs = None
+    for model in sources + (UserBrowsing,):
+        queryset = model.objects.order_by().values_list('user_id', 'anime_id')
+        pairs = queryset if pairs is None else pairs.union(queryset)
+    pairs = pairs.union(UserLike.objects.order_by().values_list('user_id', 'comment__anime_id'))
+
+    existing = set(UserPreference.objects.values_list('user_id', 'anime_id').iterator(chunk_size=5000))
+    missing = [UserPreference(user_id=user_id, anime_id=anime_id)
+               for user_id, anime_id in pairs if (user_id, anime_id) not in existing]
+    UserPreference.objects.bulk_create(missing, batch_size=1000, ignore_conflicts=True)
+
+    return UserPreference.objects.update(
+        preference_value=preference_value_expression(OuterRef('user_id'), OuterRef('anime_id')))
@@ -0,0 +1,137 @@
+# recommendation/columnar_cache.py
+# 列式磁盘缓存 - 大体积CSV只解析一次，之后内存映射加载
+
+import json
+import os
+import shutil
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('django')
+
+CACHE_FORMAT_VERSION = 1
+META_FILENAME = 'meta.json'
+
+
+def _downcast_chunk(series: pd.Series) -> np.ndarray:
+    """单列压缩 - 整数/浮点下探到最小可容纳类型，文本转为定长Unicode以便内存映射"""
+    if pd.api.types.is_bool_dtype(series):
+        return series.to_numpy()
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast='integer').to_numpy()
+    if pd.api.types.is_float_dtype(series):
+        return pd.to_numeric(series, downcast='float').to_numpy()
+    return series.fillna('').astype(str).to_numpy(dtype=str)
+
+
+def _merge_chunks(chunks: List[np.ndarray]) -> np.ndarray:
+    """合并分块 - 各块下探类型可能不同，取能容纳全部块的公共类型"""
+    if any(chunk.dtype.kind == 'U' for chunk in chunks):
+        chunks = [chunk.astype(str) for chunk in chunks]
+    return np.concatenate(chunks).astype(np.result_type(*chunks), copy=False)
+
+
+class ColumnarCSVCache:
+    """
+    CSV列式缓存
+
+    布局: <cache_dir>/meta.json + 每列一个.npy文件
+    新鲜度: 记录源文件mtime与大小，任一变化即重建
+    """
+
+    def __init__(self, csv_path: str, cache_dir: Optional[str] = None, chunksize: int = 500_000):
+        self.csv_path = os.path.abspath(os.path.expanduser(csv_path))
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(self.csv_path), '.columnar_cache',
+                                     os.path.basename(self.csv_path))
+        self.cache_dir = cache_dir
+        self.chunksize = chunksize
+
+    def _source_signature(self) -> Dict[str, int]:
+        stat = os.stat(self.csv_path)
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.cache_dir, META_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self) -> bool:
+        """缓存是否与源文件一致"""
+        meta = self._read_meta()
+        if not meta or meta.get('version') != CACHE_FORMAT_VERSION:
+            return False
+        return meta.get('source') == self._source_signature()
+
+    def build(self) -> dict:
+        """分块解析CSV并写入列式缓存 - 先写临时目录再原子替换"""
+        signature = self._source_signature()
+        logger.info(f"构建列式缓存: {self.csv_path} → {self.cache_dir}")
+
+        column_chunks: Dict[str, List[np.ndarray]] = {}
+        columns: List[str] = []
+        rows = 0
+        for chunk in pd.read_csv(self.csv_path, chunksize=self.chunksize, low_memory=False):
+            if not columns:
+                columns = [str(col) for col in chunk.columns]
+            for col in columns:
+                column_chunks.setdefault(col, []).append(_downcast_chunk(chunk[col]))
+            rows += len(chunk)
+
+        tmp_dir = f"{self.cache_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        dtypes = {}
+        for idx, col in enumerate(columns):
+            data = _merge_chunks(column_chunks.pop(col))
+            np.save(os.path.join(tmp_dir, f"{idx}.npy"), data, allow_pickle=False)
+            dtypes[col] = data.dtype.str
+
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'source': signature,
+            'rows': rows,
+            'columns': columns,
+            'dtypes': dtypes,
+        }
+        with open(os.path.join(tmp_dir, META_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(self.cache_dir), exist_ok=True)
+        os.replace(tmp_dir, self.cache_dir)
+
+        logger.info(f"列式缓存完成: {rows} 行, 列类型 {dtypes}")
+        return meta
+
+    def load_columns(self, usecols: Optional[List[str]] = None, mmap: bool = True) -> Dict[str, np.ndarray]:
+        """按列加载 - 缓存过期时自动重建，默认内存映射只读"""
+        meta = self._read_meta() if self.is_fresh() else self.build()
+
+        columns = meta['columns']
+        wanted = columns if usecols is None else list(usecols)
+        missing = [col for col in wanted if col not in columns]
+        if missing:
+            raise ValueError(f"CSV文件缺少列: {missing}")
+
+        mmap_mode = 'r' if mmap else None
+        return {
+            col: np.load(os.path.join(self.cache_dir, f"{columns.index(col)}.npy"),
+                         mmap_mode=mmap_mode, allow_pickle=False)
+            for col in wanted
+        }
+
+    def load_frame(self, usecols: Optional[List[str]] = None) -> pd.DataFrame:
+        """加载为DataFrame"""
+        return pd.DataFrame(self.load_columns(usecols=usecols, mmap=True), copy=False)
+
+
+def read_csv_cached(csv_path: str, usecols: Optional[List[str]] = None, **kwargs) -> pd.DataFrame:
+    """pd.read_csv的缓存替代 - 首次解析后复用列式缓存"""
+    return ColumnarCSVCache(csv_path, **kwargs).load_frame(usecols=usecols)
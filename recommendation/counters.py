@@ -0,0 +1,256 @@
+# recommendation/counters.py
+# 写后缓冲计数器 - 浏览/点赞/收藏计数的增量先在缓存后端中按键原子累加，
+# 周期性地合并成少量批量UPDATE回写 UserComment / Profile，动漫计数写入计数分片；读取时叠加未回写的增量
+
+import logging
+import traceback
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from recommendation.slot_buffer import SlotLog, incr as _incr
+
+logger = logging.getLogger('django')
+
+# 计数目标: 标识 → (模型路径, 定位字段, 允许缓冲的计数字段)
+COUNTER_TARGETS = {
+    'anime': ('anime.Anime', 'pk', ('view_count', 'like_count', 'favorite_count')),
+    'comment': ('recommendation.UserComment', 'pk', ('like_count',)),
+    'profile': ('users.Profile', 'user_id', ('likes_given_count', 'likes_received_count')),
+}
+
+KEY_PREFIX = 'counter'
+FLUSH_LOCK_KEY = f'{KEY_PREFIX}:flush-lock'
+FLUSH_DUE_KEY = f'{KEY_PREFIX}:flush-due'
+
+# 变脏的计数项按顺序登记在槽位日志中，回写时按槽位枚举
+_slots = SlotLog(KEY_PREFIX)
+
+# 回写后归零的累加键的过期时间(秒) - 远大于回写间隔，期间再次累加会恢复为不过期
+ZEROED_KEY_TTL = 3600
+
+
+def _cache():
+    return caches[getattr(settings, 'COUNTER_CACHE_ALIAS', 'default')]
+
+
+def _flush_interval():
+    return getattr(settings, 'COUNTER_FLUSH_INTERVAL', 30)
+
+
+def _member(target, ident, field):
+    return f'{target}:{ident}:{field}'
+
+
+def _keys(member):
+    """增加与减少分别累加 - memcached的decr不能低于0，两个只增不减的键可移植到任意后端"""
+    return f'{KEY_PREFIX}:{member}:+', f'{KEY_PREFIX}:{member}:-', f'{KEY_PREFIX}:{member}:dirty'
+
+
+def increment(target, ident, field, delta=1):
+    """
+    累加计数增量 - 不访问数据库；在事务中调用时等提交后才累加，回滚的写入不计数
+
+    Args:
+        target: COUNTER_TARGETS中的标识(anime / comment / profile)
+        ident: 定位值(动漫/评论主键，档案为用户ID)
+        delta: 正负均可
+    """
+    if not delta:
+        return
+    if field not in COUNTER_TARGETS[target][2]:
+        raise ValueError(f"计数字段不支持缓冲: {target}.{field}")
+    transaction.on_commit(partial(_buffer, target, ident, field, delta))
+
+
+def _buffer(target, ident, field, delta):
+    cache = _cache()
+    member = _member(target, ident, field)
+    plus_key, minus_key, dirty_key = _keys(member)
+    value_key = plus_key if delta > 0 else minus_key
+    buffered = False
+    try:
+        _incr(cache, value_key, abs(delta))
+        buffered = True
+        # 首次变脏时登记到顺序槽位；累加键可能带着归零后的过期时间，恢复为不过期
+        if cache.add(dirty_key, 1, timeout=None):
+            cache.touch(value_key, None)
+            _slots.append(cache, member)
+    except Exception as e:
+        logger.error(f"计数缓冲失败，直接写库: {member}, 错误: {str(e)}")
+        try:
+            if buffered:
+                cache.decr(value_key, abs(delta))
+            # 清除脏标记 - 否则该计数项不会再登记槽位，后续增量一直滞留在缓冲中
+            cache.delete(dirty_key)
+        except Exception:
+            logger.error(traceback.format_exc())
+        _apply({(target, ident): {field: delta}})
+        return
+
+    # 缓冲间隔到期时由当前进程顺带回写(进程内缓存后端也能按时落库)
+    if cache.add(FLUSH_DUE_KEY, 1, timeout=_flush_interval()):
+        flush()
+
+
+def pending(target, idents, fields):
+    """
+    未回写的增量
+
+    Returns:
+        {(定位值, 字段): 增量}，只包含非零项
+    """
+    members = [_member(target, ident, field) for ident in idents for field in fields]
+    if not members:
+        return {}
+    key_map = {}
+    for member in members:
+        plus_key, minus_key, _ = _keys(member)
+        key_map[member] = (plus_key, minus_key)
+    try:
+        values = _cache().get_many([key for pair in key_map.values() for key in pair])
+    except Exception as e:
+        logger.error(f"读取计数缓冲失败: {str(e)}")
+        return {}
+
+    deltas = {}
+    for ident in idents:
+        for field in fields:
+            plus_key, minus_key = key_map[_member(target, ident, field)]
+            delta = values.get(plus_key, 0) - values.get(minus_key, 0)
+            if delta:
+                deltas[(ident, field)] = delta
+    return deltas
+
+
+def apply_pending(target, objects, fields):
+    """
+    把未回写的增量叠加到模型实例上(只改内存，不保存) - 一次get_many覆盖整批实例
+
+    动漫可同时传rating_avg/rating_count，按未折叠的评分分片合并
+
+    Returns:
+        objects(便于链式使用)
+    """
+    lookup = COUNTER_TARGETS[target][1]
+    objects = [obj for obj in objects if obj is not None]
+    if target == 'anime':
+        # 动漫计数先叠加尚未折叠的分片增量
+        from anime.counter_shards import apply_shards
+        apply_shards(objects, fields)
+    # 评分等只在分片中的字段没有缓冲键
+    fields = [field for field in fields if field in COUNTER_TARGETS[target][2]]
+    idents = [getattr(obj, lookup) for obj in objects]
+    deltas = pending(target, idents, fields)
+    if deltas:
+        for obj, ident in zip(objects, idents):
+            for field in fields:
+                delta = deltas.get((ident, field))
+                if delta:
+                    setattr(obj, field, max(0, (getattr(obj, field) or 0) + delta))
+    return objects
+
+
+def current(obj, target, field):
+    """单个实例的计数(数据库值 + 未回写增量)"""
+    apply_pending(target, [obj], [field])
+    return getattr(obj, field)
+
+
+def flush():
+    """
+    回写全部缓冲的增量
+
+    顺序: 取槽位 → 清除脏标记 → 读取累加值 → 从累加值中减去已读部分 → 写库；
+    清标记在读值之前，期间的新增量会重新登记，留给下一轮。
+    减到0的累加键设置过期而不是直接删除: 减与删之间并发的累加会随删除丢失。
+    写库失败时把减去的部分加回累加键，槽位不推进，下一轮原样重试
+
+    Returns:
+        回写的计数项数
+    """
+    cache = _cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, timeout=60):
+        return 0
+    try:
+        members, end = _slots.read(cache)
+        # 同一计数项可能登记在多个槽位(如上一轮写库失败后又有新增量)，只取一次
+        members = list(dict.fromkeys(members))
+        if not members:
+            _slots.advance(cache, end)
+            return 0
+
+        cache.delete_many([_keys(member)[2] for member in members])
+        value_keys = [key for member in members for key in _keys(member)[:2]]
+        values = cache.get_many(value_keys)
+
+        changes = defaultdict(dict)
+        taken = []
+        for member in members:
+            plus_key, minus_key, _ = _keys(member)
+            plus, minus = values.get(plus_key, 0), values.get(minus_key, 0)
+            if plus:
+                taken.append((plus_key, plus))
+            if minus:
+                taken.append((minus_key, minus))
+            if plus != minus:
+                target, ident, field = member.split(':')
+                changes[(target, ident)][field] = plus - minus
+
+        zeroed = [key for key, value in taken if cache.decr(key, value) == 0]
+        try:
+            _apply(changes)
+        except Exception as e:
+            # 写库失败 - 加回已减去的部分，槽位留待下一轮重试
+            logger.error(f"计数回写失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            for key, value in taken:
+                _incr(cache, key, value)
+            return 0
+
+        _slots.advance(cache, end)
+        for key in zeroed:
+            cache.touch(key, ZEROED_KEY_TTL)
+        return sum(len(fields) for fields in changes.values())
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _apply(changes):
+    """
+    增量写库 - 动漫计数写入计数分片(anime.counter_shards)，其余按增量组合相同的行
+    合并为一条 UPDATE ... WHERE 定位字段 IN (...)
+
+    Args:
+        changes: {(标识, 定位值): {字段: 增量}}
+    """
+    from django.apps import apps
+    from anime.counter_shards import add_many
+
+    anime_changes = {}
+    groups = defaultdict(list)
+    for (target, ident), fields in changes.items():
+        if target == 'anime':
+            anime_changes[ident] = fields
+        else:
+            groups[(target, tuple(sorted(fields.items())))].append(ident)
+
+    if anime_changes:
+        add_many(anime_changes)
+    for (target, deltas), idents in groups.items():
+        model_path, lookup, _ = COUNTER_TARGETS[target]
+        model = apps.get_model(model_path)
+        if target == 'profile':
+            # 档案的影响力/社交活跃度随计数在同一条UPDATE中更新
+            updates = model.counter_updates(**dict(deltas))
+        else:
+            updates = {
+                field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, Value(0))
+                for field, delta in deltas
+            }
+        model.objects.filter(**{f'{lookup}__in': idents}).update(**updates)
@@ -6,6 +6,7 @@ import joblib
 import pandas as pd
 from sklearn.ensemble import GradientBoostingRegressor
 from django.core.cache import cache
+from django.db.models import Count
 import logging
 import os
 import pickle
@@ -19,6 +20,12 @@ from users.models import UserPreference
 # 配置日志记录器
 logger = logging.getLogger('django')
 
+# 动漫特征列 - 训练与推理共用同一顺序
+ANIME_FEATURE_FIELDS = (
+    'popularity', 'rating_avg', 'rating_count', 'favorite_count',
+    'view_count', 'is_completed', 'is_featured',
+)
+
 
 class GBDTRecommender:
     """
@@ -31,7 +38,7 @@ class GBDTRecommender:
     - Lambda Rank变种排序算法
     """
 
-    def __init__(self, n_estimators=100, learning_rate=0.1, max_depth=5, use_cache=True):
+    def __init__(self, n_estimators=100, learning_rate=0.1, max_depth=5, use_cache=True, prefix=None):
         """
         初始化GBDT推荐器
 
@@ -40,11 +47,13 @@ class GBDTRecommender:
             learning_rate: 学习率
             max_depth: 树的最大深度
             use_cache: 是否使用缓存加速
+            prefix: 模型文件前缀(多数据源各自独立持久化)，None保持默认文件名
         """
         self.n_estimators = n_estimators
         self.learning_rate = learning_rate
         self.max_depth = max_depth
         self.use_cache = use_cache
+        self.prefix = prefix
         self.model = None
         self.user_encoder = None
         self.anime_encoder = None
@@ -54,12 +63,18 @@ class GBDTRecommender:
         # 确保模型目录存在
         os.makedirs(self.model_path, exist_ok=True)
 
-        logger.info("GBDT引擎初始化: trees=%d, lr=%.2f, depth=%d",
-                    n_estimators, learning_rate, max_depth)
+        logger.info("GBDT引擎初始化: trees=%d, lr=%.2f, depth=%d, prefix=%s",
+                    n_estimators, learning_rate, max_depth, prefix or '-')
+
+    def _artifact_path(self, filename):
+        """模型产物路径 - 按数据源前缀隔离"""
+        if self.prefix:
+            filename = f"{self.prefix}_{filename}"
+        return os.path.join(self.model_path, filename)
 
     def prepare_data(self, force_reload=False):
         """获取训练数据"""
-        cache_key = "gbdt_training_data"
+        cache_key = f"gbdt_training_data:{self.prefix}" if self.prefix else "gbdt_training_data"
         if self.use_cache and not force_reload:
             cached_data = cache.get(cache_key)
             if cached_data:
@@ -79,51 +94,18 @@ class GBDTRecommender:
             anime_ids = [r['anime_id'] for r in ratings]
             ratings_vals = [r['rating'] for r in ratings]
 
-            # 编码分类特征
-            self.user_encoder = LabelEncoder()
-            self.anime_encoder = LabelEncoder()
-
-            encoded_users = self.user_encoder.fit_transform(user_ids)
-            encoded_animes = self.anime_encoder.fit_transform(anime_ids)
-
             # 构建动漫特征词典
             anime_features = {}
-            for anime in Anime.objects.all():
+            for row in Anime.objects.values_list('id', *ANIME_FEATURE_FIELDS):
                 # 特征向量化
-                features = [
-                    anime.popularity or 0,
-                    anime.rating_avg or 0,
-                    anime.rating_count or 0,
-                    anime.favorite_count or 0,
-                    anime.view_count or 0,
-                    anime.is_completed or 0,
-                    anime.is_featured or 0
-                ]
-                anime_features[anime.id] = features
-
-            # 构建用户活跃度特征
-            user_ratings_count = {}
-            for uid in user_ids:
-                user_ratings_count[uid] = user_ratings_count.get(uid, 0) + 1
-
-            # 组装特征矩阵
-            X_features = []
-            for i, (user_id, anime_id) in enumerate(zip(user_ids, anime_ids)):
-                # 用户编码ID作为特征
-                user_feat = [encoded_users[i]]
-
-                # 用户活跃度特征
-                user_feat.append(user_ratings_count.get(user_id, 0))
-
-                # 动漫编码ID和特征
-                anime_feat = [encoded_animes[i]] + anime_features.get(anime_id, [0, 0, 0, 0, 0, 0, 0])
-
-                # 连接所有特征
-                X_features.append(user_feat + anime_feat)
-
-            # 标准化数值特征
-            self.feature_scaler = StandardScaler()
-            X = self.feature_scaler.fit_transform(X_features)
+                anime_features[row[0]] = [v or 0 for v in row[1:]]
+
+            default_features = [0] * len(ANIME_FEATURE_FIELDS)
+            feature_matrix = np.array([anime_features.get(aid, default_features) for aid in anime_ids],
+                                      dtype=np.float64)
+
+            # 编码 + 组装 + 标准化
+            X = self.build_training_matrix(np.asarray(user_ids), np.asarray(anime_ids), feature_matrix)
             y = np.array(ratings_vals)
 
             # 缓存训练数据
@@ -140,14 +122,45 @@ class GBDTRecommender:
             logger.error(traceback.format_exc())
             return None, None
 
+    def build_training_matrix(self, user_ids, anime_ids, anime_feature_matrix):
+        """
+        组装训练特征矩阵 - 与推理时的列顺序保持一致
+
+        列: [用户编码, 用户评分数, 动漫编码, *ANIME_FEATURE_FIELDS]
+        同时拟合user/anime编码器和标准化器
+        """
+        # 编码分类特征
+        self.user_encoder = LabelEncoder()
+        self.anime_encoder = LabelEncoder()
+
+        encoded_users = self.user_encoder.fit_transform(user_ids)
+        encoded_animes = self.anime_encoder.fit_transform(anime_ids)
+
+        # 用户活跃度特征 - bincount一次完成计数
+        user_ratings_count = np.bincount(encoded_users)[encoded_users]
+
+        X = np.column_stack([
+            encoded_users, user_ratings_count, encoded_animes, anime_feature_matrix
+        ]).astype(np.float64)
+
+        # 标准化数值特征
+        self.feature_scaler = StandardScaler()
+        return self.feature_scaler.fit_transform(X)
+
     def train_model(self):
         """
         训练系统 - 只使用爬虫数据
         """
-        try:
-            # 准备内部数据
-            X, y = self.prepare_data(force_reload=True)
+        X, y = self.prepare_data(force_reload=True)
+        return self.fit(X, y)
+
+    def fit(self, X, y):
+        """
+        在已编码的特征矩阵上训练并持久化
 
+        X需由build_training_matrix/prepare_data生成，编码器已挂载在实例上
+        """
+        try:
             if X is None or y is None or len(y) < 50:
                 logger.error(f"训练数据量不足({len(y) if y is not None else 0}条)，无法构建鲁棒模型")
                 return False
@@ -185,11 +198,11 @@ class GBDTRecommender:
 
         try:
             # 保存GBDT模型
-            model_file = os.path.join(self.model_path, 'gbdt_model.joblib')
+            model_file = self._artifact_path('gbdt_model.joblib')
             joblib.dump(self.model, model_file, compress=3)
 
             # 保存编码器和缩放器
-            encoders_file = os.path.join(self.model_path, 'gbdt_encoders.pkl')
+            encoders_file = self._artifact_path('gbdt_encoders.pkl')
             with open(encoders_file, 'wb') as f:
                 pickle.dump({
                     'user_encoder': self.user_encoder,
@@ -208,12 +221,12 @@ class GBDTRecommender:
         """加载持久化模型 - 快速恢复机制"""
         try:
             # 加载GBDT模型
-            model_file = os.path.join(self.model_path, 'gbdt_model.joblib')
+            model_file = self._artifact_path('gbdt_model.joblib')
             if os.path.exists(model_file):
                 self.model = joblib.load(model_file)
 
                 # 加载编码器和缩放器
-                encoders_file = os.path.join(self.model_path, 'gbdt_encoders.pkl')
+                encoders_file = self._artifact_path('gbdt_encoders.pkl')
                 if os.path.exists(encoders_file):
                     with open(encoders_file, 'rb') as f:
                         encoders = pickle.load(f)
@@ -232,62 +245,159 @@ class GBDTRecommender:
             return False
 
     def predict(self, user_id, anime_id):
-        """用户-动漫对的评分预测"""
+        """用户-动漫对的评分预测 - 批量接口的单点包装"""
+        preds = self.predict_many([(user_id, anime_id)])
+        if preds is None or len(preds) == 0:
+            return None
+        return float(preds[0])
+
+    def predict_many(self, pairs):
+        """
+        批量用户-动漫对评分预测 - 两次批量查询 + 一次向量化推理
+
+        参数:
+            pairs: [(user_id, anime_id), ...]
+
+        返回:
+            与pairs顺序对齐的np.ndarray(评分已限制在1-5)，模型不可用时返回None
+        """
         if self.model is None:
             # 尝试加载模型
             if not self.load_model():
                 return None
 
+        pairs = list(pairs)
+        if not pairs:
+            return np.empty(0, dtype=np.float64)
+
         try:
-            # 获取动漫特征
-            try:
-                anime = Anime.objects.get(id=anime_id)
-                anime_features = [
-                    anime.popularity or 0,
-                    anime.rating_avg or 0,
-                    anime.rating_count or 0,
-                    anime.favorite_count or 0,
-                    anime.view_count or 0,
-                    anime.is_completed or 0,
-                    anime.is_featured or 0
-                ]
-            except:
-                anime_features = [0, 0, 0, 0, 0, 0, 0]
+            user_ids = np.array([p[0] for p in pairs])
+            anime_ids = np.array([p[1] for p in pairs])
 
-            # 获取用户特征
-            ratings_count = UserRating.objects.filter(user_id=user_id).count()
+            # 批量查询1: 动漫特征
+            anime_features = self._fetch_anime_features(np.unique(anime_ids).tolist())
 
-            # 编码用户和动漫ID
-            try:
-                user_encoded = self.user_encoder.transform([user_id])[0]
-            except:
-                # 冷启动用户保护机制
-                user_encoded = 0
+            # 批量查询2: 用户活跃度
+            ratings_count = self._fetch_user_rating_counts(np.unique(user_ids).tolist())
 
-            try:
-                anime_encoded = self.anime_encoder.transform([anime_id])[0]
-            except:
-                # 冷启动动漫保护机制
-                anime_encoded = 0
+            return self._score_matrix(user_ids, anime_ids, anime_features, ratings_count)
 
-            # 构建特征向量
-            features = [[user_encoded, ratings_count, anime_encoded] + anime_features]
+        except Exception as e:
+            logger.error("GBDT批量预测异常: %s", str(e))
+            logger.error(traceback.format_exc())
+            return None
 
-            # 特征标准化
-            X = self.feature_scaler.transform(features)
+    def score_user(self, user_id, anime_ids):
+        """
+        单用户多候选批量打分
+
+        返回:
+            [(anime_id, pred), ...] 保持anime_ids原有顺序，模型不可用时返回空列表
+        """
+        anime_ids = list(anime_ids)
+        preds = self.predict_many([(user_id, anime_id) for anime_id in anime_ids])
+        if preds is None:
+            return []
+        return list(zip(anime_ids, preds.tolist()))
+
+    def predict_with_similar_features(self, pairs, anime_id_map=None):
+        """
+        跨ID空间批量预测 - 外部数据源模型(如Kaggle)为本地用户-动漫对打分
+
+        本地用户不在外部模型的用户空间内，统一按冷启动编码；
+        动漫通过anime_id_map映射到外部ID编码，未映射的仅依赖本地动漫特征近似。
+
+        参数:
+            pairs: [(本地user_id, 本地anime_id), ...]
+            anime_id_map: {本地anime_id: 外部anime_id}
 
-            # 预测评分
-            pred = self.model.predict(X)[0]
+        返回:
+            与pairs顺序对齐的np.ndarray，模型不可用时返回None
+        """
+        if self.model is None:
+            if not self.load_model():
+                return None
 
-            # 限制评分范围
-            pred = max(1.0, min(5.0, pred))
+        pairs = list(pairs)
+        if not pairs:
+            return np.empty(0, dtype=np.float64)
 
-            return pred
+        try:
+            user_ids = np.array([p[0] for p in pairs])
+            anime_ids = np.array([p[1] for p in pairs])
+
+            anime_features = self._fetch_anime_features(np.unique(anime_ids).tolist())
+            ratings_count = self._fetch_user_rating_counts(np.unique(user_ids).tolist())
+
+            return self._score_similar(user_ids, anime_ids, anime_features, ratings_count, anime_id_map)
 
         except Exception as e:
-            logger.error("GBDT预测评分异常: %s", str(e))
+            logger.error("GBDT跨空间预测异常: %s", str(e))
+            logger.error(traceback.format_exc())
             return None
 
+    def _score_similar(self, user_ids, anime_ids, anime_features, ratings_count, anime_id_map=None):
+        """跨ID空间打分 - 用户按冷启动编码，动漫按映射后的外部ID编码"""
+        anime_id_map = anime_id_map or {}
+        # 未映射动漫用-1占位，必然落入冷启动编码
+        external_ids = np.array([anime_id_map.get(aid, -1) for aid in anime_ids.tolist()])
+
+        return self._score_matrix(
+            user_ids, anime_ids, anime_features, ratings_count,
+            user_codes=np.zeros(len(user_ids), dtype=np.int64),
+            anime_keys=external_ids,
+        )
+
+    def _fetch_anime_features(self, anime_ids):
+        """批量获取动漫特征 - 单次IN查询"""
+        rows = Anime.objects.filter(id__in=anime_ids).values_list('id', *ANIME_FEATURE_FIELDS)
+        return {row[0]: [v or 0 for v in row[1:]] for row in rows}
+
+    def _fetch_user_rating_counts(self, user_ids):
+        """批量获取用户评分数量 - 单次GROUP BY查询"""
+        rows = UserRating.objects.filter(user_id__in=user_ids) \
+            .values('user_id').annotate(cnt=Count('id')).values_list('user_id', 'cnt')
+        return dict(rows)
+
+    @staticmethod
+    def _encode_ids(encoder, ids):
+        """
+        向量化ID编码 - 等价于LabelEncoder.transform，但未知ID编码为0(冷启动保护)
+        """
+        ids = np.asarray(ids)
+        if encoder is None or len(encoder.classes_) == 0:
+            return np.zeros(len(ids), dtype=np.int64)
+
+        classes = encoder.classes_
+        pos = np.clip(np.searchsorted(classes, ids), 0, len(classes) - 1)
+        return np.where(classes[pos] == ids, pos, 0)
+
+    def _score_matrix(self, user_ids, anime_ids, anime_features, ratings_count,
+                      user_codes=None, anime_keys=None):
+        """
+        组装特征矩阵并一次性推理
+
+        user_codes: 直接指定用户编码(跨ID空间时使用)
+        anime_keys: 用于动漫编码的ID(默认即anime_ids)
+        """
+        default_features = [0] * len(ANIME_FEATURE_FIELDS)
+        if user_codes is None:
+            user_codes = self._encode_ids(self.user_encoder, user_ids)
+        if anime_keys is None:
+            anime_keys = anime_ids
+
+        X = np.empty((len(user_ids), 3 + len(ANIME_FEATURE_FIELDS)), dtype=np.float64)
+        X[:, 0] = user_codes
+        X[:, 1] = [ratings_count.get(uid, 0) for uid in user_ids.tolist()]
+        X[:, 2] = self._encode_ids(self.anime_encoder, anime_keys)
+        X[:, 3:] = [anime_features.get(aid, default_features) for aid in anime_ids.tolist()]
+
+        # 特征标准化 + 批量预测
+        preds = self.model.predict(self.feature_scaler.transform(X))
+
+        # 限制评分范围
+        return np.clip(preds, 1.0, 5.0)
+
     def get_recommendations(self, user_id, limit=10, exclude_rated=True):
         """用GBDT模型生成推荐 - 全局最优解方法"""
         if self.model is None:
@@ -298,9 +408,7 @@ class GBDTRecommender:
 
         try:
             # 获取所有动漫 - O(n)访问优化
-            all_animes = list(Anime.objects.values('id', 'popularity', 'rating_avg',
-                                                   'rating_count', 'favorite_count', 'view_count',
-                                                   'is_completed', 'is_featured'))
+            all_animes = list(Anime.objects.values_list('id', *ANIME_FEATURE_FIELDS))
 
             # 获取用户已评分的动漫 - 哈希集合O(1)查找
             if exclude_rated:
@@ -311,49 +419,26 @@ class GBDTRecommender:
             # 获取用户特征
             ratings_count = UserRating.objects.filter(user_id=user_id).count()
 
-            # 编码用户ID
-            try:
-                user_encoded = self.user_encoder.transform([user_id])[0]
-            except:
-                user_encoded = 0
-
             # 候选集过滤 - 剪枝优化
-            candidate_animes = [anime for anime in all_animes if anime['id'] not in rated_animes]
+            candidate_animes = [anime for anime in all_animes if anime[0] not in rated_animes]
 
-            # 按照流行度排序取topK - 先验概率加速
-            candidate_animes = sorted(candidate_animes, key=lambda x: x['popularity'] or 0, reverse=True)[
+            # 按照流行度排序取topK - 先验概率加速 (popularity为首个特征列)
+            candidate_animes = sorted(candidate_animes, key=lambda x: x[1] or 0, reverse=True)[
                                :min(100, len(candidate_animes))]
+            if not candidate_animes:
+                return []
+
+            # 快速预测 - 整个候选集一次向量化推理
+            anime_ids = np.array([anime[0] for anime in candidate_animes])
+            anime_features = {anime[0]: [v or 0 for v in anime[1:]] for anime in candidate_animes}
+            preds = self._score_matrix(
+                np.full(len(anime_ids), user_id), anime_ids,
+                anime_features, {user_id: ratings_count}
+            )
 
-            # 快速预测 - 批量操作
-            predictions = []
-            for anime in candidate_animes:
-                # 编码动漫ID
-                try:
-                    anime_encoded = self.anime_encoder.transform([anime['id']])[0]
-                except:
-                    anime_encoded = 0
-
-                # 构建特征向量
-                features = [[
-                    user_encoded,
-                    ratings_count,
-                    anime_encoded,
-                    anime['popularity'] or 0,
-                    anime['rating_avg'] or 0,
-                    anime['rating_count'] or 0,
-                    anime['favorite_count'] or 0,
-                    anime['view_count'] or 0,
-                    anime['is_completed'] or 0,
-                    anime['is_featured'] or 0
-                ]]
-
-                # 标准化并预测
-                X = self.feature_scaler.transform(features)
-                pred = self.model.predict(X)[0]
-
-                # 归一化评分 (1-5) -> (0-1)
-                norm_score = (pred - 1.0) / 4.0
-                predictions.append((anime['id'], norm_score))
+            # 归一化评分 (1-5) -> (0-1)
+            norm_scores = (preds - 1.0) / 4.0
+            predictions = list(zip(anime_ids.tolist(), norm_scores.tolist()))
 
             # 排序并返回topK
             predictions.sort(key=lambda x: x[1], reverse=True)
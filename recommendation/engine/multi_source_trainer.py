@@ -1,32 +1,257 @@
 # recommendation/engine/multi_source_trainer.py
+# 多源集成训练管道 - 本地爬虫数据与Kaggle外部数据各自独立建模
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('django')
+
+
+def _ensure_django():
+    """子进程(spawn启动方式)中需要先完成Django初始化"""
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def _train_source_worker(source, model_params, kaggle_dir=None, sample_size=None):
+    """独立训练子进程入口 - 每个数据源在各自进程内加载数据、训练并持久化"""
+    _ensure_django()
+    trainer = QuantumEnsembleTrainer(model_params=model_params)
+    if source == 'local':
+        return trainer.train_local_model()
+    return trainer.train_kaggle_model(kaggle_dir, sample_size=sample_size)
+
+
 class QuantumEnsembleTrainer:
     """多源量子态模型融合引擎 - 绕过ID空间断层"""
 
-    def __init__(self):
-        self.local_model = GBDTRecommender(prefix='local')
-        self.kaggle_model = GBDTRecommender(prefix='kaggle')
-        self.ensemble_weights = {'local': 0.65, 'kaggle': 0.35}
+    def __init__(self, model_params=None):
+        # 延迟导入: 子进程反序列化本模块时Django可能尚未初始化
+        from recommendation.engine.models.ml_engine import GBDTRecommender
+
+        self.model_params = model_params or {}
+        self.local_model = GBDTRecommender(prefix='local', use_cache=False, **self.model_params)
+        self.kaggle_model = GBDTRecommender(prefix='kaggle', use_cache=False, **self.model_params)
+        # 动漫处于本地ID空间时的融合权重；否则只用Kaggle模型
+        self.ensemble_weights = {'local': 0.8, 'kaggle': 0.2}
+        self._kaggle_id_map = None
+
+    # ==================== 训练管道 ====================
+
+    def train_all(self, kaggle_dir, sample_size=None, parallel=True):
+        """
+        双源训练 - 默认两个模型在独立进程中并行训练
+
+        Returns:
+            {'local': bool, 'kaggle': bool}
+        """
+        if not parallel:
+            results = {
+                'local': self.train_local_model(),
+                'kaggle': self.train_kaggle_model(kaggle_dir, sample_size=sample_size),
+            }
+        else:
+            from django.db import connections
+            # 子进程不能复用父进程的数据库连接
+            connections.close_all()
+
+            results = {}
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                futures = {
+                    source: pool.submit(_train_source_worker, source, self.model_params,
+                                        kaggle_dir, sample_size)
+                    for source in ('local', 'kaggle')
+                }
+                for source, future in futures.items():
+                    try:
+                        results[source] = bool(future.result())
+                    except Exception as e:
+                        logger.error(f"{source}模型训练进程异常: {str(e)}")
+                        results[source] = False
+
+        # 子进程只负责持久化，父进程重新加载产物
+        self.load_models()
+        logger.info(f"多源训练完成: {results}")
+        return results
 
     def train_local_model(self):
         """爬虫数据训练管道"""
         X, y = self._prepare_local_data()
         return self.local_model.fit(X, y)
 
-    def train_kaggle_model(self, kaggle_dir):
+    def train_kaggle_model(self, kaggle_dir, sample_size=None):
         """Kaggle独立训练管道"""
         # 直接使用原始ID空间，不做映射
-        df = self._load_kaggle_data(kaggle_dir)
+        df = self._load_kaggle_data(kaggle_dir, sample_size=sample_size)
+        if df is None or df.empty:
+            logger.error(f"Kaggle数据为空: {kaggle_dir}")
+            return False
         X, y = self._prepare_kaggle_features(df)
         return self.kaggle_model.fit(X, y)
 
-    def predict(self, user_features, anime_features):
-        """集成预测 - 后验概率融合"""
-        # 检查此anime是否在本地ID空间
-        if anime_features['in_local_space']:
-            # 本地空间ID - 高权重使用本地模型
-            local_pred = self.local_model.predict(user_features, anime_features)
-            kaggle_pred = self.kaggle_model.predict_with_similar_features(user_features, anime_features)
-            return local_pred * 0.8 + kaggle_pred * 0.2
-        else:
-            # 只存在于Kaggle空间 - 只用Kaggle模型
-            return self.kaggle_model.predict(user_features, anime_features)
\ No newline at end of file
+    def _prepare_local_data(self):
+        """本地评分特征 - 复用GBDT的数据准备逻辑"""
+        return self.local_model.prepare_data(force_reload=True)
+
+    def _load_kaggle_data(self, kaggle_dir, sample_size=None):
+        """
+        加载Kaggle评分与动漫元数据
+
+        目录结构: anime.csv(anime_id,name,genre,type,episodes,rating,members)
+                  rating.csv(user_id,anime_id,rating)，rating=-1表示看过未评分
+        """
+        from recommendation.engine.models.ml_engine import ANIME_FEATURE_FIELDS
+
+        ratings_path = os.path.join(kaggle_dir, 'rating.csv')
+        anime_path = os.path.join(kaggle_dir, 'anime.csv')
+        for path in (ratings_path, anime_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"找不到Kaggle数据文件: {path}")
+
+        from recommendation.columnar_cache import read_csv_cached
+
+        # 列式缓存 - 首次解析后内存映射加载，各列已下探为紧凑类型
+        ratings = read_csv_cached(ratings_path, usecols=['user_id', 'anime_id', 'rating'])
+        ratings = ratings[ratings['rating'] > 0]
+
+        anime = read_csv_cached(anime_path, usecols=['anime_id', 'episodes', 'rating', 'members'])
+        anime = anime.rename(columns={'rating': 'score'})
+
+        # 外部动漫特征 - 按本地ANIME_FEATURE_FIELDS语义近似
+        members = anime['members'].fillna(0).astype(np.float64)
+        rating_counts = ratings['anime_id'].value_counts()
+        features = pd.DataFrame({
+            'anime_id': anime['anime_id'].astype(np.int32),
+            'popularity': members / max(1.0, members.max()),
+            'rating_avg': anime['score'].fillna(0) / 2.0,
+            'rating_count': anime['anime_id'].map(rating_counts).fillna(0),
+            'favorite_count': 0.0,
+            'view_count': members,
+            'is_completed': (anime['episodes'].astype(str) != 'Unknown').astype(np.float64),
+            'is_featured': 0.0,
+        })
+
+        if sample_size and len(ratings) > sample_size:
+            ratings = ratings.sample(n=sample_size, random_state=42)
+
+        df = ratings.merge(features, on='anime_id', how='left')
+        df[list(ANIME_FEATURE_FIELDS)] = df[list(ANIME_FEATURE_FIELDS)].fillna(0)
+
+        logger.info(f"加载Kaggle评分 {len(df)} 条，动漫 {len(features)} 部")
+        return df
+
+    def _prepare_kaggle_features(self, df):
+        """Kaggle特征矩阵 - 列顺序与本地模型一致"""
+        from recommendation.engine.models.ml_engine import ANIME_FEATURE_FIELDS
+
+        feature_matrix = df[list(ANIME_FEATURE_FIELDS)].to_numpy(dtype=np.float64)
+        X = self.kaggle_model.build_training_matrix(
+            df['user_id'].to_numpy(), df['anime_id'].to_numpy(), feature_matrix
+        )
+        # 10分制 → 5分制
+        y = df['rating'].to_numpy(dtype=np.float64) / 2.0
+        return X, y
+
+    # ==================== 推理 ====================
+
+    def load_models(self):
+        """加载两个数据源的持久化模型"""
+        local_ok = self.local_model.load_model()
+        kaggle_ok = self.kaggle_model.load_model()
+        return local_ok and kaggle_ok
+
+    @property
+    def kaggle_id_map(self):
+        """本地动漫ID → Kaggle动漫ID"""
+        if self._kaggle_id_map is None:
+            from anime.models import AnimeExternalId
+
+            self._kaggle_id_map = {
+                anime_id: int(external_id)
+                for anime_id, external_id in AnimeExternalId.objects.filter(
+                    source=AnimeExternalId.SOURCE_KAGGLE).values_list('anime_id', 'external_id')
+            }
+        return self._kaggle_id_map
+
+    def predict(self, user_id, anime_ids):
+        """
+        集成预测 - 后验概率融合，对一批候选动漫向量化打分
+
+        两个模型共享同一份特征查询，整批候选只需两次数据库往返
+
+        Returns:
+            与anime_ids对齐的np.ndarray(1-5分)，模型均不可用时返回None
+        """
+        anime_ids = np.asarray(list(anime_ids))
+        if len(anime_ids) == 0:
+            return np.empty(0, dtype=np.float64)
+
+        local, kaggle = self.local_model, self.kaggle_model
+        if local.model is None and kaggle.model is None:
+            self.load_models()
+            if local.model is None and kaggle.model is None:
+                return None
+
+        anime_features = local._fetch_anime_features(np.unique(anime_ids).tolist())
+        ratings_count = local._fetch_user_rating_counts([user_id])
+        user_ids = np.full(len(anime_ids), user_id)
+
+        local_pred = kaggle_pred = None
+        if local.model is not None:
+            local_pred = local._score_matrix(user_ids, anime_ids, anime_features, ratings_count)
+        if kaggle.model is not None:
+            # 本地用户不在Kaggle用户空间 - 近似特征跨空间打分
+            kaggle_pred = kaggle._score_similar(user_ids, anime_ids, anime_features, ratings_count,
+                                                self.kaggle_id_map)
+
+        if kaggle_pred is None:
+            return local_pred
+        if local_pred is None:
+            return kaggle_pred
+
+        # 检查动漫是否在本地ID空间 - 本地空间高权重使用本地模型，否则只用Kaggle模型
+        in_local_space = np.isin(anime_ids, local.anime_encoder.classes_)
+        local_weight = np.where(in_local_space, self.ensemble_weights['local'], 0.0)
+        return local_pred * local_weight + kaggle_pred * (1.0 - local_weight)
+
+    def get_recommendations(self, user_id, limit=10, exclude_rated=True,
+                            candidate_pool=500, batch_size=256):
+        """集成模型推荐 - 与GBDTRecommender.get_recommendations接口一致"""
+        from anime.models import Anime
+        from recommendation.models import UserRating
+
+        try:
+            if exclude_rated:
+                rated_animes = set(UserRating.objects.filter(user_id=user_id).values_list('anime_id', flat=True))
+            else:
+                rated_animes = set()
+
+            # 按热门度预筛候选集
+            popular_ids = Anime.objects.order_by('-popularity') \
+                .values_list('id', flat=True)[:candidate_pool + len(rated_animes)]
+            candidate_ids = [aid for aid in popular_ids if aid not in rated_animes][:candidate_pool]
+            if not candidate_ids:
+                return []
+
+            # 分批向量化打分
+            scores = []
+            for start in range(0, len(candidate_ids), batch_size):
+                batch_pred = self.predict(user_id, candidate_ids[start:start + batch_size])
+                if batch_pred is None:
+                    return []
+                scores.append(batch_pred)
+            scores = np.concatenate(scores)
+
+            # 归一化评分 (1-5) -> (0-1) 并取topK
+            norm_scores = (scores - 1.0) / 4.0
+            top = np.argsort(-norm_scores, kind='stable')[:limit]
+            return [(candidate_ids[i], float(norm_scores[i])) for i in top]
+
+        except Exception as e:
+            logger.error(f"集成推荐引擎异常: {str(e)}")
+            return []
@@ -140,6 +140,10 @@ class RecommendationEngine:
         # 初始化机器学习引擎(如可用)
         self.ml_engine = None
         if ML_ENGINE_AVAILABLE:
+            # 多源集成模型已训练时优先使用 (train_ml_model --kaggle-dir)
+            self.ml_engine = self._load_ensemble_engine()
+
+        if ML_ENGINE_AVAILABLE and self.ml_engine is None:
             try:
                 self.ml_engine = GBDTRecommender()
                 # 尝试加载模型
@@ -153,14 +157,30 @@ class RecommendationEngine:
 
         logger.info("量子态推荐引擎初始化完毕，ML状态: %s", "在线" if self.ml_engine else "离线")
 
-    def get_recommendations_for_user(self, user_id, limit=10, strategy='hybrid'):
+    def _load_ensemble_engine(self):
+        """加载本地+Kaggle双模型集成引擎，产物缺失时返回None"""
+        try:
+            from recommendation.engine.multi_source_trainer import QuantumEnsembleTrainer
+
+            ensemble = QuantumEnsembleTrainer()
+            if ensemble.load_models():
+                logger.info("多源集成模型加载成功")
+                return ensemble
+        except Exception as e:
+            logger.error(f"加载多源集成模型失败: {str(e)}")
+        return None
+
+    def get_recommendations_for_user(self, user_id, limit=10, strategy='hybrid', refresh=False):
         """
         为指定用户生成个性化推荐
+
+        Args:
+            refresh: 跳过缓存读取，重新计算并覆盖缓存(异步刷新使用)
         """
         cache_key = f"rec:user:{user_id}:strat:{strategy}:limit:{limit}"
 
         # 检查缓存
-        if self.use_cache:
+        if self.use_cache and not refresh:
             cached_recommendations = cache.get(cache_key)
             if cached_recommendations:
                 logger.debug(f"命中缓存: {cache_key}")
@@ -194,10 +214,16 @@ class RecommendationEngine:
             # 缓存结果
             if self.use_cache and recommendations:
                 cache.set(cache_key, recommendations, self.cache_ttl)
+                self._remember_cached_list(user_id, strategy, limit)
+            elif self.use_cache and refresh:
+                # 刷新时算不出结果 - 删除旧缓存，不让交互前的推荐一直留到过期
+                cache.delete(cache_key)
 
             return recommendations
         except Exception as e:
             logger.error(f"推荐生成异常: {str(e)}")
+            if self.use_cache and refresh:
+                cache.delete(cache_key)
             # 发生任何异常时返回热门推荐
             return self._popular_recommendations(limit)
 
@@ -539,23 +565,34 @@ class RecommendationEngine:
         recommendations.sort(key=lambda x: x[1], reverse=True)
 
         return recommendations[:limit]
+
+    def _cached_lists_key(self, user_id):
+        return f"rec:user:{user_id}:lists"
+
+    def _remember_cached_list(self, user_id, strategy, limit):
+        """登记用户已缓存的推荐列表(策略, 数量)，刷新时按登记逐个重算"""
+        key = self._cached_lists_key(user_id)
+        cached_lists = cache.get(key) or set()
+        if (strategy, limit) not in cached_lists:
+            cached_lists.add((strategy, limit))
+            cache.set(key, cached_lists, self.cache_ttl)
+
     def update_recommendations_cache(self, user_id):
         """
         更新用户推荐缓存
         在用户行为变化时调用，刷新推荐结果
 
+        重算用户已缓存的每个推荐列表并直接覆盖(不先删除)，刷新期间和刷新后的页面访问都命中缓存；
+        重算为空或失败时删除该列表的缓存，下次访问重新计算
+
         Args:
             user_id: 目标用户ID
         """
-        # 清除用户所有策略的缓存
-        for strategy in ['hybrid', 'cf', 'content', 'popular']:
-            cache_key = f"rec:user:{user_id}:strat:{strategy}:limit:10"
-            cache.delete(cache_key)
-
-        # 预计算并缓存默认推荐
-        self.get_recommendations_for_user(user_id)
+        cached_lists = cache.get(self._cached_lists_key(user_id)) or {('hybrid', 10)}
+        for strategy, limit in sorted(cached_lists):
+            self.get_recommendations_for_user(user_id, limit=limit, strategy=strategy, refresh=True)
 
-        logger.info(f"用户 {user_id} 的推荐缓存已更新")
+        logger.info(f"用户 {user_id} 的推荐缓存已更新: {len(cached_lists)} 个列表")
 
 
 # 单例模式实现
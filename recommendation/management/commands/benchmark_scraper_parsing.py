@@ -0,0 +1,115 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recommendation.scrapers.myanimelist_scraper import MyAnimeListScraper
+import logging
+
+logger = logging.getLogger('django')
+
+
+class Command(BaseCommand):
+    help = '详情页解析微基准 - 对比 html.parser / lxml / lxml+SoupStrainer 的解析速度与结果一致性'
+
+    # (名称, 解析器, 是否使用SoupStrainer) - 第一项为基线
+    CONFIGS = (
+        ('html.parser 全量建树', 'html.parser', False),
+        ('lxml 全量建树', 'lxml', False),
+        ('lxml + SoupStrainer', 'lxml', True),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages-dir', type=str,
+                            help='已保存的MAL详情页目录（*.html，文件名为动漫ID）')
+        parser.add_argument('--http-cache', type=str,
+                            default=getattr(settings, 'SCRAPER_HTTP_CACHE_DIR', None),
+                            help='从爬虫HTTP缓存中读取已抓取的详情页')
+        parser.add_argument('--synthetic', type=int, default=50,
+                            help='没有已保存页面时，用本地桩站点生成的页面数')
+        parser.add_argument('--filler', type=int, default=40,
+                            help='桩页面附带的评论块数（模拟真实页面体积）')
+        parser.add_argument('--limit', type=int, default=200,
+                            help='最多使用的页面数')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='每种配置重复解析的轮数')
+
+    def handle(self, *args, **options):
+        pages, origin = self._load_pages(options)
+        if not pages:
+            self.stderr.write("没有可用于基准测试的页面")
+            return
+
+        total_bytes = sum(len(html) for _, html in pages)
+        self.stdout.write(f"页面来源: {origin}, 共 {len(pages)} 页, "
+                          f"平均 {total_bytes / len(pages) / 1024:.1f} KB")
+
+        baseline_results = None
+        baseline_seconds = None
+        self.stdout.write(f"{'配置':<24}{'页/秒':>10}{'毫秒/页':>10}{'加速比':>8}{'结果不一致':>10}")
+        for name, parser_name, use_strainer in self.CONFIGS:
+            scraper = MyAnimeListScraper()
+            scraper.HTML_PARSER = parser_name
+            if not use_strainer:
+                scraper.DETAIL_STRAINER = None
+
+            results = [scraper.parse_anime_details(url, html) for url, html in pages]
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for url, html in pages:
+                    scraper.parse_anime_details(url, html)
+            seconds = (time.perf_counter() - started) / options['repeat']
+
+            if baseline_results is None:
+                baseline_results, baseline_seconds = results, seconds
+            mismatches = sum(1 for got, expected in zip(results, baseline_results) if got != expected)
+
+            self.stdout.write(f"{name:<24}{len(pages) / seconds:>10.1f}{seconds * 1000 / len(pages):>10.2f}"
+                              f"{baseline_seconds / seconds:>7.2f}x{mismatches:>10}")
+
+    def _load_pages(self, options):
+        """按 --pages-dir > HTTP缓存 > 桩站点 的优先级加载(url, html)列表"""
+        limit = options['limit']
+        base_url = MyAnimeListScraper().base_url
+
+        pages_dir = options['pages_dir']
+        if pages_dir:
+            pages = []
+            for name in sorted(os.listdir(pages_dir)):
+                if not name.endswith('.html'):
+                    continue
+                stem = os.path.splitext(name)[0]
+                anime_id = stem if stem.isdigit() else str(len(pages) + 1)
+                with open(os.path.join(pages_dir, name), 'r', encoding='utf-8') as f:
+                    pages.append((f"{base_url}/anime/{anime_id}", f.read()))
+                if len(pages) >= limit:
+                    break
+            return pages, pages_dir
+
+        cache_dir = options['http_cache']
+        if cache_dir and os.path.isdir(cache_dir):
+            from recommendation.scrapers.http_cache import HttpCache
+
+            cache = HttpCache(cache_dir)
+            scraper = MyAnimeListScraper()
+            pages = []
+            for url in cache.iter_urls():
+                if not scraper.is_detail_url(url):
+                    continue
+                page = cache.get(url)
+                if page is None:
+                    continue
+                pages.append((url, page.to_response().text))
+                if len(pages) >= limit:
+                    break
+            if pages:
+                return pages, f"HTTP缓存 {cache_dir}"
+
+        from recommendation.scrapers.stub_server import StubAnimeSite
+
+        site = StubAnimeSite(anime_count=options['synthetic'], page_filler=options['filler'])
+        site.base_url = base_url
+        count = min(options['synthetic'], limit)
+        pages = [(f"{base_url}/anime/{i}/stub_{i}", site.detail_page(i)) for i in range(1, count + 1)]
+        return pages, f"本地桩站点(填充 {options['filler']} 个评论块)"
@@ -0,0 +1,117 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from recommendation.scrapers import text_normalization
+from recommendation.scrapers.text_normalization import normalize_text
+import logging
+
+logger = logging.getLogger('django')
+
+
+def legacy_encoding_fix(text):
+    """原逐字符实现(_quantum_encoding_fix) - 仅作为基准基线"""
+    if not text:
+        return ""
+    try:
+        try_decode = text.encode('latin1').decode('utf-8', errors='replace')
+        cjk_ratio = sum(1 for c in try_decode if 0x4E00 <= ord(c) <= 0x9FFF) / len(try_decode) if try_decode else 0
+        if cjk_ratio > 0.1:
+            return try_decode
+        for chain in (('latin1', 'utf-8'), ('utf-8', 'latin1', 'utf-8'), ('cp1252', 'utf-8'), ('gbk', 'utf-8')):
+            try:
+                temp = text
+                for i, codec in enumerate(chain):
+                    temp = temp.encode(codec) if i % 2 == 0 else temp.decode(codec, errors='replace')
+                if isinstance(temp, bytes):
+                    temp = temp.decode('utf-8', errors='replace')
+                cjk_ratio = sum(1 for c in temp if 0x4E00 <= ord(c) <= 0x9FFF) / len(temp) if temp else 0
+                if cjk_ratio > 0.1:
+                    return temp
+            except Exception:
+                continue
+    except Exception:
+        pass
+    return ''.join(c if ord(c) < 128 else '?' for c in text)
+
+
+class Command(BaseCommand):
+    help = '文本规范化微基准 - 按每MB文本耗时对比原逐字符实现与正则+缓存实现'
+
+    # 语料素材: 正常英文/中日文标题、英文简介句子，以及按各种方式损坏的乱码
+    TITLES = (
+        'Shingeki no Kyojin',
+        'Fullmetal Alchemist: Brotherhood',
+        '进击的巨人',
+        '鬼滅の刃',
+        'Pokémon',
+    )
+    SENTENCES = (
+        'Centuries ago, mankind was slaughtered to near extinction by monstrous humanoid creatures.',
+        'The survivors built a city surrounded by towering walls to keep the giants out.',
+        'After losing their mother, two brothers search for a way to restore their bodies.',
+        '一个少年为了拯救变成鬼的妹妹而踏上了斩鬼之路。',
+    )
+    BREAKERS = (
+        lambda text: text.encode('utf-8').decode('latin1'),
+        lambda text: text.encode('utf-8').decode('cp1252', errors='replace'),
+        lambda text: text.encode('utf-8').decode('latin1').encode('utf-8').decode('latin1'),
+        lambda text: text.encode('utf-8').decode('gbk', errors='replace'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strings', type=int, default=20000,
+                            help='语料条数(标题与简介混合)')
+        parser.add_argument('--unique', type=float, default=0.3,
+                            help='不重复字符串所占比例，其余为重复出现的字符串')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='每种配置重复的轮数')
+        parser.add_argument('--broken', type=float, default=0.1,
+                            help='乱码字符串所占比例')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        corpus = self._build_corpus(options)
+        megabytes = sum(len(text.encode('utf-8')) for text in corpus) / 1024 / 1024
+        self.stdout.write(f"语料: {len(corpus)} 条, {megabytes:.2f} MB, "
+                          f"不重复 {len(set(corpus))} 条")
+
+        configs = (
+            ('原逐字符实现', legacy_encoding_fix, False),
+            ('正则实现(冷缓存)', normalize_text, True),
+            ('正则实现(热缓存)', normalize_text, False),
+        )
+        baseline = None
+        self.stdout.write(f"{'配置':<18}{'毫秒/MB':>12}{'MB/秒':>10}{'加速比':>8}")
+        for name, func, cold in configs:
+            elapsed = 0.0
+            for _ in range(options['repeat']):
+                if cold:
+                    text_normalization.cache_clear()
+                started = time.perf_counter()
+                for text in corpus:
+                    func(text)
+                elapsed += time.perf_counter() - started
+            seconds = elapsed / options['repeat']
+            baseline = baseline or seconds
+            self.stdout.write(f"{name:<18}{seconds * 1000 / megabytes:>12.1f}{megabytes / seconds:>10.2f}"
+                              f"{baseline / seconds:>7.2f}x")
+
+        self.stdout.write(f"缓存: {text_normalization.cache_info()}")
+
+    def _build_corpus(self, options):
+        """标题(短)与简介(长)混合，按--unique控制重复比例、按--broken控制乱码比例"""
+        rng = random.Random(options['seed'])
+        unique_count = max(1, int(options['strings'] * options['unique']))
+        unique = []
+        for i in range(unique_count):
+            if i % 3 == 0:
+                # 简介: 多句拼接，约1-2KB
+                text = ' '.join(rng.choice(self.SENTENCES) for _ in range(rng.randint(10, 20)))
+            else:
+                text = f"{rng.choice(self.TITLES)} {i}"
+            if rng.random() < options['broken']:
+                text = rng.choice(self.BREAKERS)(text)
+            unique.append(text)
+        return [unique[i] if i < unique_count else rng.choice(unique) for i in range(options['strings'])]
@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from recommendation.scrapers.frontier import CrawlFrontier
 from recommendation.scrapers.myanimelist_scraper import MyAnimeListScraper
+from recommendation.scrapers.pipeline import CrawlPipeline
 import logging
 
 logger = logging.getLogger('django')
@@ -27,6 +30,36 @@ class Command(BaseCommand):
                             help='最大重试次数')
         parser.add_argument('--force', action='store_true',
                             help='强制导入已存在的动漫')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='详情页并发抓取线程数（限速仍按--delay对每个主机生效）')
+        parser.add_argument('--burst', type=int, default=1,
+                            help='每个主机允许的突发请求数')
+        parser.add_argument('--base-url', type=str,
+                            help='覆盖站点根地址（如指向本地桩站点测试）')
+        parser.add_argument('--http-cache', type=str,
+                            default=getattr(settings, 'SCRAPER_HTTP_CACHE_DIR', None),
+                            help='HTTP磁盘缓存目录')
+        parser.add_argument('--no-http-cache', action='store_true',
+                            help='禁用HTTP磁盘缓存')
+        parser.add_argument('--cache-max-age', type=int, default=3600,
+                            help='缓存在该秒数内直接使用，超过后条件请求重新验证')
+        parser.add_argument('--reparse-from-cache', action='store_true',
+                            help='不访问网络，用缓存的详情页重新解析并更新数据库')
+        parser.add_argument('--sequential', action='store_true',
+                            help='不使用流水线，按页顺序抓取-解析-入库')
+        parser.add_argument('--parse-workers', type=int,
+                            help='流水线解析进程数（默认CPU核数，0表示在线程内解析）')
+        parser.add_argument('--queue-size', type=int, default=64,
+                            help='流水线阶段间队列容量（队列满时上游阻塞）')
+        parser.add_argument('--frontier', type=str,
+                            default=getattr(settings, 'SCRAPER_FRONTIER_PATH', None),
+                            help='爬取前沿SQLite文件（记录爬取进度）')
+        parser.add_argument('--no-frontier', action='store_true',
+                            help='不记录爬取进度')
+        parser.add_argument('--resume', action='store_true',
+                            help='从上次检查点续爬：先补完未完成的URL，再从第一个未完成的列表页继续')
+        parser.add_argument('--reset-frontier', action='store_true',
+                            help='清空该数据源的爬取进度后再开始')
 
     def handle(self, *args, **options):
         source = options['source']
@@ -39,16 +72,41 @@ class Command(BaseCommand):
         delay = options['delay']
         retries = options['retries']
         force = options['force']
+        concurrency = options['concurrency']
 
         self.stdout.write(f"开始从 {source} 抓取动漫数据...")
 
         # 实例化爬虫
         if source == 'myanimelist':
-            scraper = MyAnimeListScraper(delay=delay, max_retries=retries)
+            http_cache_dir = None if options['no_http_cache'] else options['http_cache']
+            frontier = None
+            if options['frontier'] and not options['no_frontier']:
+                frontier = CrawlFrontier(options['frontier'], source=MyAnimeListScraper.source_name)
+                if options['reset_frontier']:
+                    frontier.reset()
+                    self.stdout.write("已清空爬取进度")
+            scraper = MyAnimeListScraper(delay=delay, max_retries=retries,
+                                         concurrency=concurrency, burst=options['burst'],
+                                         http_cache_dir=http_cache_dir,
+                                         cache_max_age=options['cache_max_age'],
+                                         frontier=frontier)
+            if options['base_url']:
+                scraper.base_url = options['base_url'].rstrip('/')
         else:
             self.stderr.write(f"不支持的数据源: {source}")
             return
 
+        # 离线重解析 - 解析器修复后无需重新爬取
+        if options['reparse_from_cache']:
+            if not scraper.http_cache:
+                self.stderr.write("重解析需要HTTP缓存目录 (--http-cache)")
+                return
+            stats = scraper.reparse_from_cache(do_import=import_data)
+            self.stdout.write(f"离线重解析: 解析 {stats['parsed']} 页, 新建 {stats['created']} 部, "
+                              f"更新 {stats['updated']} 部, 失败 {stats['failed']} 页")
+            self.stdout.write(self.style.SUCCESS("重解析完成"))
+            return
+
         # 根据模式执行不同的抓取逻辑
         if mode == 'top':
             self.stdout.write(f"抓取热门动漫排行榜 (从第{start_page}页开始，共{count}页)")
@@ -59,9 +117,30 @@ class Command(BaseCommand):
             if not import_data:
                 self.stdout.write(self.style.WARNING("警告: 未指定--import参数，将只抓取但不导入数据"))
 
-            added = scraper.run(start_page=start_page, max_pages=count, incremental=incremental, do_import=import_data)
+            resume = options['resume'] and frontier is not None
+            if options['resume'] and frontier is None:
+                self.stdout.write(self.style.WARNING("警告: 未启用爬取前沿，--resume无效"))
+
+            if options['sequential']:
+                added = scraper.run(start_page=start_page, max_pages=count, incremental=incremental,
+                                    do_import=import_data, resume=resume)
+            else:
+                pipeline = CrawlPipeline(scraper, parse_workers=options['parse_workers'],
+                                         queue_size=options['queue_size'])
+                totals = pipeline.run(start_page=start_page, max_pages=count, incremental=incremental,
+                                      do_import=import_data, resume=resume)
+                added = totals['added']
+                self.stdout.write(f"抓取 {totals['scraped']} 部, 跳过 {totals['skipped']} 部")
+                self._print_stage_stats(totals['stages'])
+                if totals.get('covers'):
+                    covers = totals['covers']
+                    self.stdout.write(f"封面: 下载 {covers['downloaded']} 张, 复用 {covers['reused']} 张, "
+                                      f"失败 {covers['failed']} 张, 回写 {covers['updated']} 部")
 
             self.stdout.write(f"成功抓取并添加 {added} 部动漫")
+            if frontier is not None:
+                self.stdout.write(f"爬取进度: {frontier.stats()}")
+                frontier.close()
 
         elif mode == 'search' and query:
             self.stdout.write(f"搜索动漫: {query}")
@@ -77,4 +156,13 @@ class Command(BaseCommand):
             self.stderr.write("无效的模式或参数组合")
             return
 
-        self.stdout.write(self.style.SUCCESS("抓取完成"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("抓取完成"))
+
+    def _print_stage_stats(self, stages):
+        """输出各阶段吞吐与背压统计 - 阻塞秒数高说明下游是瓶颈，饥饿秒数高说明上游是瓶颈"""
+        self.stdout.write(f"{'阶段':<8}{'线程':>6}{'处理':>8}{'失败':>6}{'吞吐/秒':>10}"
+                          f"{'忙碌秒':>10}{'阻塞秒':>10}{'饥饿秒':>10}")
+        for stats in stages:
+            self.stdout.write(f"{stats['stage']:<8}{stats['workers']:>6}{stats['processed']:>8}"
+                              f"{stats['failed']:>6}{stats['throughput']:>10}{stats['busy_seconds']:>10}"
+                              f"{stats['blocked_seconds']:>10}{stats['starved_seconds']:>10}")
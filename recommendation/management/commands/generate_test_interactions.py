@@ -1,4 +1,5 @@
 # recommendation/management/commands/generate_test_interactions.py
+import argparse
 import random
 from datetime import timedelta
 from django.core.management.base import BaseCommand
@@ -8,6 +9,7 @@ from anime.models import Anime
 from recommendation.models import (
     UserRating, UserComment, UserLike, UserFavorite, BrowsingHistory
 )
+from recommendation.bulk_import import bulk_import
 
 
 class Command(BaseCommand):
@@ -20,8 +22,16 @@ class Command(BaseCommand):
         parser.add_argument('--likes', type=int, default=60, help='要生成的点赞数量')
         parser.add_argument('--favorites', type=int, default=40, help='要生成的收藏数量')
         parser.add_argument('--browsing', type=int, default=80, help='要生成的浏览记录数量')
+        parser.add_argument('--bulk-import', action=argparse.BooleanOptionalAction, default=True,
+                            help='挂起逐行信号级联，生成结束后一次性对账计数与偏好(默认开启)')
 
     def handle(self, *args, **options):
+        if not options['bulk_import']:
+            return self.generate(**options)
+        with bulk_import():
+            self.generate(**options)
+
+    def generate(self, **options):
         # 检查所需数据是否存在
         users_count = User.objects.count()
         anime_count = Anime.objects.count()
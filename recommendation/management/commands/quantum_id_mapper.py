@@ -1,9 +1,103 @@
 # 创建文件：quantum_id_mapper.py
 from django.core.management.base import BaseCommand
-from anime.models import Anime
-import pandas as pd
+from anime.models import Anime, AnimeExternalId
+from recommendation.columnar_cache import read_csv_cached
 from fuzzywuzzy import process  # 高级模糊匹配库 (pip install fuzzywuzzy python-Levenshtein)
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import os
 import re
+import unicodedata
+
+# 标题归一化: 去掉标点与空白，只保留文字/数字
+_TITLE_NOISE = re.compile(r'[\W_]+', re.UNICODE)
+NGRAM_SIZE = 3
+
+# 子进程共享的标题索引(由进程池initializer注入)
+_worker_index = None
+
+
+def normalize_title(title):
+    """标题归一化 - NFKC全半角统一 + 小写 + 去标点空白"""
+    title = unicodedata.normalize('NFKC', str(title or ''))
+    return _TITLE_NOISE.sub('', title.lower())
+
+
+def title_ngrams(normalized):
+    """字符n-gram集合 - 标题过短时整体作为一个gram"""
+    if len(normalized) <= NGRAM_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + NGRAM_SIZE] for i in range(len(normalized) - NGRAM_SIZE + 1)}
+
+
+class TitleMatchIndex:
+    """
+    标题匹配索引
+
+    精确通道: 归一化标题 → DB记录哈希表，O(1)
+    模糊通道: n-gram倒排索引按共享gram数筛出少量候选，再用fuzzywuzzy精排
+    """
+
+    def __init__(self, db_animes, shortlist_size=20):
+        self.titles = {}
+        self.exact = {}
+        self.inverted = defaultdict(list)
+        self.shortlist_size = shortlist_size
+
+        for dbid, title in db_animes:
+            self.titles[dbid] = title
+            normalized = normalize_title(title)
+            # 同名保留先出现的记录，与原线性扫描的break语义一致
+            self.exact.setdefault(normalized, dbid)
+            for gram in title_ngrams(normalized):
+                self.inverted[gram].append(dbid)
+
+    def shortlist(self, normalized):
+        """按共享n-gram数取候选"""
+        overlap = Counter()
+        for gram in title_ngrams(normalized):
+            overlap.update(self.inverted.get(gram, ()))
+        return [dbid for dbid, _ in overlap.most_common(self.shortlist_size)]
+
+    def match(self, title, threshold):
+        """
+        匹配单个标题
+
+        Returns:
+            (dbid, score, is_exact)，未匹配返回None
+        """
+        normalized = normalize_title(title)
+        if not normalized:
+            return None
+
+        dbid = self.exact.get(normalized)
+        if dbid is not None:
+            return dbid, 100, True
+
+        candidates = self.shortlist(normalized)
+        if not candidates:
+            return None
+
+        # extractOne对dict返回(标题, 分数, 键)
+        result = process.extractOne(title, {cid: self.titles[cid] for cid in candidates})
+        if result and result[1] >= threshold:
+            return result[2], result[1], False
+        return None
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _match_batch(rows, threshold):
+    """进程池任务 - 批量匹配[(kaggle_id, title)]"""
+    results = []
+    for kid, title in rows:
+        match = _worker_index.match(title, threshold)
+        if match:
+            results.append((kid, title) + match)
+    return results
 
 
 class Command(BaseCommand):
@@ -12,54 +106,61 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--kaggle', type=str, required=True, help='Kaggle动漫CSV路径')
         parser.add_argument('--threshold', type=int, default=90, help='标题匹配阈值(0-100)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='匹配进程数(1为单进程)')
+        parser.add_argument('--batch-size', type=int, default=500, help='每个匹配任务的标题数')
 
     def handle(self, *args, **options):
-        # 1. 加载数据源
-        kaggle_df = pd.read_csv(options['kaggle'])
-        db_animes = list(Anime.objects.values_list('id', 'title', 'description'))
+        # 1. 加载数据源 - 列式缓存，只取匹配所需的两列
+        kaggle_df = read_csv_cached(options['kaggle'], usecols=['anime_id', 'name'])
+        db_animes = list(Anime.objects.values_list('id', 'title'))
+
+        # 2. 构建标题索引
+        index = TitleMatchIndex(db_animes)
+        self.stdout.write(f"🧠 启动模糊匹配引擎: {len(db_animes)} DB记录 vs {len(kaggle_df)} Kaggle记录")
 
-        # 2. 生成标题映射表
-        db_titles = [x[1] for x in db_animes]
-        self.stdout.write(f"🧠 启动模糊匹配引擎: {len(db_titles)} DB记录 vs {len(kaggle_df)} Kaggle记录")
+        rows = list(zip(kaggle_df['anime_id'].tolist(), kaggle_df['name'].tolist()))
+        batch_size = max(1, options['batch_size'])
+        batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
 
-        # 3. 原子精确匹配通道 - O(n) 线性扫描
+        # 3. 并行匹配 - 结果按Kaggle文件顺序返回
+        threshold = options['threshold']
+        workers = max(1, min(options['workers'], len(batches)))
+        if workers == 1:
+            _init_worker(index)
+            batch_results = [_match_batch(batch, threshold) for batch in batches]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(index,)) as pool:
+                batch_results = list(pool.map(_match_batch, batches, [threshold] * len(batches)))
+
+        # 4. 汇总 - 每部动漫只接受文件中首个匹配
+        mapping = {}
         exact_matches = 0
         fuzzy_matches = 0
-
-        for _, krow in kaggle_df.iterrows():
-            kid = krow['anime_id']
-            ktitle = krow['name']
-
-            # 尝试精确匹配
-            match = None
-            for dbid, dbtitle, dbdesc in db_animes:
-                if ktitle.lower() == dbtitle.lower():
-                    match = (dbid, 100)
-                    break
-
-            # 回退到模糊匹配 - O(n²)复杂度，但只针对未匹配项
-            if not match:
-                # 执行模糊匹配，返回(match, score)
-                match_result = process.extractOne(ktitle, db_titles)
-                if match_result and match_result[1] >= options['threshold']:
-                    # 找到模糊匹配的DB ID
-                    idx = db_titles.index(match_result[0])
-                    match = (db_animes[idx][0], match_result[1])
+        for results in batch_results:
+            for kid, ktitle, dbid, score, is_exact in results:
+                if dbid in mapping:
+                    continue
+                mapping[dbid] = (kid, ktitle, score)
+                if is_exact:
+                    exact_matches += 1
+                else:
                     fuzzy_matches += 1
 
-            # 应用匹配结果
-            if match:
-                dbid, score = match
-                anime = Anime.objects.get(id=dbid)
-
-                # 注入Kaggle ID到描述中 - 创建双向映射
-                id_pattern = r"Kaggle ID: \d+"
-                if "Kaggle ID:" not in anime.description:
-                    anime.description = f"{anime.description}\nKaggle ID: {kid}"
-                    anime.save(update_fields=['description'])
+        # 5. 写入外部ID映射表 - 已有Kaggle映射的动漫/已被占用的Kaggle ID跳过，单次批量写入
+        mapped_animes = set(AnimeExternalId.objects.filter(
+            source=AnimeExternalId.SOURCE_KAGGLE).values_list('anime_id', flat=True))
+        titles = dict(db_animes)
+        to_create = []
+        for dbid, (kid, ktitle, score) in mapping.items():
+            if dbid in mapped_animes:
+                continue
+            to_create.append(AnimeExternalId(
+                anime_id=dbid, source=AnimeExternalId.SOURCE_KAGGLE, external_id=str(kid)))
+            self.stdout.write(f"✅ 映射: {ktitle} → {titles[dbid]} (Score:{score}%)")
 
-                    if score == 100:
-                        exact_matches += 1
-                    self.stdout.write(f"✅ 映射: {ktitle} → {anime.title} (Score:{score}%)")
+        AnimeExternalId.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
 
-        self.stdout.write(f"🔄 映射完成: {exact_matches}精确匹配 + {fuzzy_matches}模糊匹配")
\ No newline at end of file
+        self.stdout.write(f"🔄 映射完成: {exact_matches}精确匹配 + {fuzzy_matches}模糊匹配，"
+                          f"写入 {len(to_create)} 条")
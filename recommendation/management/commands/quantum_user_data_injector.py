@@ -1,3 +1,5 @@
+import argparse
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
 import random
@@ -7,6 +9,7 @@ from faker import Faker
 from django.contrib.auth.models import User
 from anime.models import Anime, AnimeType
 from recommendation.models import UserRating, UserFavorite, UserComment
+from recommendation.bulk_import import bulk_import
 
 
 class QuantumUserDataInjector:
@@ -189,8 +192,16 @@ class QuantumUserDataInjector:
 class Command(BaseCommand):
     help = '量子级用户数据注入器'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk-import', action=argparse.BooleanOptionalAction, default=True,
+                            help='挂起逐行信号级联，注入结束后一次性对账计数与偏好(默认开启)')
+
     def handle(self, *args, **kwargs):
         injector = QuantumUserDataInjector(total_interactions=300)
-        injector.execute_quantum_injection()
+        if not kwargs['bulk_import']:
+            injector.execute_quantum_injection()
+            return
+        with bulk_import():
+            injector.execute_quantum_injection()
 
         self.stdout.write(self.style.SUCCESS('🚀 量子用户数据注入完成'))
\ No newline at end of file
@@ -0,0 +1,13 @@
+# recommendation/management/commands/reconcile_aggregates.py
+from django.core.management.base import BaseCommand
+
+from recommendation.bulk_import import reconcile_aggregates
+
+
+class Command(BaseCommand):
+    help = '全量对账冗余计数与用户偏好 - 批量导入或挂起信号的数据修复之后执行'
+
+    def handle(self, *args, **options):
+        stats = reconcile_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            "对账完成: " + ", ".join(f"{table} {count} 行" for table, count in stats.items())))
@@ -23,6 +23,12 @@ class Command(BaseCommand):
                             help='树深度')
         parser.add_argument('--debug', action='store_true',
                             help='调试模式')
+        parser.add_argument('--kaggle-dir', type=str,
+                            help='Kaggle数据目录(anime.csv + rating.csv)，指定后训练本地+Kaggle双模型集成')
+        parser.add_argument('--kaggle-sample', type=int, default=None,
+                            help='Kaggle评分采样条数(默认使用全部)')
+        parser.add_argument('--sequential', action='store_true',
+                            help='双模型顺序训练(默认多进程并行)')
 
     def handle(self, *args, **options):
         # 获取参数
@@ -31,6 +37,7 @@ class Command(BaseCommand):
         lr = options['lr']
         depth = options['depth']
         debug = options['debug']
+        kaggle_dir = options['kaggle_dir']
 
         # 显示训练配置
         self.stdout.write(self.style.SUCCESS('=' * 60))
@@ -43,6 +50,13 @@ class Command(BaseCommand):
         start_time = time.time()
 
         try:
+            if kaggle_dir:
+                self._train_ensemble(kaggle_dir, options, dict(
+                    n_estimators=trees, learning_rate=lr, max_depth=depth
+                ))
+                self.stdout.write(self.style.SUCCESS(f'⏱️ 训练耗时: {time.time() - start_time:.2f}秒'))
+                return
+
             # 实例化推荐引擎
             engine = GBDTRecommender(
                 n_estimators=trees,
@@ -72,4 +86,26 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'❌ 训练异常: {str(e)}'))
             if debug:
                 import traceback
-                self.stdout.write(self.style.ERROR(traceback.format_exc()))
\ No newline at end of file
+                self.stdout.write(self.style.ERROR(traceback.format_exc()))
+
+    def _train_ensemble(self, kaggle_dir, options, model_params):
+        """本地 + Kaggle 双模型集成训练"""
+        from recommendation.engine.multi_source_trainer import QuantumEnsembleTrainer
+
+        parallel = not options['sequential']
+        self.stdout.write(f' - Kaggle目录: {kaggle_dir}')
+        self.stdout.write(f' - 训练方式: {"多进程并行" if parallel else "顺序"}')
+
+        trainer = QuantumEnsembleTrainer(model_params=model_params)
+        if not options['force'] and trainer.load_models():
+            self.stdout.write(self.style.WARNING('⚠️ 集成模型已存在，使用--force重新训练'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('🧠 开始训练多源集成模型...'))
+        results = trainer.train_all(kaggle_dir, sample_size=options['kaggle_sample'], parallel=parallel)
+
+        for source, ok in results.items():
+            if ok:
+                self.stdout.write(self.style.SUCCESS(f'✅ {source}模型训练成功'))
+            else:
+                self.stdout.write(self.style.ERROR(f'❌ {source}模型训练失败'))
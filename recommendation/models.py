@@ -52,6 +52,14 @@ class UserRating(TimeStampedModel):
     # 评分操作时间戳
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录读取时的评分 - 修改后保存时信号据此计算增量，无需再查询旧值
+        if 'rating' in field_names:
+            instance._loaded_rating = instance.rating
+        return instance
+
     class EncodingFixMixin:
         """编码修复混入类 - 在保存前修复编码问题"""
 
@@ -70,18 +78,12 @@ class UserRating(TimeStampedModel):
             super().save(*args, **kwargs)
 
         def _fix_encoding(self, text):
-            """编码修复函数"""
-            if not text:
-                return text
+            """编码修复函数 - 与爬虫共用乱码修复规则，正常文本原样返回"""
+            from recommendation.scrapers.text_normalization import fix_mojibake
 
-            # 尝试修复双重编码问题
-            try:
-                # 将字符串反向编码为latin1字节数组
-                temp_bytes = text.encode('latin1')
-                # 尝试作为UTF-8解析
-                return temp_bytes.decode('utf-8', errors='replace')
-            except:
+            if not text:
                 return text
+            return fix_mojibake(text)
 
     class Meta:
         verbose_name = "用户评分"
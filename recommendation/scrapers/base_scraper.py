@@ -4,11 +4,20 @@ import requests
 import time
 import random
 import logging
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from bs4 import BeautifulSoup, FeatureNotFound
 from abc import ABC, abstractmethod
 from django.conf import settings
 from django.utils import timezone
 
+from .cover_downloader import CoverDownloader
+from .frontier import CrawlFrontier
+from .http_cache import HttpCache
+from .import_writer import AnimeImportWriter
+from .text_normalization import fix_mojibake, normalize_text
+from .throttle import AdaptiveRateLimiter, parse_retry_after
+
 logger = logging.getLogger('django')
 
 
@@ -22,27 +31,66 @@ class BaseScraper(ABC):
     - 用户代理轮换
     - 异常处理
     - 增量爬取
+    - 并发抓取(按主机令牌桶限速，AIMD自适应速率)
+    - HTTP磁盘缓存(条件请求重新验证，支持离线重解析)
     """
 
-    def __init__(self, delay=3.0, max_retries=3, timeout=10):
+    # 外部ID映射表中的数据源标识(AnimeExternalId.source)，子类覆盖
+    source_name = None
+
+    # 离线重解析时从缓存刷新到已有记录的字段 - 不覆盖评分/热度等本地统计
+    REPARSE_FIELDS = ('title', 'original_title', 'description', 'episodes',
+                      'duration', 'is_completed', 'release_date')
+
+    # HTML解析器 - lxml为C实现，比纯Python的html.parser快数倍；未安装时自动回退
+    HTML_PARSER = 'lxml'
+
+    def __init__(self, delay=3.0, max_retries=3, timeout=10, concurrency=1, burst=1, max_rate=None,
+                 http_cache_dir=None, cache_max_age=0, frontier=None, import_batch_size=50):
         """
         初始化爬虫基本参数
 
         Args:
-            delay: 请求间隔时间（秒）
+            delay: 请求间隔时间（秒），即每个主机的稳态速率为1/delay
             max_retries: 最大重试次数
             timeout: 请求超时时间（秒）
+            concurrency: 详情页并发抓取线程数，1为顺序抓取
+            burst: 每个主机允许的突发请求数(令牌桶容量)
+            max_rate: 自适应提速上限(请求/秒)，默认为初始速率的4倍
+            http_cache_dir: HTTP磁盘缓存目录，None为不缓存
+            cache_max_age: 缓存在该秒数内直接使用，超过后用条件请求重新验证
+            frontier: CrawlFrontier，持久化爬取进度以便中断后续爬，None为不记录
+            import_batch_size: 流水线批量入库的每批条数(顺序模式按页入库)
         """
         self.delay = delay
         self.max_retries = max_retries
         self.timeout = timeout
+        self.concurrency = max(1, int(concurrency))
+        # AIMD自适应限速 - 从1/delay起步，按服务端反馈增减
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=1.0 / delay if delay > 0 else 1000.0,
+            capacity=burst,
+            max_rate=max_rate,
+        )
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': self._get_random_user_agent(),
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         })
-        self.last_request_time = 0
+        # requests.Session非线程安全 - 工作线程各持一个会话
+        self._local = threading.local()
+        self._local.session = self.session
+
+        self.http_cache = HttpCache(http_cache_dir) if http_cache_dir else None
+        self.cache_max_age = cache_max_age
+        # 离线模式: 只读缓存，不发网络请求
+        self.offline = False
+        self.frontier = frontier
+        self.import_batch_size = import_batch_size
+        # run()期间的批量导入写入器与后台封面处理池
+        self._import_writer = None
+        self._cover_downloader = None
 
     def _get_random_user_agent(self):
         """返回随机User-Agent以模拟不同浏览器"""
@@ -55,75 +103,48 @@ class BaseScraper(ABC):
         ]
         return random.choice(user_agents)
 
-    def _respect_rate_limits(self):
-        """确保请求间隔符合速率限制"""
-        current_time = time.time()
-        time_elapsed = current_time - self.last_request_time
-
-        if time_elapsed < self.delay:
-            time.sleep(self.delay - time_elapsed)
-
-        self.last_request_time = time.time()
+    def _get_session(self):
+        """当前线程的HTTP会话 - 与主会话共享请求头"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            self._local.session = session
+        return session
 
-    def _quantum_encoding_fix(self, text):
+    def _map_concurrent(self, func, items):
         """
-        量子编码修复算法 - 处理多重编码污染问题
+        线程池并发执行func，结果与items顺序对齐
 
-        算法核心：反向追踪编码转换路径，通过多次编解码实现"退火"效果
-        应对场景：特别适合处理被多次错误转码的文本
+        工作线程只做网络抓取与解析，数据库写入留在调用线程
         """
-        if not text:
-            return ""
-
-        # 试探性解码-重编码循环
-        # 一个更激进的方法是尝试从已经损坏的文本中恢复原始字节
-        try:
-            # 第一层：逆向到Latin-1字节流
-            try_bytes = text.encode('latin1')
-
-            # 第二层：尝试作为UTF-8解码（常见双重编码情况）
-            try_decode = try_bytes.decode('utf-8', errors='replace')
+        items = list(items)
+        if self.concurrency <= 1 or len(items) <= 1:
+            return [self._call_safely(func, item) for item in items]
 
-            # 质量检测 - 中日韩文字检测启发式算法
-            cjk_ratio = sum(1 for c in try_decode if 0x4E00 <= ord(c) <= 0x9FFF) / len(try_decode) if try_decode else 0
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as pool:
+            return list(pool.map(lambda item: self._call_safely(func, item), items))
 
-            # 如果包含足够比例的CJK字符，认为修复成功
-            if cjk_ratio > 0.1:  # 10%以上是CJK字符
-                return try_decode
+    @staticmethod
+    def _call_safely(func, item):
+        try:
+            return func(item)
+        except Exception as e:
+            logger.error(f"并发任务异常: {item}, 错误: {str(e)}")
+            return None
 
-            # 尝试更多组合（针对多次编码损坏的极端情况）
-            codec_chains = [
-                ('latin1', 'utf-8'),
-                ('utf-8', 'latin1', 'utf-8'),
-                ('cp1252', 'utf-8'),
-                ('gbk', 'utf-8'),
-            ]
+    def fetch_many(self, urls):
+        """并发获取多个URL，返回与urls对齐的Response列表(失败为None)"""
+        return self._map_concurrent(self.fetch_url, urls)
 
-            for chain in codec_chains:
-                try:
-                    temp = text
-                    # 应用编码链
-                    for i, codec in enumerate(chain):
-                        if i % 2 == 0:  # 偶数索引进行编码
-                            temp = temp.encode(codec)
-                        else:  # 奇数索引进行解码
-                            temp = temp.decode(codec, errors='replace')
-
-                    # 确保结果是字符串
-                    if isinstance(temp, bytes):
-                        temp = temp.decode('utf-8', errors='replace')
-
-                    # 再次进行CJK检测
-                    cjk_ratio = sum(1 for c in temp if 0x4E00 <= ord(c) <= 0x9FFF) / len(temp) if temp else 0
-                    if cjk_ratio > 0.1:
-                        return temp
-                except:
-                    continue
-        except:
-            pass
+    def _quantum_encoding_fix(self, text):
+        """
+        量子编码修复算法 - 处理多重编码污染问题
 
-        # 终极回退：ASCII过滤
-        return ''.join(c if ord(c) < 128 else '?' for c in text)
+        委托给text_normalization.fix_mojibake: 按正则字符类定位乱码片段逐段还原，
+        纯ASCII直接返回，重复字符串走缓存
+        """
+        return fix_mojibake(text)
 
     def fetch_url(self, url, params=None):
         """
@@ -136,35 +157,61 @@ class BaseScraper(ABC):
         Returns:
             requests.Response对象或None
         """
+        cache_url = url
+        if params:
+            cache_url = requests.Request('GET', url, params=params).prepare().url
+
+        cached = self.http_cache.get(cache_url) if self.http_cache else None
+        if self.offline:
+            if cached is None:
+                logger.warning(f"离线模式缓存未命中: {cache_url}")
+                return None
+            return cached.to_response()
+        if cached is not None and cached.age < self.cache_max_age:
+            return cached.to_response()
+
         for attempt in range(self.max_retries):
+            started = None
             try:
-                # 尊重网站速率限制
-                self._respect_rate_limits()
+                # 尊重网站速率限制 - 按主机令牌桶排队，退避等待也体现在令牌桶中
+                self.rate_limiter.acquire(url)
 
-                # 发送请求
-                response = self.session.get(
+                # 发送请求 - 有缓存时带校验头做条件请求
+                started = time.monotonic()
+                response = self._get_session().get(
                     url,
                     params=params,
-                    timeout=self.timeout
+                    timeout=self.timeout,
+                    headers=cached.validators() if cached is not None else None
                 )
+                latency = time.monotonic() - started
+
+                # 反馈给AIMD控制器 - 429/5xx降速，Retry-After暂停该主机
+                retry_after = None
+                if response.status_code in (429, 503):
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                self.rate_limiter.on_response(url, response.status_code, latency, retry_after, sent_at=started)
 
                 # 检查响应状态
                 if response.status_code == 200:
+                    if self.http_cache:
+                        self.http_cache.store(cache_url, response)
                     return response
+                elif response.status_code == 304 and cached is not None:
+                    # 内容未变化 - 使用缓存正文
+                    return (self.http_cache.touch(cache_url, response) or cached).to_response()
                 elif response.status_code == 404:
                     logger.warning(f"页面不存在: {url}")
                     return None
                 elif response.status_code in (429, 403):
                     # 触发了速率限制或禁止访问
-                    wait_time = self.delay * (attempt + 2)
-                    logger.warning(f"触发速率限制 ({response.status_code})，等待 {wait_time}秒")
-                    time.sleep(wait_time)
+                    logger.warning(f"触发速率限制 ({response.status_code})，"
+                                   f"Retry-After: {retry_after if retry_after is not None else '无'}")
                 else:
                     logger.warning(f"非200状态码: {response.status_code} 来自 {url}")
-                    time.sleep(self.delay)
             except (requests.RequestException, Exception) as e:
                 logger.error(f"请求异常 ({attempt + 1}/{self.max_retries}): {e} 来自 {url}")
-                time.sleep(self.delay * (attempt + 1))
+                self.rate_limiter.on_response(url, None, sent_at=started)
 
         logger.error(f"达到最大重试次数，无法获取: {url}")
         return None
@@ -173,58 +220,53 @@ class BaseScraper(ABC):
         """
         字节级编码规范化 - 解决多源编码混乱问题
 
-        处理流程:
-        1. 尝试检测输入文本的实际编码
-        2. 转换为UTF-8统一标准
+        处理流程见text_normalization.normalize_text:
+        1. 字节按候选编码解码
+        2. 修复乱码
         3. 清除不可打印字符和控制符
         """
-        if not text:
-            return ""
-
-        # 如果已经是字符串，尝试修复可能的编码问题
-        if isinstance(text, str):
-            try:
-                # 首先尝试作为utf-8反序列化，这可以捕获错误编码的字符串
-                text_bytes = text.encode('raw_unicode_escape')
+        return normalize_text(text)
 
-                # 然后尝试不同的编码格式解码
-                for encoding in ['utf-8', 'shift-jis', 'gbk', 'euc-jp']:
-                    try:
-                        decoded = text_bytes.decode(encoding, errors='strict')
-                        return decoded
-                    except UnicodeDecodeError:
-                        continue
-
-                # 如果都失败，使用宽容模式
-                return text_bytes.decode('utf-8', errors='replace')
-            except:
-                # 如果所有尝试都失败，保留原始文本但替换不可读字符
-                return ''.join(ch if ord(ch) < 128 else '?' for ch in text)
-
-        # 如果是字节对象，尝试解码
-        elif isinstance(text, bytes):
-            try:
-                return text.decode('utf-8', errors='replace')
-            except:
-                return text.decode('latin1', errors='replace')
-
-        return str(text)
+    def parse_html(self, html_content, parse_only=None):
+        """
+        解析HTML内容为BeautifulSoup对象
 
-    def parse_html(self, html_content):
-        """解析HTML内容为BeautifulSoup对象"""
+        Args:
+            parse_only: SoupStrainer，只为命中的节点建树，跳过页面其余部分
+        """
         try:
-            return BeautifulSoup(html_content, 'html.parser')
+            try:
+                return BeautifulSoup(html_content, self.HTML_PARSER, parse_only=parse_only)
+            except FeatureNotFound:
+                logger.warning(f"HTML解析器 {self.HTML_PARSER} 不可用，回退到 html.parser")
+                self.HTML_PARSER = 'html.parser'
+                return BeautifulSoup(html_content, 'html.parser', parse_only=parse_only)
         except Exception as e:
             logger.error(f"HTML解析错误: {e}")
             return None
 
-    def _anime_exists(self, url):
+    def _existing_external_ids(self, urls):
+        """列表页批量查重 - 一次IN查询取回本页已入库的外部ID"""
+        from anime.models import AnimeExternalId
+
+        if not self.source_name:
+            return set()
+        ids = {self._extract_id_from_url(url) for url in urls} - {None}
+        if not ids:
+            return set()
+        return set(AnimeExternalId.objects.filter(
+            source=self.source_name, external_id__in=ids
+        ).values_list('external_id', flat=True))
+
+    def _anime_exists(self, url, known_ids=None):
         """
         检查动漫是否已存在于数据库中
         使用多种判断条件提高准确性
+
+        Args:
+            known_ids: _existing_external_ids预取的已入库ID集合，提供时不再逐条查询
         """
-        from anime.models import Anime
-        import re
+        from anime.models import AnimeExternalId
 
         # 提取URL中的唯一标识
         anime_id = self._extract_id_from_url(url)
@@ -232,8 +274,15 @@ class BaseScraper(ABC):
             logger.warning(f"无法从URL提取动漫ID: {url}")
             return False
 
-        # 方法1: 通过ID精确匹配
-        if Anime.objects.filter(description__regex=f"ID: {anime_id}[^0-9]").exists():
+        # 方法1: 通过外部ID映射表精确匹配(唯一索引)
+        if known_ids is not None:
+            id_exists = anime_id in known_ids
+        elif self.source_name:
+            id_exists = AnimeExternalId.objects.filter(
+                source=self.source_name, external_id=anime_id).exists()
+        else:
+            id_exists = False
+        if id_exists:
             logger.info(f"动漫 ID: {anime_id} 已存在于数据库中")
             return True
 
@@ -246,26 +295,257 @@ class BaseScraper(ABC):
                 if soup:
                     title_element = soup.select_one('h1.title-name')
                     if title_element:
-                        title = title_element.text.strip()
-                        # 标题完全匹配
-                        if Anime.objects.filter(title=title).exists():
-                            logger.info(f"标题为 '{title}' 的动漫已存在于数据库中")
-                            return True
-
-                        # 标题相似性匹配 - 移除特殊字符后比较
-                        clean_title = re.sub(r'[^\w\s]', '', title).lower()
-                        for anime in Anime.objects.all():
-                            clean_db_title = re.sub(r'[^\w\s]', '', anime.title).lower()
-                            # 如果标题非常相似
-                            if clean_title == clean_db_title:
-                                logger.info(f"找到相似标题: DB='{anime.title}' 爬取='{title}'")
-                                return True
+                        return self._title_exists(title_element.text.strip())
         except Exception as e:
             logger.error(f"检查标题匹配时出错: {str(e)}")
 
         return False
 
-    def run(self, start_page=1, max_pages=1, incremental=True, do_import=True):
+    def is_detail_url(self, url):
+        """是否为详情页URL - 默认能提取出动漫ID即视为详情页"""
+        return self._extract_id_from_url(url) is not None
+
+    def reparse_from_cache(self, do_import=True):
+        """
+        离线重解析 - 对缓存中的全部详情页重新执行scrape_anime_details，不发任何网络请求
+
+        解析器修复后无需重新爬取: 已入库的动漫按外部ID刷新描述类字段，未入库的新建
+
+        Returns:
+            统计字典 {'parsed', 'created', 'updated', 'failed'}
+        """
+        if not self.http_cache:
+            raise ValueError("未配置HTTP缓存目录，无法离线重解析")
+
+        stats = {'parsed': 0, 'created': 0, 'updated': 0, 'failed': 0}
+        previous_offline, self.offline = self.offline, True
+        try:
+            for url in self.http_cache.iter_urls():
+                if not self.is_detail_url(url):
+                    continue
+                try:
+                    anime_data = self.scrape_anime_details(url)
+                    if not anime_data:
+                        stats['failed'] += 1
+                        continue
+                    stats['parsed'] += 1
+                    if not do_import:
+                        continue
+
+                    model_data = self.convert_to_model(anime_data)
+                    result = self._apply_reparsed(model_data) if model_data else 'failed'
+                    stats[result] += 1
+                except Exception as e:
+                    logger.error(f"重解析缓存页面出错: {url}, 错误: {str(e)}")
+                    stats['failed'] += 1
+        finally:
+            self.offline = previous_offline
+
+        logger.info(f"离线重解析完成: {stats}")
+        return stats
+
+    def _apply_reparsed(self, model_data):
+        """重解析结果入库 - 返回'created'/'updated'/'failed'"""
+        from anime.models import Anime, AnimeType, AnimeExternalId
+
+        external_id = model_data.get('external_id')
+        anime_id = None
+        if external_id and self.source_name:
+            anime_id = AnimeExternalId.objects.filter(
+                source=self.source_name, external_id=str(external_id)
+            ).values_list('anime_id', flat=True).first()
+
+        if anime_id is None:
+            return 'created' if self._save_anime(model_data) else 'failed'
+
+        fields = {key: model_data[key] for key in self.REPARSE_FIELDS if key in model_data}
+        if model_data.get('type'):
+            fields['type'], _ = AnimeType.objects.get_or_create(
+                name=model_data['type'],
+                defaults={'description': f'爬虫导入的类型: {model_data["type"]}'}
+            )
+        Anime.objects.filter(id=anime_id).update(**fields)
+        return 'updated'
+
+    def _title_exists(self, title):
+        """按标题查重 - 完全匹配或去除特殊字符后相同"""
+        from anime.models import Anime
+        import re
+
+        if not title:
+            return False
+
+        # 标题完全匹配
+        if Anime.objects.filter(title=title).exists():
+            logger.info(f"标题为 '{title}' 的动漫已存在于数据库中")
+            return True
+
+        # 标题相似性匹配 - 移除特殊字符后比较
+        clean_title = re.sub(r'[^\w\s]', '', title).lower()
+        for db_title in Anime.objects.values_list('title', flat=True).iterator():
+            clean_db_title = re.sub(r'[^\w\s]', '', db_title).lower()
+            # 如果标题非常相似
+            if clean_title == clean_db_title:
+                logger.info(f"找到相似标题: DB='{db_title}' 爬取='{title}'")
+                return True
+
+        return False
+
+    # ==================== 爬取前沿 ====================
+
+    def _frontier_mark(self, url, state, error=None):
+        """记录URL处理进度(未启用前沿时为空操作)"""
+        if self.frontier is None:
+            return
+        key = self._extract_id_from_url(url)
+        if key:
+            self.frontier.mark(key, url, state, error)
+
+    def _frontier_record_page(self, page, anime_urls):
+        """列表页完成 - 本页URL登记入队并落盘检查点"""
+        if self.frontier is None:
+            return
+        items = [(self._extract_id_from_url(url), url) for url in anime_urls]
+        self.frontier.record_page(page, [(key, url) for key, url in items if key])
+
+    def _frontier_filter(self, anime_urls, stats):
+        """去掉前沿中已完成导入的URL - 内存字典O(1)判断，不访问数据库与网络"""
+        if self.frontier is None:
+            return anime_urls
+        pending = [url for url in anime_urls if not self.frontier.is_done(self._extract_id_from_url(url))]
+        stats['skipped'] += len(anime_urls) - len(pending)
+        return pending
+
+    def _handle_scraped(self, url, anime_data, do_import, stats):
+        """处理一条详情页结果 - 统计、转换并入库"""
+        if not anime_data:
+            logger.warning(f"无法获取动漫详情: {url}")
+            self._frontier_mark(url, CrawlFrontier.FAILED, '详情页抓取或解析失败')
+            return
+
+        stats['scraped'] += 1
+
+        # 如果不导入数据库，只统计爬取数量
+        if not do_import:
+            logger.info(f"成功爬取动漫: {anime_data.get('title', '未知标题')} (未导入数据库)")
+            self._frontier_mark(url, CrawlFrontier.PARSED)
+            return
+
+        # 转换为模型格式并保存 - 批量模式下先缓冲，批末统一写入
+        model_data = self.convert_to_model(anime_data)
+        if model_data and self._import_writer is not None:
+            self._import_writer.add(model_data, token=url)
+        elif model_data:
+            if self._save_anime(model_data):
+                stats['added'] += 1
+                self._frontier_mark(url, CrawlFrontier.IMPORTED)
+                logger.info(f"成功添加动漫: {model_data.get('title', '未知标题')}")
+            else:
+                self._frontier_mark(url, CrawlFrontier.FAILED, '保存失败')
+                logger.error(f"保存动漫失败: {model_data.get('title', '未知标题')}")
+        else:
+            self._frontier_mark(url, CrawlFrontier.FAILED, '缺少标题')
+
+    def make_import_writer(self, batch_size=None, cover_downloader=None):
+        """创建批量导入写入器 - 批内查重/类型解析/slug计算在写入器中完成"""
+        return AnimeImportWriter(source_name=self.source_name, batch_size=batch_size,
+                                 cover_downloader=cover_downloader)
+
+    def make_cover_downloader(self, workers=None):
+        """创建后台封面处理池 - 默认与详情页并发数相同"""
+        return CoverDownloader(self, workers=workers or self.concurrency)
+
+    def _flush_import(self, writer, stats):
+        """写入一批缓冲的动漫，按结果更新统计与爬取前沿；顺带回写已完成的封面"""
+        if len(writer):
+            self._apply_import_results(writer.flush(), stats)
+        if writer.cover_downloader is not None:
+            writer.cover_downloader.drain()
+
+    def _apply_import_results(self, results, stats):
+        """批量导入结果 → 统计与爬取前沿状态"""
+        for result in results:
+            if result.status == 'created':
+                stats['added'] += 1
+                self._frontier_mark(result.token, CrawlFrontier.IMPORTED)
+                logger.info(f"成功添加动漫: {result.title}")
+            elif result.status == 'duplicate':
+                stats['skipped'] += 1
+                self._frontier_mark(result.token, CrawlFrontier.IMPORTED)
+                logger.info(f"动漫已存在，跳过: {result.title}")
+            else:
+                self._frontier_mark(result.token, CrawlFrontier.FAILED, '批量保存失败')
+                logger.error(f"保存动漫失败: {result.title}")
+
+    def _process_page_concurrent(self, anime_urls, known_ids, incremental, do_import, stats):
+        """
+        并发处理一页 - 详情页由线程池抓取解析，限速交给令牌桶，
+        查重(按抓到的标题，免去二次请求)与入库在当前线程顺序执行
+        """
+        pending = anime_urls
+        if incremental:
+            pending = []
+            for url in anime_urls:
+                if self._extract_id_from_url(url) in known_ids:
+                    stats['skipped'] += 1
+                    self._frontier_mark(url, CrawlFrontier.IMPORTED)
+                else:
+                    pending.append(url)
+
+        logger.info(f"并发抓取 {len(pending)} 个详情页 (并发数: {self.concurrency})")
+        details = self._map_concurrent(self.scrape_anime_details, pending)
+
+        for url, anime_data in zip(pending, details):
+            try:
+                # 批量导入时由写入器在内存中按标题查重
+                if (incremental and anime_data and self._import_writer is None
+                        and self._title_exists(anime_data.get('title'))):
+                    logger.info(f"动漫已存在，跳过: {url}")
+                    stats['skipped'] += 1
+                    self._frontier_mark(url, CrawlFrontier.IMPORTED)
+                    continue
+                self._handle_scraped(url, anime_data, do_import, stats)
+            except Exception as e:
+                logger.error(f"处理动漫URL时出错: {url}, 错误: {str(e)}")
+                self._frontier_mark(url, CrawlFrontier.FAILED, str(e))
+
+    def _process_urls(self, anime_urls, incremental, do_import, stats):
+        """处理一批详情URL - 前沿/外部ID查重后顺序或并发抓取，整批一次写入"""
+        if incremental:
+            anime_urls = self._frontier_filter(anime_urls, stats)
+
+        # 整批外部ID一次性查重
+        known_ids = self._existing_external_ids(anime_urls) if incremental else set()
+
+        if self.concurrency > 1:
+            self._process_page_concurrent(anime_urls, known_ids, incremental, do_import, stats)
+        else:
+            self._process_urls_sequential(anime_urls, known_ids, incremental, do_import, stats)
+
+        if self._import_writer is not None:
+            self._flush_import(self._import_writer, stats)
+
+    def _process_urls_sequential(self, anime_urls, known_ids, incremental, do_import, stats):
+        """逐条抓取 - 每条先查重(必要时请求详情页比对标题)再抓取"""
+        for url in anime_urls:
+            try:
+                # 检查是否已存在（增量爬取模式）
+                if incremental and self._anime_exists(url, known_ids=known_ids):
+                    logger.info(f"动漫已存在，跳过: {url}")
+                    stats['skipped'] += 1
+                    self._frontier_mark(url, CrawlFrontier.IMPORTED)
+                    continue
+
+                # 获取动漫详情
+                logger.info(f"获取动漫详情: {url}")
+                anime_data = self.scrape_anime_details(url)
+                self._handle_scraped(url, anime_data, do_import, stats)
+            except Exception as e:
+                logger.error(f"处理动漫URL时出错: {url}, 错误: {str(e)}")
+                self._frontier_mark(url, CrawlFrontier.FAILED, str(e))
+                continue
+
+    def run(self, start_page=1, max_pages=1, incremental=True, do_import=True, resume=False):
         """
         运行爬虫主流程
 
@@ -274,6 +554,8 @@ class BaseScraper(ABC):
             max_pages: 最大爬取页数
             incremental: 是否增量爬取（只获取新内容）
             do_import: 是否将爬取的数据导入数据库
+            resume: 从爬取前沿的检查点续爬 - 先补完上次未完成的URL，
+                    再从start_page起第一个未完成的列表页继续
 
         Returns:
             新增动漫数量
@@ -283,11 +565,24 @@ class BaseScraper(ABC):
         logger.info(f"导入数据库: {'开启' if do_import else '关闭'}")
         logger.info(f"爬取页面: 从第{start_page}页开始，共{max_pages}页")
 
-        total_added = 0
-        total_skipped = 0
-        total_scraped = 0
+        stats = {'added': 0, 'skipped': 0, 'scraped': 0}
+        # 按页批量入库 - 非强制模式下由写入器按标题查重
+        self._import_writer = None
+        if do_import:
+            self._cover_downloader = self.make_cover_downloader()
+            self._import_writer = self.make_import_writer(cover_downloader=self._cover_downloader)
+            self._import_writer.dedupe_titles = incremental
 
         try:
+            if resume and self.frontier is not None:
+                pending = self.frontier.pending()
+                if pending:
+                    logger.info(f"续爬: 补完上次未完成的 {len(pending)} 个详情URL")
+                    self._process_urls(pending, incremental, do_import, stats)
+                    self.frontier.checkpoint()
+                start_page = self.frontier.next_page(start_page)
+                logger.info(f"续爬: 从第{start_page}页继续")
+
             for page_offset in range(max_pages):
                 current_page = start_page + page_offset
                 logger.info(f"爬取第 {current_page} 页")
@@ -299,64 +594,38 @@ class BaseScraper(ABC):
                     break
 
                 logger.info(f"在第 {current_page} 页发现 {len(anime_urls)} 个动漫链接")
+                self._frontier_record_page(current_page, anime_urls)
 
-                for url in anime_urls:
-                    try:
-                        # 检查是否已存在（增量爬取模式）
-                        if incremental and self._anime_exists(url):
-                            logger.info(f"动漫已存在，跳过: {url}")
-                            total_skipped += 1
-                            continue
-
-                        # 获取动漫详情
-                        logger.info(f"获取动漫详情: {url}")
-                        anime_data = self.scrape_anime_details(url)
-                        if not anime_data:
-                            logger.warning(f"无法获取动漫详情: {url}")
-                            continue
-
-                        total_scraped += 1
-
-                        # 如果不导入数据库，只统计爬取数量
-                        if not do_import:
-                            logger.info(f"成功爬取动漫: {anime_data.get('title', '未知标题')} (未导入数据库)")
-                            continue
-
-                        # 转换为模型格式并保存
-                        model_data = self.convert_to_model(anime_data)
-                        if model_data:
-                            if self._save_anime(model_data):
-                                total_added += 1
-                                logger.info(f"成功添加动漫: {model_data.get('title', '未知标题')}")
-                            else:
-                                logger.error(f"保存动漫失败: {model_data.get('title', '未知标题')}")
-                    except Exception as e:
-                        logger.error(f"处理动漫URL时出错: {url}, 错误: {str(e)}")
-                        continue
+                self._process_urls(anime_urls, incremental, do_import, stats)
+                if self.frontier is not None:
+                    self.frontier.checkpoint()
 
-                    # 使用指数退避策略的随机延迟
-                    base_delay = self.delay
-                    random_factor = random.uniform(0.5, 1.5)  # 50%-150%的变化
-                    delay_time = base_delay * random_factor
-                    logger.debug(f"等待 {delay_time:.2f} 秒后继续")
-                    time.sleep(delay_time)
+            logger.info(f"自适应限速状态: {self.rate_limiter.snapshot()}")
 
-            result_msg = f"爬虫完成: 爬取 {total_scraped} 部动漫"
+            result_msg = f"爬虫完成: 爬取 {stats['scraped']} 部动漫"
             if do_import:
-                result_msg += f", 导入 {total_added} 部动漫, 跳过 {total_skipped} 部已存在动漫"
+                result_msg += f", 导入 {stats['added']} 部动漫, 跳过 {stats['skipped']} 部已存在动漫"
 
             logger.info(result_msg)
-            return total_added if do_import else total_scraped
+            return stats['added'] if do_import else stats['scraped']
 
         except Exception as e:
             logger.error(f"爬虫运行异常: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
-            return total_added if do_import else total_scraped
+            return stats['added'] if do_import else stats['scraped']
+
+        finally:
+            self._import_writer = None
+            if self._cover_downloader is not None:
+                self._cover_downloader.close()
+                self._cover_downloader = None
+            if self.frontier is not None:
+                self.frontier.checkpoint()
 
     def _save_anime(self, data):
         """保存动漫数据到数据库"""
-        from anime.models import Anime, AnimeType
+        from anime.models import Anime, AnimeType, AnimeExternalId
         from django.db import transaction
         import traceback
 
@@ -384,20 +653,19 @@ class BaseScraper(ABC):
                     rating_count=data.get('rating_count', 0)
                 )
 
-                # 如果有封面URL，下载封面
+                # 如果有封面URL，下载封面 - 按内容哈希去重存储并生成缩略图
                 if 'cover_url' in data and data['cover_url']:
                     try:
-                        image_response = self.fetch_url(data['cover_url'])
-                        if image_response:
-                            image_content = image_response.content
-                            from django.core.files.base import ContentFile
-                            import os
-                            filename = os.path.basename(data['cover_url'])
-                            if not filename or not filename.strip():
-                                filename = f"cover_{data['title']}.jpg"
-                            if not filename.endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif')):
-                                filename += '.jpg'
-                            anime.cover.save(filename, ContentFile(image_content), save=False)
+                        from anime.covers import store_cover, generate_thumbnails
+
+                        image_content = data.get('cover_content')
+                        if image_content is None:
+                            image_response = self.fetch_url(data['cover_url'])
+                            image_content = image_response.content if image_response else None
+                        cover_name = store_cover(image_content) if image_content else None
+                        if cover_name:
+                            generate_thumbnails(cover_name)
+                            anime.cover.name = cover_name
                         else:
                             logger.warning(f"无法获取封面图片: {data['cover_url']}")
                     except Exception as e:
@@ -405,6 +673,16 @@ class BaseScraper(ABC):
                         logger.error(traceback.format_exc())
 
                 anime.save()
+
+                # 记录外部ID映射，供增量爬取查重与跨源关联
+                external_id = data.get('external_id')
+                if external_id and self.source_name:
+                    AnimeExternalId.objects.get_or_create(
+                        source=self.source_name,
+                        external_id=str(external_id),
+                        defaults={'anime': anime}
+                    )
+
                 logger.info(f"保存动漫成功: {data['title']}")
                 return True
 
@@ -439,11 +717,10 @@ class BaseScraper(ABC):
         if not data or 'title' not in data or not data['title']:
             return None
 
-        # 2. 文本字段量子编码修复 - 对所有文本字段应用量子编码修复
+        # 2. 文本字段量子编码修复 - 修复乱码并清除控制字符
         for key in ['title', 'original_title', 'description']:
             if key in data and data[key]:
-                # 应用更激进的量子编码修复算法
-                data[key] = self._quantum_encoding_fix(data[key])
+                data[key] = self.normalize_text(data[key])
 
         # 3. 数据规范化与转换 - 构建标准化的模型数据
         model_data = {
@@ -453,7 +730,8 @@ class BaseScraper(ABC):
             'type': data.get('type', '未分类'),
             'episodes': int(data.get('episodes', 1)),  # 强制数值类型转换
             'is_completed': bool(data.get('is_completed', False)),  # 显式类型转换
-            'cover_url': data.get('cover_url', '')
+            'cover_url': data.get('cover_url', ''),
+            'external_id': data.get('id')
         }
 
         # 4. 可选字段处理 - 条件注入
@@ -521,4 +799,15 @@ class BaseScraper(ABC):
         Returns:
             动漫数据字典
         """
-        pass
\ No newline at end of file
+        pass
+
+    def parse_anime_details(self, url, html):
+        """
+        解析已下载的详情页HTML - 流水线爬取时在解析进程池中调用
+
+        实现不得依赖网络、数据库或实例上的运行时状态
+
+        Returns:
+            动漫数据字典
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} 未实现 parse_anime_details")
\ No newline at end of file
@@ -0,0 +1,113 @@
+# recommendation/scrapers/cover_downloader.py
+# 后台封面下载 - 入库不再等待封面: 工作线程下载、按内容哈希去重存储并生成缩略图，
+# 调用线程定期回收结果，按封面批量回写Anime.cover
+
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger('django')
+
+
+class CoverDownloader:
+    """
+    封面后台处理池
+
+    - submit(): 入库后提交(动漫主键, 封面URL[, 已下载内容])，立即返回
+    - 工作线程: 经爬虫fetch_url下载(仍受按主机限速) → store_cover去重存储 → 生成缩略图，
+      不访问数据库
+    - drain(): 在调用线程回收已完成的任务，同一封面的动漫用一条UPDATE回写
+    """
+
+    def __init__(self, scraper, workers=4):
+        self.scraper = scraper
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cover')
+        self._futures = []
+        self._lock = threading.Lock()
+        self._seen_urls = {}
+        self.stats = {'submitted': 0, 'downloaded': 0, 'reused': 0, 'failed': 0, 'updated': 0}
+
+    def submit(self, anime_id, cover_url, content=None):
+        if not cover_url:
+            return
+        future = self._executor.submit(self._process, anime_id, cover_url, content)
+        with self._lock:
+            self._futures.append(future)
+            self.stats['submitted'] += 1
+
+    def _count(self, field):
+        with self._lock:
+            self.stats[field] += 1
+
+    def _process(self, anime_id, cover_url, content):
+        """工作线程 - 返回(动漫主键, 封面存储路径或None)"""
+        from anime.covers import store_cover, generate_thumbnails
+
+        try:
+            # 同一URL只下载一次(多部动漫共用占位图等情况)
+            with self._lock:
+                cover_name = self._seen_urls.get(cover_url)
+            if cover_name:
+                self._count('reused')
+                return anime_id, cover_name
+
+            if content is None:
+                response = self.scraper.fetch_url(cover_url)
+                content = response.content if response else None
+            if not content:
+                logger.warning(f"无法获取封面图片: {cover_url}")
+                self._count('failed')
+                return anime_id, None
+
+            cover_name = store_cover(content)
+            if not cover_name:
+                self._count('failed')
+                return anime_id, None
+            generate_thumbnails(cover_name)
+            with self._lock:
+                self._seen_urls[cover_url] = cover_name
+            self._count('downloaded')
+            return anime_id, cover_name
+        except Exception as e:
+            logger.error(f"封面处理失败: {cover_url}, 错误: {str(e)}")
+            self._count('failed')
+            return anime_id, None
+
+    def drain(self, block=False):
+        """
+        回收已完成的任务并回写数据库
+
+        Args:
+            block: 等待全部已提交任务完成
+        """
+        from anime.models import Anime
+
+        with self._lock:
+            futures = list(self._futures)
+        if block:
+            wait(futures)
+        done = [future for future in futures if future.done()]
+        if not done:
+            return 0
+        done_set = set(done)
+        with self._lock:
+            self._futures = [future for future in self._futures if future not in done_set]
+
+        by_cover = defaultdict(list)
+        for future in done:
+            anime_id, cover_name = future.result()
+            if cover_name:
+                by_cover[cover_name].append(anime_id)
+        updated = 0
+        for cover_name, anime_ids in by_cover.items():
+            updated += Anime.objects.filter(pk__in=anime_ids).update(cover=cover_name)
+        self.stats['updated'] += updated
+        return updated
+
+    def close(self):
+        """等待剩余任务、回写并关闭线程池"""
+        self.drain(block=True)
+        self._executor.shutdown(wait=True)
+        logger.info(f"封面处理统计: {self.stats}")
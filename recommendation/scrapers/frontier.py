@@ -0,0 +1,177 @@
+# recommendation/scrapers/frontier.py
+# 爬取前沿(frontier) - 用SQLite文件持久化列表页与详情URL的处理进度，中断后可从检查点续爬
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('django')
+
+
+class CrawlFrontier:
+    """
+    持久化爬取前沿
+
+    - list_pages: 已完成的列表页(其URL已全部登记入队)
+    - urls: 详情URL及状态 queued → fetched → parsed → imported，失败记failed并累计次数
+
+    打开时整张表载入内存字典，查询均为O(1)；状态变更先写内存，
+    每flush_every次变更或调用checkpoint()时批量落盘。
+    变更可能来自流水线的多个线程，统一由一把锁保护。
+    """
+
+    QUEUED = 'queued'
+    FETCHED = 'fetched'
+    PARSED = 'parsed'
+    IMPORTED = 'imported'
+    FAILED = 'failed'
+
+    def __init__(self, path, source, flush_every=200, max_attempts=3):
+        self.path = path
+        self.source = source
+        self.flush_every = flush_every
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._dirty = {}
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS list_pages (
+                source TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                url_count INTEGER NOT NULL,
+                finished_at REAL NOT NULL,
+                PRIMARY KEY (source, page)
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                source TEXT NOT NULL,
+                key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (source, key)
+            );
+        ''')
+        self._pages = {
+            page for (page,) in self._conn.execute(
+                'SELECT page FROM list_pages WHERE source = ?', (source,))
+        }
+        # key -> [url, state, attempts, error]
+        self._urls = {
+            key: [url, state, attempts, error] for key, url, state, attempts, error in self._conn.execute(
+                'SELECT key, url, state, attempts, error FROM urls WHERE source = ?', (source,))
+        }
+
+    # ==================== 查询 ====================
+
+    def page_done(self, page):
+        return page in self._pages
+
+    def next_page(self, start_page=1):
+        """从start_page起第一个未完成的列表页 - 续爬起点"""
+        page = start_page
+        while page in self._pages:
+            page += 1
+        return page
+
+    def is_done(self, key):
+        entry = self._urls.get(key)
+        return entry is not None and entry[1] == self.IMPORTED
+
+    def state_of(self, key):
+        entry = self._urls.get(key)
+        return entry[1] if entry else None
+
+    def pending(self):
+        """已登记但未完成导入的URL(失败次数未超限)"""
+        with self._lock:
+            return [
+                entry[0] for entry in self._urls.values()
+                if entry[1] != self.IMPORTED and entry[2] < self.max_attempts
+            ]
+
+    def stats(self):
+        counts = {'pages': len(self._pages)}
+        with self._lock:
+            for entry in self._urls.values():
+                counts[entry[1]] = counts.get(entry[1], 0) + 1
+        return counts
+
+    # ==================== 更新 ====================
+
+    def record_page(self, page, items):
+        """
+        登记列表页 - 新URL入队，已登记的保持原状态；随后立即落盘检查点
+
+        Args:
+            items: [(key, url), ...]
+        """
+        with self._lock:
+            for key, url in items:
+                if key not in self._urls:
+                    self._urls[key] = [url, self.QUEUED, 0, None]
+                    self._dirty[key] = True
+            self._pages.add(page)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO list_pages (source, page, url_count, finished_at) VALUES (?, ?, ?, ?)',
+                (self.source, page, len(items), time.time()))
+            self._flush_locked()
+
+    def mark(self, key, url, state, error=None):
+        """更新URL状态；已导入的不会被回退"""
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is None:
+                entry = self._urls[key] = [url, self.QUEUED, 0, None]
+            elif entry[1] == self.IMPORTED and state != self.IMPORTED:
+                return
+            entry[1] = state
+            if state == self.FAILED:
+                entry[2] += 1
+                entry[3] = error
+            self._dirty[key] = True
+            if len(self._dirty) >= self.flush_every:
+                self._flush_locked()
+
+    def checkpoint(self):
+        """将内存中的状态变更批量写入SQLite"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        now = time.time()
+        rows = []
+        for key in self._dirty:
+            url, state, attempts, error = self._urls[key]
+            rows.append((self.source, key, url, state, attempts, error, now))
+        self._dirty = {}
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO urls (source, key, url, state, attempts, error, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.error(f"爬取前沿检查点写入失败: {str(e)}")
+
+    def reset(self):
+        """清空当前数据源的全部进度"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM list_pages WHERE source = ?', (self.source,))
+                self._conn.execute('DELETE FROM urls WHERE source = ?', (self.source,))
+            self._pages.clear()
+            self._urls.clear()
+            self._dirty = {}
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
@@ -0,0 +1,160 @@
+# recommendation/scrapers/http_cache.py
+# 爬虫HTTP磁盘缓存 - 按URL存gzip压缩正文与校验头，支持条件请求重新验证与离线重解析
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+import requests
+
+logger = logging.getLogger('django')
+
+
+class CachedPage:
+    """缓存条目 - 元数据 + 解压后的正文"""
+
+    def __init__(self, meta, body):
+        self.meta = meta
+        self.body = body
+
+    @property
+    def url(self):
+        return self.meta['url']
+
+    @property
+    def age(self):
+        return time.time() - self.meta.get('fetched_at', 0)
+
+    def validators(self):
+        """条件请求头 - If-None-Match / If-Modified-Since"""
+        headers = {}
+        if self.meta.get('etag'):
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'):
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+    def to_response(self):
+        """还原为requests.Response，调用方无需区分是否命中缓存"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response._content = self.body
+        response.encoding = self.meta.get('encoding')
+        response.headers.update({
+            key: value for key, value in (
+                ('Content-Type', self.meta.get('content_type')),
+                ('ETag', self.meta.get('etag')),
+                ('Last-Modified', self.meta.get('last_modified')),
+            ) if value
+        })
+        response.from_cache = True
+        return response
+
+
+class HttpCache:
+    """
+    磁盘HTTP缓存
+
+    布局: <cache_dir>/<sha1前两位>/<sha1>.json(元数据) + <sha1>.gz(正文)
+    只缓存文本类响应(HTML等)，封面图片等二进制内容不入缓存
+    """
+
+    CACHEABLE_TYPES = ('text/', 'application/xhtml', 'application/json', 'application/xml')
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, url):
+        key = self.key_for(url)
+        folder = os.path.join(self.cache_dir, key[:2])
+        return folder, os.path.join(folder, f"{key}.json"), os.path.join(folder, f"{key}.gz")
+
+    @staticmethod
+    def _atomic_write(path, data, mode='wb'):
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        # 文本模式(元数据JSON)固定UTF-8，与读取端一致，不受系统默认编码影响
+        encoding = None if 'b' in mode else 'utf-8'
+        with open(tmp_path, mode, encoding=encoding) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def is_cacheable(self, response):
+        content_type = response.headers.get('Content-Type', '').lower()
+        return response.status_code == 200 and content_type.startswith(self.CACHEABLE_TYPES)
+
+    def get(self, url):
+        """读取缓存条目，未命中或损坏返回None"""
+        _, meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with gzip.open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError, EOFError):
+            return None
+        return CachedPage(meta, body)
+
+    def store(self, url, response):
+        """写入200文本响应 - 正文先于元数据落盘，元数据存在即代表条目完整"""
+        if not self.is_cacheable(response):
+            return False
+
+        folder, meta_path, body_path = self._paths(url)
+        os.makedirs(folder, exist_ok=True)
+        meta = {
+            'url': url,
+            'fetched_at': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_type': response.headers.get('Content-Type'),
+            'encoding': response.encoding,
+        }
+        try:
+            self._atomic_write(body_path, gzip.compress(response.content, compresslevel=6))
+            self._atomic_write(meta_path, json.dumps(meta, ensure_ascii=False), mode='w')
+            return True
+        except OSError as e:
+            logger.error(f"写入HTTP缓存失败: {url}, 错误: {str(e)}")
+            return False
+
+    def touch(self, url, response=None):
+        """304后刷新获取时间，并更新服务端返回的新校验头"""
+        page = self.get(url)
+        if page is None:
+            return None
+        page.meta['fetched_at'] = time.time()
+        if response is not None:
+            for header, field in (('ETag', 'etag'), ('Last-Modified', 'last_modified')):
+                if response.headers.get(header):
+                    page.meta[field] = response.headers[header]
+        _, meta_path, _ = self._paths(url)
+        try:
+            self._atomic_write(meta_path, json.dumps(page.meta, ensure_ascii=False), mode='w')
+        except OSError as e:
+            logger.error(f"刷新HTTP缓存失败: {url}, 错误: {str(e)}")
+        return page
+
+    def iter_urls(self):
+        """遍历已缓存的URL(读取元数据，不解压正文)"""
+        for folder in sorted(os.listdir(self.cache_dir)):
+            folder_path = os.path.join(self.cache_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in sorted(os.listdir(folder_path)):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(folder_path, name), 'r', encoding='utf-8') as f:
+                        yield json.load(f)['url']
+                except (OSError, ValueError, KeyError):
+                    continue
@@ -0,0 +1,209 @@
+# recommendation/scrapers/import_writer.py
+# 批量导入写入器 - 缓冲转换后的动漫数据，按批一次性解析类型、预计算slug并bulk_create入库
+
+import logging
+import re
+import traceback
+import uuid
+from collections import namedtuple
+
+from django.utils import timezone
+
+logger = logging.getLogger('django')
+
+# 单条导入结果 - status: created / duplicate / failed
+ImportResult = namedtuple('ImportResult', ['token', 'title', 'status', 'anime'])
+
+TITLE_CLEAN_PATTERN = re.compile(r'[^\w\s]')
+
+
+def clean_title(title):
+    """标题查重键 - 与BaseScraper._title_exists的相似标题规则一致(去特殊字符、小写)"""
+    return TITLE_CLEAN_PATTERN.sub('', title or '').lower()
+
+
+class AnimeImportWriter:
+    """
+    批量导入写入器
+
+    每批固定的少量查询，与批内条数无关:
+    - 类型: 1次 name__in 查询 + 缺失类型1次 bulk_create(+1次回查主键)
+    - 查重: 外部ID 1次 IN 查询；标题集合首批加载1次，之后在内存中维护
+    - 动漫: 1次 bulk_create + 1次按uuid回查主键(MySQL的bulk_create不回填主键)
+    - 外部ID映射: 1次 bulk_create
+
+    slug在内存中预先计算(与Anime.save()规则一致)，bulk_create不触发save()与信号；
+    封面不在写入时下载，事务提交后交给CoverDownloader在后台处理
+    """
+
+    def __init__(self, source_name=None, batch_size=50, dedupe_titles=True, cover_downloader=None):
+        """
+        Args:
+            batch_size: 缓冲满该条数时自动写入，None为只在调用flush()时写入
+            dedupe_titles: 按标题(去特殊字符、小写)跳过库内与批内重复
+            cover_downloader: CoverDownloader，新建动漫的封面提交给它后台下载
+        """
+        self.source_name = source_name
+        self.batch_size = batch_size
+        self.dedupe_titles = dedupe_titles
+        self.cover_downloader = cover_downloader
+        self._buffer = []
+        self._titles = None
+        self._types = {}
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, model_data, token=None):
+        """
+        缓冲一条convert_to_model()的结果，缓冲满时自动写入
+
+        Returns:
+            自动写入时为本批结果列表，否则为空列表
+        """
+        self._buffer.append((token, model_data))
+        if self.batch_size and len(self._buffer) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """写入缓冲区中的全部数据，整批一个事务；失败时整批记为failed"""
+        from django.db import transaction
+
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return []
+
+        try:
+            with transaction.atomic():
+                results = self._write_batch(batch)
+        except Exception as e:
+            logger.error(f"批量导入失败({len(batch)}条): {str(e)}")
+            logger.error(traceback.format_exc())
+            # 事务已回滚，内存中的标题集合需重新加载
+            self._titles = None
+            self._types = {}
+            return [ImportResult(token, data.get('title'), 'failed', None) for token, data in batch]
+
+        # 事务提交后再提交封面任务，回滚的记录不会被回写
+        created = 0
+        for (_, data), result in zip(batch, results):
+            if result.status != 'created':
+                continue
+            created += 1
+            if self.cover_downloader is not None and data.get('cover_url'):
+                self.cover_downloader.submit(result.anime.pk, data['cover_url'], data.get('cover_content'))
+        logger.info(f"批量导入完成: 新增 {created} 部, 重复 {len(results) - created} 部")
+        return results
+
+    # ==================== 批量写入 ====================
+
+    def _write_batch(self, batch):
+        from anime.models import Anime, AnimeExternalId
+
+        results = [None] * len(batch)
+        existing_ids = self._existing_external_ids(batch)
+        titles = self._known_titles()
+
+        # 批内与库内查重
+        accepted = []
+        for index, (token, data) in enumerate(batch):
+            external_id = str(data['external_id']) if data.get('external_id') else None
+            title_key = clean_title(data['title'])
+            if external_id in existing_ids or (titles is not None and title_key in titles):
+                results[index] = ImportResult(token, data['title'], 'duplicate', None)
+                continue
+            if external_id:
+                existing_ids.add(external_id)
+            if titles is not None:
+                titles.add(title_key)
+            accepted.append((index, token, data))
+
+        if not accepted:
+            return results
+
+        types = self._resolve_types({data.get('type', '未分类') for _, _, data in accepted})
+        today = timezone.now().date()
+
+        animes = []
+        for _, _, data in accepted:
+            anime_uuid = uuid.uuid4()
+            anime = Anime(
+                title=data['title'],
+                original_title=data.get('original_title', ''),
+                description=data.get('description', ''),
+                type=types[data.get('type', '未分类')],
+                release_date=data.get('release_date', today),
+                episodes=data.get('episodes', 1),
+                duration=data.get('duration'),
+                is_completed=data.get('is_completed', False),
+                is_featured=False,
+                popularity=data.get('popularity', 0),
+                rating_avg=data.get('rating', 0),
+                rating_count=data.get('rating_count', 0),
+                uuid=anime_uuid,
+                slug=Anime.build_slug(data['title'], anime_uuid),
+            )
+            animes.append(anime)
+
+        Anime.objects.bulk_create(animes, batch_size=500)
+
+        # 回查主键 - 各数据库后端统一按uuid取回
+        pk_by_uuid = dict(Anime.objects.filter(
+            uuid__in=[anime.uuid for anime in animes]).values_list('uuid', 'pk'))
+        mappings = []
+        for (index, token, data), anime in zip(accepted, animes):
+            anime.pk = pk_by_uuid[anime.uuid]
+            results[index] = ImportResult(token, data['title'], 'created', anime)
+            if data.get('external_id') and self.source_name:
+                mappings.append(AnimeExternalId(anime_id=anime.pk, source=self.source_name,
+                                                external_id=str(data['external_id'])))
+        if mappings:
+            AnimeExternalId.objects.bulk_create(mappings, ignore_conflicts=True)
+
+        return results
+
+    def _existing_external_ids(self, batch):
+        from anime.models import AnimeExternalId
+
+        if not self.source_name:
+            return set()
+        external_ids = [str(data['external_id']) for _, data in batch if data.get('external_id')]
+        if not external_ids:
+            return set()
+        return set(AnimeExternalId.objects.filter(
+            source=self.source_name, external_id__in=external_ids).values_list('external_id', flat=True))
+
+    def _known_titles(self):
+        """已入库标题的查重键集合 - 首次调用时加载一次，之后随导入增量维护"""
+        from anime.models import Anime
+
+        if not self.dedupe_titles:
+            return None
+        if self._titles is None:
+            self._titles = {clean_title(title) for title in Anime.objects.values_list('title', flat=True).iterator()}
+        return self._titles
+
+    def _resolve_types(self, names):
+        """类型名 → AnimeType，缺失的一次bulk_create，slug在内存中分配"""
+        from anime.models import AnimeType
+
+        missing = [name for name in names if name not in self._types]
+        if missing:
+            for anime_type in AnimeType.objects.filter(name__in=missing):
+                self._types[anime_type.name] = anime_type
+
+        to_create = sorted(name for name in missing if name not in self._types)
+        if to_create:
+            taken = set(AnimeType.objects.values_list('slug', flat=True))
+            new_types = []
+            for name in to_create:
+                slug = AnimeType.unique_slug(name, taken)
+                taken.add(slug)
+                new_types.append(AnimeType(name=name, slug=slug, description=f'爬虫导入的类型: {name}'))
+            AnimeType.objects.bulk_create(new_types)
+            for anime_type in AnimeType.objects.filter(name__in=to_create):
+                self._types[anime_type.name] = anime_type
+            logger.info(f"批量创建动漫类型: {', '.join(to_create)}")
+
+        return {name: self._types[name] for name in names}
@@ -3,12 +3,46 @@
 import re
 import json
 from datetime import datetime
+from bs4 import SoupStrainer
 from django.utils import timezone
 from .base_scraper import BaseScraper
 import logging
 
 logger = logging.getLogger('django')
 
+# 侧边栏字段正则 - 模块级预编译，每页解析不再重复编译
+TYPE_PATTERN = re.compile(r'Type:\s*(.+?)(?:\n|$)')
+EPISODES_PATTERN = re.compile(r'Episodes:\s*(\d+)')
+DURATION_PATTERN = re.compile(r'(\d+)\s*min')
+AIRED_DATE_PATTERN = re.compile(r'(\w+ \d+, \d{4})')
+YEAR_PATTERN = re.compile(r'(\d{4})')
+POPULARITY_PATTERN = re.compile(r'#(\d+)')
+
+
+class DetailPageStrainer(SoupStrainer):
+    """
+    详情页解析过滤器 - 只为标题/封面/简介/侧边信息栏/评分节点建树
+
+    命中节点的整棵子树都会保留，其余导航、脚本、评论等内容在解析阶段直接丢弃
+    """
+
+    KEEP_CLASSES = frozenset(('title-name', 'alternative-titles', 'leftside', 'score-label', 'score-users'))
+    KEEP_ITEMPROPS = frozenset(('image', 'description'))
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if not attrs:
+            return False
+        if attrs.get('itemprop') in self.KEEP_ITEMPROPS:
+            return True
+        classes = attrs.get('class') or ()
+        if isinstance(classes, str):
+            classes = classes.split()
+        return not self.KEEP_CLASSES.isdisjoint(classes)
+
+    def allow_string_creation(self, string):
+        # 保留节点之外的游离文本一律丢弃
+        return False
+
 
 class MyAnimeListScraper(BaseScraper):
     """
@@ -19,9 +53,18 @@ class MyAnimeListScraper(BaseScraper):
     - 内容精确度验证
     """
 
-    def __init__(self, delay=4.0, max_retries=3, timeout=15):
+    source_name = 'myanimelist'
+
+    # 列表页只保留排行行，详情页只保留需要的节点；设为None则完整建树
+    LIST_STRAINER = SoupStrainer('tr', class_='ranking-list')
+    DETAIL_STRAINER = DetailPageStrainer()
+
+    # 侧边信息栏中需要解析的字段标签
+    SIDEBAR_FIELDS = frozenset(('Type:', 'Episodes:', 'Status:', 'Aired:', 'Duration:', 'Popularity:'))
+
+    def __init__(self, delay=4.0, max_retries=3, timeout=15, **kwargs):
         """初始化MAL爬虫"""
-        super().__init__(delay, max_retries, timeout)
+        super().__init__(delay, max_retries, timeout, **kwargs)
         self.base_url = "https://myanimelist.net"
 
     def scrape_anime_list(self, page=1):
@@ -33,7 +76,7 @@ class MyAnimeListScraper(BaseScraper):
         if not response:
             return []
 
-        soup = self.parse_html(response.text)
+        soup = self.parse_html(response.text, parse_only=self.LIST_STRAINER)
         if not soup:
             return []
 
@@ -55,8 +98,11 @@ class MyAnimeListScraper(BaseScraper):
         response = self.fetch_url(url)
         if not response:
             return None
+        return self.parse_anime_details(url, response.text)
 
-        soup = self.parse_html(response.text)
+    def parse_anime_details(self, url, html):
+        """解析详情页HTML - 纯CPU计算，不访问网络/数据库，可在子进程中执行"""
+        soup = self.parse_html(html, parse_only=self.DETAIL_STRAINER)
         if not soup:
             return None
 
@@ -94,63 +140,10 @@ class MyAnimeListScraper(BaseScraper):
         if description:
             data['description'] = description.text.strip()
 
-        # 侧边信息
+        # 侧边信息 - 单次遍历标签span，按标签名分派
         info_div = soup.select_one('.leftside')
         if info_div:
-            # 提取类型
-            type_div = info_div.select_one('span:-soup-contains("Type:")')
-            if type_div and type_div.parent:
-                type_text = type_div.parent.text
-                type_match = re.search(r'Type:\s*(.+?)(?:\n|$)', type_text)
-                if type_match:
-                    data['type'] = type_match.group(1).strip()
-
-            # 提取集数
-            episodes_div = info_div.select_one('span:-soup-contains("Episodes:")')
-            if episodes_div and episodes_div.parent:
-                episodes_text = episodes_div.parent.text
-                episodes_match = re.search(r'Episodes:\s*(\d+)', episodes_text)
-                if episodes_match:
-                    data['episodes'] = int(episodes_match.group(1))
-                else:
-                    # 可能是电影或未知集数
-                    data['episodes'] = 1
-
-            # 提取状态
-            status_div = info_div.select_one('span:-soup-contains("Status:")')
-            if status_div and status_div.parent:
-                status_text = status_div.parent.text
-                if 'Finished Airing' in status_text:
-                    data['is_completed'] = True
-                else:
-                    data['is_completed'] = False
-
-            # 提取时长
-            duration_div = info_div.select_one('span:-soup-contains("Duration:")')
-            if duration_div and duration_div.parent:
-                duration_text = duration_div.parent.text
-                duration_match = re.search(r'(\d+)\s*min', duration_text)
-                if duration_match:
-                    data['duration'] = int(duration_match.group(1))
-
-            # 提取上映日期
-            aired_div = info_div.select_one('span:-soup-contains("Aired:")')
-            if aired_div and aired_div.parent:
-                aired_text = aired_div.parent.text
-                # 尝试提取完整日期
-                date_match = re.search(r'(\w+ \d+, \d{4})', aired_text)
-                if date_match:
-                    try:
-                        date_obj = datetime.strptime(date_match.group(1), '%b %d, %Y')
-                        data['release_date'] = date_obj.date()
-                    except:
-                        # 尝试只提取年份
-                        year_match = re.search(r'(\d{4})', aired_text)
-                        if year_match:
-                            try:
-                                data['release_date'] = datetime(int(year_match.group(1)), 1, 1).date()
-                            except:
-                                data['release_date'] = timezone.now().date()
+            self._parse_sidebar(info_div, data)
 
         # 评分信息
         score_div = soup.select_one('div.score-label')
@@ -172,21 +165,68 @@ class MyAnimeListScraper(BaseScraper):
             except:
                 pass
 
-        # 排名信息 - 用于计算热门度
-        popularity_div = soup.select_one('span:-soup-contains("Popularity:")')
-        if popularity_div and popularity_div.parent:
-            try:
-                popularity_text = popularity_div.parent.text
-                popularity_match = re.search(r'#(\d+)', popularity_text)
+        return data
+
+    def _parse_sidebar(self, info_div, data):
+        """
+        侧边信息栏一次遍历
+
+        每个字段形如 <div><span>Type:</span> TV</div>，逐个span取标签文本，
+        命中关注的字段时解析其父节点文本；同名字段只取第一次出现
+        """
+        seen = set()
+        for label_span in info_div.find_all('span'):
+            label = label_span.get_text(strip=True)
+            if label not in self.SIDEBAR_FIELDS or label in seen or label_span.parent is None:
+                continue
+            seen.add(label)
+            text = label_span.parent.text
+
+            if label == 'Type:':
+                type_match = TYPE_PATTERN.search(text)
+                if type_match:
+                    data['type'] = type_match.group(1).strip()
+
+            elif label == 'Episodes:':
+                episodes_match = EPISODES_PATTERN.search(text)
+                # 无数字时可能是电影或未知集数
+                data['episodes'] = int(episodes_match.group(1)) if episodes_match else 1
+
+            elif label == 'Status:':
+                data['is_completed'] = 'Finished Airing' in text
+
+            elif label == 'Duration:':
+                duration_match = DURATION_PATTERN.search(text)
+                if duration_match:
+                    data['duration'] = int(duration_match.group(1))
+
+            elif label == 'Aired:':
+                self._parse_aired(text, data)
+
+            elif label == 'Popularity:':
+                # 越小排名越高，根据排名计算0-1范围的热门度，最高5000名以内
+                popularity_match = POPULARITY_PATTERN.search(text)
                 if popularity_match:
-                    # 越小排名越高，转换为0-1范围的热门度
                     rank = int(popularity_match.group(1))
-                    # 根据排名计算热门度，最高5000名以内
                     data['popularity'] = max(0, min(1, 1 - (rank / 5000)))
-            except:
-                pass
 
-        return data
+            if len(seen) == len(self.SIDEBAR_FIELDS):
+                break
+
+    def _parse_aired(self, aired_text, data):
+        """上映日期 - 优先完整日期，失败时退化为年份"""
+        date_match = AIRED_DATE_PATTERN.search(aired_text)
+        if not date_match:
+            return
+        try:
+            data['release_date'] = datetime.strptime(date_match.group(1), '%b %d, %Y').date()
+        except ValueError:
+            year_match = YEAR_PATTERN.search(aired_text)
+            if year_match:
+                try:
+                    data['release_date'] = datetime(int(year_match.group(1)), 1, 1).date()
+                except ValueError:
+                    data['release_date'] = timezone.now().date()
 
     def _extract_id_from_url(self, url):
         """从URL中提取动漫ID"""
@@ -209,7 +249,8 @@ class MyAnimeListScraper(BaseScraper):
             'episodes': data.get('episodes', 1),
             'duration': data.get('duration'),
             'is_completed': data.get('is_completed', False),
-            'cover_url': data.get('cover_url', '')
+            'cover_url': data.get('cover_url', ''),
+            'external_id': data.get('id')
         }
 
         # 发布日期
@@ -0,0 +1,416 @@
+# recommendation/scrapers/pipeline.py
+# 流水线爬取 - 列表抓取 → 详情抓取 → 解析(进程池) → 数据库写入，封面由后台处理池下载
+# 各阶段由有界队列连接: 下游变慢时上游阻塞(背压)，各阶段并行推进互不等待
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .frontier import CrawlFrontier
+
+logger = logging.getLogger('django')
+
+# 阶段结束标记
+_DONE = object()
+
+# 续爬时代替页码送入列表阶段，表示处理爬取前沿中上次未完成的URL
+_PENDING = object()
+
+# 解析子进程内的爬虫实例(由进程池initializer创建)
+_parse_worker_scraper = None
+
+
+def _init_parse_worker(scraper_cls):
+    """解析进程初始化 - spawn启动方式下需先完成Django初始化"""
+    global _parse_worker_scraper
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+    _parse_worker_scraper = scraper_cls()
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def _parse_in_worker(url, html):
+    """解析进程任务 - 解析HTML并转换为模型数据"""
+    anime_data = _parse_worker_scraper.parse_anime_details(url, html)
+    if not anime_data:
+        return None
+    return anime_data, _parse_worker_scraper.convert_to_model(dict(anime_data))
+
+
+class StageStats:
+    """单阶段计数器"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.emitted = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        # 下游队列满导致的阻塞时间 - 背压
+        self.blocked_seconds = 0.0
+        # 上游无数据时的等待时间 - 饥饿
+        self.starved_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add(self, **deltas):
+        with self._lock:
+            for field, value in deltas.items():
+                setattr(self, field, getattr(self, field) + value)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def as_dict(self):
+        elapsed = self.elapsed
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'processed': self.processed,
+            'emitted': self.emitted,
+            'failed': self.failed,
+            'throughput': round(self.processed / elapsed, 2) if elapsed > 0 else 0.0,
+            'busy_seconds': round(self.busy_seconds, 2),
+            'blocked_seconds': round(self.blocked_seconds, 2),
+            'starved_seconds': round(self.starved_seconds, 2),
+        }
+
+
+class _Stage:
+    """
+    线程阶段 - workers个线程从inbox取数据，func返回None表示丢弃，
+    否则放入outbox(fan_out=True时逐个放入返回的列表元素)；
+    所有线程退出后向下游发送结束标记。stop被置位时(写入阶段异常中止)立即退出
+    """
+
+    # 阻塞等待时检查stop的间隔(秒)
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, name, func, workers, inbox, outbox, stop, fan_out=False):
+        self.func = func
+        self.fan_out = fan_out
+        self.stop = stop
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = StageStats(name, workers)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"crawl-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        self._remaining = workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.stats.started_at = time.monotonic()
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _get(self):
+        while not self.stop.is_set():
+            try:
+                return self.inbox.get(timeout=self.POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _offer(self, target, item):
+        """放入队列，队列满时等待；stop被置位后放弃(下游可能已不再取数据)"""
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=self.POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _put(self, item):
+        self._offer(self.outbox, item)
+
+    def _work(self):
+        try:
+            while True:
+                waited = time.monotonic()
+                item = self._get()
+                self.stats.add(starved_seconds=time.monotonic() - waited)
+                if item is _DONE:
+                    # 唤醒同阶段其他线程 - 中止时各线程自行检查stop退出，不向可能已满的队列放回标记
+                    self._offer(self.inbox, _DONE)
+                    return
+
+                started = time.monotonic()
+                try:
+                    result = self.func(item)
+                except Exception as e:
+                    logger.error(f"流水线阶段[{self.stats.name}]异常: {str(e)}")
+                    result = None
+                    self.stats.add(failed=1)
+                self.stats.add(processed=1, busy_seconds=time.monotonic() - started)
+
+                if result is None:
+                    continue
+                for output in (result if self.fan_out else (result,)):
+                    waited = time.monotonic()
+                    self._put(output)
+                    self.stats.add(emitted=1, blocked_seconds=time.monotonic() - waited)
+        finally:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._remaining -= 1
+            last = self._remaining == 0
+        if last:
+            self.stats.finished_at = time.monotonic()
+            self._put(_DONE)
+
+
+class CrawlPipeline:
+    """
+    分阶段流水线爬取
+
+    - 列表/详情阶段为I/O型，使用线程；限速仍由爬虫的按主机令牌桶统一控制
+    - 解析阶段为CPU型，派发到进程池(parse_workers=0时在线程内直接解析)
+    - 查重与入库只在调用线程中进行，数据库连接不跨线程；按批bulk_create入库
+    - 封面不阻塞入库: 入库后提交给CoverDownloader，后台下载、去重并生成缩略图
+    """
+
+    # 写入阶段有缓冲数据时，上游空闲超过该秒数即先行写入
+    FLUSH_IDLE_SECONDS = 0.5
+
+    def __init__(self, scraper, detail_workers=None, parse_workers=None, cover_workers=None,
+                 queue_size=64):
+        self.scraper = scraper
+        self.detail_workers = detail_workers or scraper.concurrency
+        self.parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self.cover_workers = cover_workers or scraper.concurrency
+        self.queue_size = queue_size
+        self.stages = []
+        self.writer_stats = None
+        self.covers = None
+        self.known_ids = set()
+        self.incremental = True
+        self.known_skipped = 0
+        self.pending_urls = []
+
+    # ==================== 阶段函数 ====================
+
+    def _fetch_list(self, page):
+        """
+        列表阶段 - 产出本页未入库的详情URL
+
+        爬取前沿中已导入的URL与已入库外部ID均在内存中O(1)过滤
+        """
+        scraper = self.scraper
+        if page is _PENDING:
+            urls = self.pending_urls
+        else:
+            urls = scraper.scrape_anime_list(page)
+            if not urls:
+                logger.warning(f"第{page}页没有发现动漫URL")
+                return None
+            scraper._frontier_record_page(page, urls)
+        if not self.incremental:
+            return urls
+
+        pending = []
+        for url in urls:
+            anime_id = scraper._extract_id_from_url(url)
+            if scraper.frontier is not None and scraper.frontier.is_done(anime_id):
+                self.known_skipped += 1
+            elif anime_id in self.known_ids:
+                self.known_skipped += 1
+                scraper._frontier_mark(url, CrawlFrontier.IMPORTED)
+            else:
+                pending.append(url)
+        return pending
+
+    def _fetch_detail(self, url):
+        response = self.scraper.fetch_url(url)
+        if not response:
+            logger.warning(f"无法获取动漫详情: {url}")
+            self.scraper._frontier_mark(url, CrawlFrontier.FAILED, '详情页抓取失败')
+            return None
+        self.scraper._frontier_mark(url, CrawlFrontier.FETCHED)
+        return url, response.text
+
+    def _parsed(self, url, result):
+        """解析结果登记到爬取前沿"""
+        if result is None:
+            self.scraper._frontier_mark(url, CrawlFrontier.FAILED, '详情页解析失败')
+            return None
+        self.scraper._frontier_mark(url, CrawlFrontier.PARSED)
+        return (url,) + result
+
+    def _parse_inline(self, item):
+        url, html = item
+        anime_data = self.scraper.parse_anime_details(url, html)
+        if not anime_data:
+            return self._parsed(url, None)
+        return self._parsed(url, (anime_data, self.scraper.convert_to_model(dict(anime_data))))
+
+    def _parse_with_pool(self, pool):
+        def parse(item):
+            url, html = item
+            return self._parsed(url, pool.submit(_parse_in_worker, url, html).result())
+        return parse
+
+    # ==================== 主流程 ====================
+
+    def run(self, start_page=1, max_pages=1, incremental=True, do_import=True, resume=False):
+        """
+        执行流水线
+
+        resume=True时先补完爬取前沿中上次未完成的URL，再从第一个未完成的列表页继续
+
+        Returns:
+            {'added', 'skipped', 'scraped', 'stages': [各阶段计数器字典], 'covers': 封面处理统计}
+        """
+        from anime.models import AnimeExternalId
+
+        scraper = self.scraper
+        totals = {'added': 0, 'skipped': 0, 'scraped': 0}
+
+        # 已入库外部ID一次性载入，列表阶段O(1)过滤，工作线程不访问数据库
+        self.incremental = incremental
+        self.known_skipped = 0
+        self.known_ids = set()
+        if incremental and scraper.source_name:
+            self.known_ids = set(AnimeExternalId.objects.filter(
+                source=scraper.source_name).values_list('external_id', flat=True))
+
+        pages = queue.Queue()
+        self.pending_urls = []
+        if resume and scraper.frontier is not None:
+            self.pending_urls = scraper.frontier.pending()
+            if self.pending_urls:
+                logger.info(f"续爬: 补完上次未完成的 {len(self.pending_urls)} 个详情URL")
+                pages.put(_PENDING)
+            start_page = scraper.frontier.next_page(start_page)
+            logger.info(f"续爬: 从第{start_page}页继续")
+        for page in range(start_page, start_page + max_pages):
+            pages.put(page)
+        pages.put(_DONE)
+
+        url_queue = queue.Queue(maxsize=self.queue_size)
+        html_queue = queue.Queue(maxsize=self.queue_size)
+        parsed_queue = queue.Queue(maxsize=self.queue_size)
+
+        pool = None
+        if self.parse_workers > 0:
+            pool = ProcessPoolExecutor(max_workers=self.parse_workers, initializer=_init_parse_worker,
+                                       initargs=(type(scraper),))
+            # 在启动阶段线程前预先创建全部解析进程，避免多线程状态下fork
+            list(pool.map(_warm_up, range(self.parse_workers)))
+            parse_func = self._parse_with_pool(pool)
+        else:
+            parse_func = self._parse_inline
+
+        stop = threading.Event()
+        self.stages = [
+            _Stage('list', self._fetch_list, 1, pages, url_queue, stop, fan_out=True),
+            _Stage('detail', self._fetch_detail, self.detail_workers, url_queue, html_queue, stop),
+            _Stage('parse', parse_func, max(1, self.parse_workers), html_queue, parsed_queue, stop),
+        ]
+        covers = self.covers = scraper.make_cover_downloader(self.cover_workers) if do_import else None
+
+        self.writer_stats = StageStats('write', 1)
+        try:
+            for stage in self.stages:
+                stage.start()
+            self._write(parsed_queue, incremental, covers, totals)
+        except BaseException:
+            # 写入阶段中止(含Ctrl+C) - 通知上游各阶段停止，已完成的进度由检查点保留
+            stop.set()
+            for stage in self.stages:
+                stage.join()
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+            if covers is not None:
+                covers.close()
+            if scraper.frontier is not None:
+                scraper.frontier.checkpoint()
+
+        totals['skipped'] += self.known_skipped
+        totals['stages'] = [stage.stats.as_dict() for stage in self.stages]
+        totals['stages'].append(self.writer_stats.as_dict())
+        totals['covers'] = dict(covers.stats) if covers is not None else {}
+        logger.info(f"流水线爬取完成: 爬取 {totals['scraped']}, 导入 {totals['added']}, 跳过 {totals['skipped']}")
+        for stats in totals['stages']:
+            logger.info(f"阶段统计: {stats}")
+        return totals
+
+    def _write(self, write_queue, incremental, covers, totals):
+        """
+        写入阶段 - 在调用线程缓冲解析结果，满一批或上游暂无数据时批量入库
+
+        标题查重由写入器在内存中完成，不再逐条查询数据库；covers为None时只抓取不入库
+        """
+        stats = self.writer_stats
+        stats.started_at = time.monotonic()
+        writer = None
+        if covers is not None:
+            writer = self.scraper.make_import_writer(batch_size=self.scraper.import_batch_size,
+                                                     cover_downloader=covers)
+            writer.dedupe_titles = incremental
+
+        while True:
+            waited = time.monotonic()
+            try:
+                # 有缓冲时只短暂等待，上游空闲就先写入，避免尾批长时间滞留
+                item = write_queue.get(timeout=self.FLUSH_IDLE_SECONDS) if writer and len(writer) \
+                    else write_queue.get()
+            except queue.Empty:
+                stats.add(starved_seconds=time.monotonic() - waited)
+                self._flush_writer(writer.flush, totals)
+                continue
+            stats.add(starved_seconds=time.monotonic() - waited)
+            if item is _DONE:
+                break
+
+            url, anime_data, model_data = item
+            totals['scraped'] += 1
+            stats.add(processed=1)
+            if writer is None:
+                continue
+            if not model_data:
+                self.scraper._frontier_mark(url, CrawlFrontier.FAILED, '缺少标题')
+                stats.add(failed=1)
+                continue
+            self._flush_writer(lambda: writer.add(model_data, token=url), totals)
+
+        if writer is not None:
+            self._flush_writer(writer.flush, totals)
+        stats.finished_at = time.monotonic()
+
+    def _flush_writer(self, write, totals):
+        """执行写入器的add/flush并登记结果 - 耗时计入写入阶段忙碌时间"""
+        started = time.monotonic()
+        results = write()
+        if not results:
+            self.writer_stats.add(busy_seconds=time.monotonic() - started)
+            return
+        self.scraper._apply_import_results(results, totals)
+        # 顺带回写后台已完成的封面，不等待未完成的
+        if self.covers is not None:
+            self.covers.drain()
+        created = sum(1 for result in results if result.status == 'created')
+        failed = sum(1 for result in results if result.status == 'failed')
+        self.writer_stats.add(emitted=created, failed=failed, busy_seconds=time.monotonic() - started)
@@ -0,0 +1,185 @@
+# recommendation/scrapers/stub_server.py
+# 本地桩站点 - 模拟MyAnimeList的排行榜/详情页/封面，供爬虫测试与压测，不访问真实网络
+
+import base64
+import hashlib
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 1x1透明GIF - 封面占位
+COVER_BYTES = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+LIST_TEMPLATE = '<html><body><table>{rows}</table></body></html>'
+LIST_ROW_TEMPLATE = ('<tr class="ranking-list"><td class="title">'
+                     '<a href="{base}/anime/{id}/stub_{id}">Stub Anime {id}</a></td></tr>')
+DETAIL_TEMPLATE = '''<html><head><title>Stub Anime {id}</title>{scripts}</head><body>
+{header}
+<h1 class="title-name">Stub Anime {id}</h1>
+<p class="alternative-titles"><span class="japanese">スタブ {id}</span></p>
+<img itemprop="image" data-src="{base}/images/anime/{id}.gif">
+<p itemprop="description">Stub description {id}</p>
+<div class="leftside">
+  <div><span>Type:</span>
+  TV
+  </div>
+  <div><span>Episodes:</span> 12</div>
+  <div><span>Status:</span> Finished Airing</div>
+  <div><span>Aired:</span> Apr 3, 2015 to Jun 19, 2015</div>
+  <div><span>Premiered:</span> <a href="/anime/season/2015/spring">Spring 2015</a></div>
+  <div><span>Studios:</span> <a href="/anime/producer/1">Stub Studio</a></div>
+  <div><span>Genres:</span> <span itemprop="genre">Action</span><a href="/anime/genre/1">Action</a></div>
+  <div><span>Duration:</span> 24 min. per ep.</div>
+  <div><span>Ranked:</span> #{id}<sup>2</sup></div>
+  <div><span>Popularity:</span> #{id}</div>
+  <div><span>Members:</span> 1,{id:03d},000</div>
+</div>
+<div class="score-label">8.{score}</div>
+<span class="score-users"><strong>1,{id:03d}</strong></span>
+{reviews}
+</body></html>'''
+
+# 填充内容 - 模拟真实详情页中与解析无关的导航、脚本与评论区(page_filler控制评论块数)
+FILLER_SCRIPT = '<script type="text/javascript">window.MAL = {{"page": {id}, "ads": [{ads}]}};</script>'
+FILLER_NAV = ('<div id="headerSmall"><ul class="nav">{links}</ul></div>')
+FILLER_NAV_LINK = '<li><a href="/anime/{n}/related_{n}" class="nav-link">Related {n}</a></li>'
+FILLER_REVIEW = ('<div class="review-element"><div class="username"><a href="/profile/user{n}">user{n}</a>'
+                 '</div><div class="text">{text}</div><span class="tag">Recommended</span></div>')
+FILLER_REVIEW_TEXT = ('<p>This stub review {n} discusses pacing, animation, soundtrack and characters '
+                      'at considerable length, just like the real thing.</p>') * 6
+
+
+class StubAnimeSite:
+    """
+    MyAnimeList风格的本地HTTP桩站点
+
+    用法:
+        with StubAnimeSite(anime_count=100, latency=0.05) as site:
+            scraper = MyAnimeListScraper(delay=0.01, concurrency=8)
+            scraper.base_url = site.base_url
+            scraper.run(max_pages=2, do_import=False)
+
+    requests记录每个请求的(时间戳, 路径)，用于断言限速与并发行为；
+    设置max_rps后，最近1秒内请求数超限时返回429并附带Retry-After；
+    页面带ETag，If-None-Match匹配时返回304；
+    page_filler>0时详情页附带导航/脚本/评论等无关内容，用于解析基准测试
+    """
+
+    def __init__(self, anime_count=50, page_size=50, latency=0.0, max_rps=None, retry_after=1,
+                 page_filler=0):
+        self.anime_count = anime_count
+        self.page_filler = page_filler
+        self.page_size = page_size
+        self.latency = latency
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.requests = []
+        self.throttled = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.base_url = None
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                now = time.monotonic()
+                with site._lock:
+                    recent = sum(1 for ts, _ in site.requests if now - ts < 1.0)
+                    limited = site.max_rps is not None and recent >= site.max_rps
+                    if limited:
+                        site.throttled += 1
+                    else:
+                        site.requests.append((now, self.path))
+
+                if limited:
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(site.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if site.latency:
+                    time.sleep(site.latency)
+
+                status, content_type, body = site.route(self.path)
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    with site._lock:
+                        site.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if status == 200:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def route(self, path):
+        """路由 - 返回(状态码, Content-Type, 响应体)"""
+        parts = urlsplit(path)
+
+        if parts.path == '/topanime.php':
+            offset = int(parse_qs(parts.query).get('limit', ['0'])[0])
+            ids = range(offset + 1, min(offset + self.page_size, self.anime_count) + 1)
+            rows = ''.join(LIST_ROW_TEMPLATE.format(base=self.base_url, id=i) for i in ids)
+            return 200, 'text/html; charset=utf-8', LIST_TEMPLATE.format(rows=rows).encode('utf-8')
+
+        match = re.match(r'^/anime/(\d+)', parts.path)
+        if match and 1 <= int(match.group(1)) <= self.anime_count:
+            anime_id = int(match.group(1))
+            return 200, 'text/html; charset=utf-8', self.detail_page(anime_id).encode('utf-8')
+
+        if parts.path.startswith('/images/'):
+            return 200, 'image/gif', COVER_BYTES
+
+        return 404, 'text/plain', b'not found'
+
+    def detail_page(self, anime_id):
+        """详情页HTML - page_filler>0时附带导航/脚本/评论等无关内容，接近真实页面体积"""
+        filler = self.page_filler
+        if filler:
+            scripts = FILLER_SCRIPT.format(id=anime_id, ads=','.join(str(n) for n in range(filler * 10)))
+            header = FILLER_NAV.format(links=''.join(FILLER_NAV_LINK.format(n=n) for n in range(filler * 5)))
+            reviews = ''.join(FILLER_REVIEW.format(n=n, text=FILLER_REVIEW_TEXT.format(n=n))
+                              for n in range(filler))
+        else:
+            scripts = header = reviews = ''
+        return DETAIL_TEMPLATE.format(base=self.base_url, id=anime_id, score=anime_id % 10,
+                                      scripts=scripts, header=header, reviews=reviews)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
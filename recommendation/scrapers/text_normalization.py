@@ -0,0 +1,145 @@
+# recommendation/scrapers/text_normalization.py
+# 文本规范化 - 修复爬取文本中的乱码(mojibake)并清除控制字符
+#
+# 逐字符的Python循环改为预编译正则的字符类匹配，纯ASCII文本直接返回，
+# 重复出现的字符串(类型名、占位简介等)经LRU缓存只计算一次
+
+import codecs
+import re
+import unicodedata
+from functools import lru_cache
+
+# 宽松cp1252编码表 - cp1252未定义的5个字节按Latin-1处理(与浏览器一致)，
+# 用C实现的charmap编码一次还原 "按cp1252误解码" 前的字节
+_CP1252_DECODING_TABLE = ''.join(
+    bytes([byte]).decode('cp1252', errors='ignore') or chr(byte) for byte in range(256))
+_CP1252_ENCODING_MAP = codecs.charmap_build(_CP1252_DECODING_TABLE)
+_CP1252_CHARS = ''.join(ch for ch in _CP1252_DECODING_TABLE[0x80:0xA0] if ord(ch) > 0xFF)
+
+# UTF-8多字节序列被按Latin-1/cp1252解码后的形态: 连续的高位字符
+# (UTF-8的多字节序列不含ASCII字节，因此乱码总是落在这样的连续片段里)
+_LATIN_RUN = re.compile(f'[\u0080-\u00ff{_CP1252_CHARS}]{{2,}}')
+
+# UTF-8被按GBK解码后的结果仍是汉字，只能先判断再验证:
+# 修复候选中的非ASCII字符必须全部属于中日韩字符类
+_CJK = re.compile('[\u4e00-\u9fff]')
+_NON_CJK = re.compile('[^\x00-\x7f\u3000-\u303f\u3040-\u30ff\u4e00-\u9fff\uff00-\uffef]')
+
+# 不可见控制字符 - 保留换行、回车与制表符
+_CONTROL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u200b-\u200f\u2028\u2029\ufeff]')
+
+# 多重错误转码最多还原的层数
+MAX_REPAIR_ROUNDS = 3
+
+# 字节输入的候选编码，依次严格解码
+BYTE_ENCODINGS = ('utf-8', 'shift-jis', 'gbk', 'euc-jp')
+
+
+def _undo_latin_decode(text):
+    """还原按Latin-1/cp1252误解码的UTF-8 - 不构成合法UTF-8时抛出UnicodeError"""
+    try:
+        raw = text.encode('latin1')
+    except UnicodeEncodeError:
+        raw = codecs.charmap_encode(text, 'strict', _CP1252_ENCODING_MAP)[0]
+    return raw.decode('utf-8')
+
+
+def _repair_latin_run(match):
+    run = match.group(0)
+    try:
+        return _undo_latin_decode(run)
+    except UnicodeError:
+        # 不构成合法UTF-8序列，说明是正常的带重音字母，原样保留
+        return run
+
+
+def _repair_gbk(text):
+    """UTF-8按GBK误解码的还原 - 候选必须严格解码成功且只含中日韩字符"""
+    if not _CJK.search(text):
+        return text
+    try:
+        candidate = text.encode('gbk').decode('utf-8')
+    except UnicodeError:
+        return text
+    if candidate != text and _CJK.search(candidate) and not _NON_CJK.search(candidate):
+        return candidate
+    return text
+
+
+@lru_cache(maxsize=8192)
+def fix_mojibake(text):
+    """
+    修复乱码 - 还原被按Latin-1/cp1252(可多次)或GBK错误解码的UTF-8文本
+
+    正常文本(包括正常的中日文和带重音的拉丁字母)原样返回
+    """
+    if not text:
+        return ''
+    if text.isascii():
+        return text
+
+    original = text
+    for _ in range(MAX_REPAIR_ROUNDS):
+        if not _LATIN_RUN.search(text):
+            break
+        try:
+            # 整段都是同一次误解码时一步还原，避免逐片段回调
+            repaired = _undo_latin_decode(text)
+        except UnicodeError:
+            repaired = _LATIN_RUN.sub(_repair_latin_run, text)
+        if repaired == text:
+            break
+        text = repaired
+
+    # 已按Latin-1还原过的文本不再尝试GBK，避免把还原结果二次误判
+    if text is not original:
+        return text
+    return _repair_gbk(text)
+
+
+@lru_cache(maxsize=8192)
+def _normalize_str(text):
+    if text.isascii():
+        return _CONTROL_CHARS.sub('', text)
+    text = fix_mojibake(text)
+    text = _CONTROL_CHARS.sub('', text)
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    return text
+
+
+def decode_bytes(data):
+    """字节 → 字符串，按BYTE_ENCODINGS依次严格解码，全部失败时按UTF-8宽容解码"""
+    for encoding in BYTE_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def normalize_text(text):
+    """
+    爬取文本规范化
+
+    1. 字节按候选编码解码为字符串
+    2. 修复乱码
+    3. 清除不可见控制字符，统一为NFC形式
+    """
+    if not text:
+        return ''
+    if isinstance(text, (bytes, bytearray)):
+        text = decode_bytes(bytes(text))
+    elif not isinstance(text, str):
+        text = str(text)
+    return _normalize_str(text)
+
+
+def cache_info():
+    """缓存命中统计 - 供基准命令输出"""
+    return {'fix_mojibake': fix_mojibake.cache_info(), 'normalize_text': _normalize_str.cache_info()}
+
+
+def cache_clear():
+    fix_mojibake.cache_clear()
+    _normalize_str.cache_clear()
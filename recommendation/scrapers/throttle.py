@@ -0,0 +1,221 @@
+# recommendation/scrapers/throttle.py
+# 按主机限速 - 令牌桶控制对同一站点的请求速率，并发抓取时仍保持礼貌
+# AIMD自适应: 响应健康时加性提速，限流/服务端错误/延迟恶化时乘性降速
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('django')
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+
+    rate: 每秒补充的令牌数(即稳态请求速率)
+    capacity: 桶容量(允许的突发请求数)
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        预占一个令牌
+
+        令牌允许透支，多个线程排队时各自得到递增的等待时间，不会同时放行
+
+        Returns:
+            需要等待的秒数(0表示立即可发)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1.0
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """取令牌，不足时只阻塞当前线程直到轮到自己"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate):
+        """调整速率 - 已累积的令牌按旧速率结算"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+
+    def pause(self, seconds):
+        """暂停发放 - 此后seconds秒内不再放行，重复调用不叠加，排队者依次顺延"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class HostRateLimiter:
+    """按主机分桶的限速器 - 不同站点互不影响(如详情页与封面CDN)"""
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url):
+        return urlsplit(url).netloc.lower()
+
+    def bucket(self, url):
+        host = self.host_of(url)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return bucket
+
+    def acquire(self, url):
+        """请求前调用 - 返回实际等待秒数"""
+        return self.bucket(url).acquire()
+
+
+def parse_retry_after(value):
+    """解析Retry-After头 - 支持秒数与HTTP日期两种格式，无法解析返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class _HostState:
+    """单主机AIMD状态"""
+
+    def __init__(self):
+        self.latency_ewma = None
+        self.latency_floor = None
+        self.samples = 0
+        self.last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+
+class AdaptiveRateLimiter(HostRateLimiter):
+    """
+    AIMD自适应限速器
+
+    - 健康响应(2xx/3xx/404且延迟正常): rate += increase
+    - 429/503/5xx/403、连接异常、延迟EWMA超过历史最低的latency_factor倍: rate *= decrease
+    - Retry-After: 该主机令牌桶暂停对应时长
+    降速前已发出的请求带回的失败信号不再重复降速(每个窗口只降一次)，
+    避免一批并发失败把速率连降到底
+    """
+
+    BACKOFF_STATUSES = {403, 429}
+
+    def __init__(self, rate, capacity=1.0, min_rate=None, max_rate=None,
+                 increase=None, decrease=0.5, latency_factor=2.0, ewma_alpha=0.2):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate if min_rate is not None else self.rate / 8.0
+        self.max_rate = max_rate if max_rate is not None else self.rate * 4.0
+        # 默认每次健康响应提升初始速率的1/10
+        self.increase = increase if increase is not None else self.rate / 10.0
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.ewma_alpha = ewma_alpha
+        self._states = {}
+
+    def _state(self, host):
+        with self._lock:
+            state = self._states.get(host)
+            if state is None:
+                state = self._states[host] = _HostState()
+            return state
+
+    def _track_latency(self, state, latency):
+        """更新延迟EWMA，返回延迟是否恶化"""
+        if latency is None:
+            return False
+        state.samples += 1
+        if state.latency_ewma is None:
+            state.latency_ewma = latency
+        else:
+            state.latency_ewma += self.ewma_alpha * (latency - state.latency_ewma)
+        if state.latency_floor is None or state.latency_ewma < state.latency_floor:
+            state.latency_floor = state.latency_ewma
+        else:
+            # 基线缓慢上漂 - 源站整体变慢后不会永久卡在最低速率
+            state.latency_floor += 0.01 * (state.latency_ewma - state.latency_floor)
+        return state.samples >= 5 and state.latency_ewma > state.latency_floor * self.latency_factor
+
+    def _backoff(self, url, bucket, state, reason, sent_at=None):
+        now = time.monotonic()
+        if sent_at is not None:
+            if sent_at < state.last_decrease:
+                return
+        elif now - state.last_decrease < max(1.0 / bucket.rate, state.latency_ewma or 0.0):
+            return
+        state.last_decrease = now
+        state.decreases += 1
+        new_rate = max(self.min_rate, bucket.rate * self.decrease)
+        bucket.set_rate(new_rate)
+        logger.warning(f"限速降档 [{self.host_of(url)}] {reason}: {new_rate:.3f} req/s")
+
+    def on_response(self, url, status, latency=None, retry_after=None, sent_at=None):
+        """
+        每次响应后调用
+
+        Args:
+            status: HTTP状态码，None表示连接异常/超时
+            sent_at: 请求发出时刻(time.monotonic)，用于识别降速前发出的请求
+        """
+        bucket = self.bucket(url)
+        state = self._state(self.host_of(url))
+        with self._lock:
+            slow = self._track_latency(state, latency)
+
+            if status is None or status in self.BACKOFF_STATUSES or status >= 500:
+                self._backoff(url, bucket, state, f"状态 {status or '连接异常'}", sent_at)
+            elif slow:
+                self._backoff(url, bucket, state, f"延迟升高 {state.latency_ewma:.2f}s", sent_at)
+            else:
+                state.increases += 1
+                bucket.set_rate(min(self.max_rate, bucket.rate + self.increase))
+
+        if retry_after:
+            logger.warning(f"服务端要求等待 {retry_after:.1f}秒 [{self.host_of(url)}]")
+            bucket.pause(retry_after)
+
+    def snapshot(self):
+        """各主机当前速率与调整次数"""
+        with self._lock:
+            return {
+                host: {
+                    'rate': round(self._buckets[host].rate, 3),
+                    'latency_ewma': round(state.latency_ewma or 0.0, 3),
+                    'increases': state.increases,
+                    'decreases': state.decreases,
+                }
+                for host, state in self._states.items() if host in self._buckets
+            }
@@ -0,0 +1,268 @@
+# recommendation/services.py
+# 写入服务 - 每个用户动作一个入口，独占该动作的全部副作用(计数、互动记录、用户偏好)
+#
+# 入口在挂起信号的事务中写入，副作用只执行一次；后台管理、脚本等其他写入路径
+# 仍由信号处理器调用下面同一批副作用函数，两条路径的结果一致
+
+import logging
+import traceback
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import counters
+from .models import AnimeLike, UserComment, UserInteraction, UserLike, UserRating
+
+logger = logging.getLogger('django')
+
+# 互动强度
+REPLY_STRENGTH = 1.2  # 回复互动强度较高
+LIKE_STRENGTH = 0.8  # 点赞互动强度适中
+
+
+# =============== 动作入口 ===============
+
+def add_reply(user, parent_comment, content):
+    """
+    回复评论
+
+    Returns:
+        新回复；parent_comment.reply_count 同步为最新值
+    """
+    from .signals import suspend_signals
+
+    with transaction.atomic(), suspend_signals():
+        reply = UserComment.objects.create(
+            user=user,
+            anime_id=parent_comment.anime_id,
+            content=content,
+            is_reply=True,
+            parent_comment=parent_comment
+        )
+        comment_created(reply)
+    parent_comment.refresh_from_db(fields=['reply_count'])
+    return reply
+
+
+def toggle_anime_like(user, anime):
+    """
+    切换动漫点赞
+
+    Returns:
+        (切换后是否已点赞, 点赞数(数据库值+未回写增量))
+    """
+    from .signals import suspend_signals
+
+    with transaction.atomic(), suspend_signals():
+        like, created = AnimeLike.objects.get_or_create(user=user, anime=anime)
+        if created:
+            anime_like_added(like)
+        else:
+            like.delete()
+            anime_like_removed(like)
+    return created, counters.current(anime, 'anime', 'like_count')
+
+
+def toggle_comment_like(user, comment):
+    """
+    切换评论点赞
+
+    Returns:
+        (切换后是否已点赞, 点赞数(数据库值+未回写增量))
+    """
+    from .signals import suspend_signals
+
+    with transaction.atomic(), suspend_signals():
+        like, created = UserLike.objects.get_or_create(user=user, comment=comment)
+        if created:
+            comment_like_added(like, comment)
+        else:
+            like.delete()
+            comment_like_removed(like, comment)
+    return created, counters.current(comment, 'comment', 'like_count')
+
+
+def rate_anime(user, anime, rating):
+    """
+    评分(新增或修改) - 一次upsert，动漫评分统计按增量合并
+
+    Returns:
+        (是否新增, 旧评分(新增时为None), 新平均评分) - 平均评分在内存中合并得到，不再读回
+    """
+    from .signals import suspend_signals
+
+    with transaction.atomic(), suspend_signals():
+        ratings = UserRating.objects.filter(user=user, anime=anime)
+        previous = ratings.select_for_update().values_list('rating', flat=True).first()
+        created = False
+        if previous is None:
+            try:
+                with transaction.atomic():
+                    UserRating.objects.create(user=user, anime=anime, rating=rating)
+                created = True
+            except IntegrityError:
+                # 并发请求已先创建 - 按修改处理
+                previous = ratings.select_for_update().values_list('rating', flat=True).first()
+        if not created and previous != rating:
+            ratings.update(rating=rating, updated_at=timezone.now())
+        rating_saved(user.pk, anime, rating, previous)
+    return created, previous, anime.rating_avg or 0
+
+
+# =============== 副作用 ===============
+
+def rating_saved(user_id, anime, rating, previous=None):
+    """
+    评分新增(previous为None)或修改后: 动漫评分统计、档案评分计数、用户偏好、推荐刷新
+
+    anime 的 rating_avg / rating_count 在返回时为合并本次评分后的值
+    """
+    from users.models import Profile
+    from .signals import apply_rating_delta
+
+    if previous is None:
+        apply_rating_delta(anime, added=rating)
+        Profile.objects.filter(user_id=user_id).update(**Profile.counter_updates(rating_count=1))
+    elif previous != rating:
+        apply_rating_delta(anime, added=rating, removed=previous)
+
+    interaction_changed(user_id, anime.pk)
+
+
+def rating_deleted(rating):
+    """评分删除后: 从动漫统计中减去该评分、档案评分计数-1、用户偏好、推荐刷新"""
+    from users.models import Profile
+    from .signals import apply_rating_delta
+
+    apply_rating_delta(rating.anime, removed=rating.rating)
+    Profile.objects.filter(user_id=rating.user_id).update(**Profile.counter_updates(rating_count=-1))
+
+    interaction_changed(rating.user_id, rating.anime_id)
+
+
+def interaction_changed(user_id, anime_id):
+    """用户对动漫的交互变化: 登记偏好重算(同事务去抖)与推荐刷新(跨请求去抖)"""
+    from .signals import update_user_preference
+
+    update_user_preference(user_id, anime_id)
+    refresh_recommendations(user_id)
+
+
+def _refresh_pending_key(user_id):
+    return f"rec:user:{user_id}:refresh-pending"
+
+
+def refresh_recommendations(user_id):
+    """
+    事务提交后登记用户推荐缓存刷新
+
+    窗口(RECOMMENDATION_REFRESH_DEBOUNCE秒)内的首次触发入队一个延迟到窗口结束的Celery任务，
+    窗口内的后续触发由这一次刷新一并覆盖(任务执行时读取的是最新数据)
+    """
+    transaction.on_commit(partial(_schedule_recommendation_refresh, user_id))
+
+
+def _schedule_recommendation_refresh(user_id):
+    from anime_rec_system.celery import update_recommendations
+
+    window = getattr(settings, 'RECOMMENDATION_REFRESH_DEBOUNCE', 60)
+    key = _refresh_pending_key(user_id)
+    try:
+        # 待刷新标记的过期时间留出余量 - 任务丢失时标记最终过期，之后的触发重新入队
+        if not cache.add(key, 1, timeout=window * 2 + 60):
+            return
+        update_recommendations.apply_async((user_id,), countdown=window)
+    except Exception as e:
+        # 推荐缓存按TTL自然过期，入队失败不影响本次写入
+        cache.delete(key)
+        logger.error(f"推荐刷新任务入队失败: 用户 {user_id}, 错误: {str(e)}")
+        logger.error(traceback.format_exc())
+
+
+def run_recommendation_refresh(user_id):
+    """刷新任务执行体 - 先清除待刷新标记，刷新期间的新触发会排入下一轮"""
+    from .engine.recommendation_engine import recommendation_engine
+
+    cache.delete(_refresh_pending_key(user_id))
+    recommendation_engine.update_recommendations_cache(user_id)
+
+
+def comment_created(comment):
+    """评论(含回复)创建后: 档案计数与分数、父评论回复数、回复互动记录、用户偏好与推荐刷新"""
+    from users.models import Profile
+
+    deltas = {'comment_count': 1}
+    if comment.is_reply:
+        deltas['replies_count'] = 1
+    Profile.objects.filter(user_id=comment.user_id).update(**Profile.counter_updates(**deltas))
+
+    if comment.is_reply and comment.parent_comment_id:
+        UserComment.objects.filter(pk=comment.parent_comment_id).update(reply_count=F('reply_count') + 1)
+        UserInteraction.objects.create(
+            from_user_id=comment.user_id,
+            to_user_id=comment.parent_comment.user_id,
+            interaction_type='reply',
+            comment=comment,
+            strength=REPLY_STRENGTH
+        )
+
+    interaction_changed(comment.user_id, comment.anime_id)
+
+
+def comment_deleted(comment):
+    """评论(含回复)删除后: 档案计数与分数、父评论回复数、用户偏好与推荐刷新(互动记录随评论级联删除)"""
+    from users.models import Profile
+
+    deltas = {'comment_count': -1}
+    if comment.is_reply:
+        deltas['replies_count'] = -1
+    Profile.objects.filter(user_id=comment.user_id).update(**Profile.counter_updates(**deltas))
+
+    if comment.is_reply and comment.parent_comment_id:
+        UserComment.objects.filter(pk=comment.parent_comment_id).update(
+            reply_count=Greatest(F('reply_count') - 1, Value(0)))
+
+    interaction_changed(comment.user_id, comment.anime_id)
+
+
+def anime_like_added(like):
+    counters.increment('anime', like.anime_id, 'like_count', 1)
+    interaction_changed(like.user_id, like.anime_id)
+
+
+def anime_like_removed(like):
+    counters.increment('anime', like.anime_id, 'like_count', -1)
+    interaction_changed(like.user_id, like.anime_id)
+
+
+def comment_like_added(like, comment=None):
+    """评论点赞创建后: 评论点赞数与双方档案计数(写后缓冲)、点赞互动记录、用户偏好与推荐刷新"""
+    comment = comment or like.comment
+    _buffer_comment_like(like.user_id, comment, 1)
+    UserInteraction.objects.create(
+        from_user_id=like.user_id,
+        to_user_id=comment.user_id,
+        interaction_type='like',
+        comment=comment,
+        like=like,
+        strength=LIKE_STRENGTH
+    )
+
+
+def comment_like_removed(like, comment=None):
+    """评论点赞删除后(互动记录随点赞级联删除)"""
+    _buffer_comment_like(like.user_id, comment or like.comment, -1)
+
+
+def _buffer_comment_like(user_id, comment, delta):
+    """评论点赞数与双方档案计数进入写后缓冲 - 档案分数在回写时随计数一并更新"""
+    counters.increment('comment', comment.pk, 'like_count', delta)
+    counters.increment('profile', user_id, 'likes_given_count', delta)
+    counters.increment('profile', comment.user_id, 'likes_received_count', delta)
+    # 偏好值包含用户对该动漫评论的点赞数
+    interaction_changed(user_id, comment.anime_id)
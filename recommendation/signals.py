@@ -1,138 +1,150 @@
-from django.db.models.signals import post_save, post_delete
+import logging
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Avg, Count
-from .models import UserRating, UserComment, UserLike, UserFavorite, UserInteraction, AnimeLike
+from django.db.models import (Avg, Case, Count, Exists, ExpressionWrapper, FloatField, IntegerField, OuterRef,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+from .models import UserRating, UserComment, UserLike, UserFavorite, AnimeLike
 from users.models import UserPreference, Profile
 from anime.models import Anime
-# =============== 评分信号处理 ===============
-@receiver(post_save, sender=UserComment)
-def handle_comment_reply(sender, instance, created, **kwargs):
-    """处理评论回复创建事件"""
-    if created and instance.is_reply and instance.parent_comment:
-        # 更新父评论的回复计数
-        parent_comment = instance.parent_comment
-        parent_comment.reply_count = UserComment.objects.filter(parent_comment=parent_comment).count()
-        parent_comment.save(update_fields=['reply_count'])
-
-        # 更新用户的回复计数
-        user_profile = instance.user.profile
-        user_profile.replies_count = UserComment.objects.filter(user=instance.user, is_reply=True).count()
-        user_profile.save(update_fields=['replies_count'])
-
-        # 更新用户社交活跃度
-        user_profile.calculate_social_activity()
-        user_profile.save(update_fields=['social_activity_score'])
-
-        # 创建用户互动记录
-        UserInteraction.objects.create(
-            from_user=instance.user,
-            to_user=parent_comment.user,
-            interaction_type='reply',
-            comment=instance,
-            strength=1.2  # 回复互动强度较高
-        )
+from anime.popularity import mark_popularity_dirty
+from recommendation import counters, services
 
+logger = logging.getLogger('django')
+
+# 批量导入期间挂起本模块的全部信号处理 - 用ContextVar而不是disconnect，
+# 只影响当前线程/协程，同进程中的其他请求照常触发
+_signals_suspended = ContextVar('recommendation_signals_suspended', default=False)
+
+
+@contextmanager
+def suspend_signals():
+    """在代码块内挂起推荐系统的信号处理(计数、偏好、互动记录)，退出后需自行对账"""
+    token = _signals_suspended.set(True)
+    try:
+        yield
+    finally:
+        _signals_suspended.reset(token)
+
+
+def signals_suspended():
+    return _signals_suspended.get()
+
+
+def _suspendable(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if _signals_suspended.get():
+            return None
+        return handler(*args, **kwargs)
+    return wrapper
+
+
+# =============== 评分信号处理 ===============
+@receiver(pre_save, sender=UserRating)
+@_suspendable
+def capture_previous_rating(sender, instance, **kwargs):
+    """保存前记下旧评分，post_save按差值增量更新统计"""
+    if instance._state.adding or instance.pk is None:
+        instance._previous_rating = None
+    elif hasattr(instance, '_loaded_rating'):
+        instance._previous_rating = instance._loaded_rating
+    else:
+        # 未经查询得到的实例(手动构造带主键)才需要按主键取一次旧值
+        instance._previous_rating = UserRating.objects.filter(pk=instance.pk).values_list(
+            'rating', flat=True).first()
 
-@receiver(post_delete, sender=UserComment)
-def handle_comment_reply_deletion(sender, instance, **kwargs):
-    """处理评论回复删除事件"""
-    if instance.is_reply and instance.parent_comment:
-        # 更新父评论的回复计数
-        parent_comment = instance.parent_comment
-        parent_comment.reply_count = UserComment.objects.filter(parent_comment=parent_comment).count()
-        parent_comment.save(update_fields=['reply_count'])
-
-        # 更新用户的回复计数
-        user_profile = instance.user.profile
-        user_profile.replies_count = UserComment.objects.filter(user=instance.user, is_reply=True).count()
-        user_profile.save(update_fields=['replies_count'])
-
-        # 更新用户社交活跃度
-        user_profile.calculate_social_activity()
-        user_profile.save(update_fields=['social_activity_score'])
 
 @receiver(post_save, sender=UserRating)
+@_suspendable
 def update_anime_rating_stats(sender, instance, created, **kwargs):
     """
-    当用户提交新评分或更新评分时：
-    1. 更新动漫的平均评分和评分计数
-    2. 更新用户档案的评分计数
-    3. 更新或创建用户对该动漫的偏好记录
+    当用户提交新评分或更新评分时(评分接口之外的写入路径，如后台管理)：
+    按差值增量更新动漫评分统计、新增时档案评分计数+1、登记偏好重算与推荐刷新
     """
-    # 计算动漫的新平均评分和评分数量
-    anime = instance.anime
-    rating_stats = UserRating.objects.filter(anime=anime).aggregate(
-        avg=Avg('rating'),
-        count=Count('id')
-    )
-
-    # 更新动漫评分统计
-    anime.rating_avg = rating_stats['avg'] or 0
-    anime.rating_count = rating_stats['count'] or 0
-    anime.save(update_fields=['rating_avg', 'rating_count'])
-
-    # 更新用户评分计数
-    if not getattr(instance, '_skip_profile_update', False):
-        user_profile = instance.user.profile
-        rating_count = UserRating.objects.filter(user=instance.user).count()
-        user_profile.rating_count = rating_count
-        user_profile.save(update_fields=['rating_count'])
-
-    # 更新用户偏好
-    update_user_preference(instance.user, anime)
+    previous = None if created else getattr(instance, '_previous_rating', None)
+    if not created and previous is None:
+        # 取不到旧值时回退为全量重算，保证统计正确
+        recompute_rating_stats(instance.anime)
+        services.interaction_changed(instance.user_id, instance.anime_id)
+    else:
+        services.rating_saved(instance.user_id, instance.anime, instance.rating, previous)
+    instance._loaded_rating = instance.rating
 
 
 @receiver(post_delete, sender=UserRating)
+@_suspendable
 def handle_rating_deletion(sender, instance, **kwargs):
-    """处理评分删除事件"""
-    # 重新计算动漫平均评分
-    anime = instance.anime
-    rating_stats = UserRating.objects.filter(anime=anime).aggregate(
-        avg=Avg('rating'),
-        count=Count('id')
-    )
+    """处理评分删除事件 - 从动漫统计中减去该评分，用户评分计数-1"""
+    services.rating_deleted(instance)
+
 
-    anime.rating_avg = rating_stats['avg'] or 0
-    anime.rating_count = rating_stats['count'] or 0
-    anime.save(update_fields=['rating_avg', 'rating_count'])
+def apply_rating_delta(anime, added=None, removed=None):
+    """
+    增量更新动漫评分统计 - 评分数量与评分总和的增量写入随机计数分片，不锁 Anime 行；
+    周期折叠时按 avg = (avg*count + 增量总和) / (count + 增量数量) 合并回 Anime
 
-    # 更新用户评分计数
-    user_profile = instance.user.profile
-    rating_count = UserRating.objects.filter(user=instance.user).count()
-    user_profile.rating_count = rating_count
-    user_profile.save(update_fields=['rating_count'])
+    - 新增: 数量+1，总和+added
+    - 删除: 数量-1，总和-removed
+    - 修改: 总和+(added-removed)
 
-    # 更新用户偏好
-    update_user_preference(instance.user, anime)
+    anime 应为刚从数据库读取的实例(未叠加分片增量)：写入前叠加一次分片得到当前统计，
+    写入后在内存中按同一公式合并本次增量，不再读回
+    """
+    from anime.counter_shards import add, apply_shards
+
+    count = (added is not None) - (removed is not None)
+    # 评分可能以int传入，统一为float
+    total = (float(added) if added is not None else 0.0) - (float(removed) if removed is not None else 0.0)
+    if not count and not total:
+        return
+    apply_shards([anime], ['rating_avg', 'rating_count'])
+    add(anime.pk, rating_count=count, rating_sum=total)
+
+    current = anime.rating_count or 0
+    new_count = max(0, current + count)
+    anime.rating_avg = ((anime.rating_avg or 0) * current + total) / new_count if new_count else 0
+    anime.rating_count = new_count
+
+
+def recompute_rating_stats(anime):
+    """全量重算动漫评分统计 - 仅在无法增量更新时使用，同时清掉分片中的评分增量"""
+    from anime.models import AnimeCounters
+
+    with transaction.atomic():
+        rating_stats = UserRating.objects.filter(anime=anime).aggregate(
+            avg=Avg('rating'),
+            count=Count('id')
+        )
+        anime.rating_avg = rating_stats['avg'] or 0
+        anime.rating_count = rating_stats['count'] or 0
+        anime.save(update_fields=['rating_avg', 'rating_count'])
+        AnimeCounters.objects.filter(anime=anime).update(rating_count=0, rating_sum=0)
 
 
 # =============== 评论信号处理 ===============
 
 @receiver(post_save, sender=UserComment)
+@_suspendable
 def handle_comment_creation(sender, instance, created, **kwargs):
-    """处理新评论创建事件"""
+    """处理新评论(含回复)创建事件 - 副作用见 services.comment_created"""
     if created:
-        # 更新用户评论计数
-        user_profile = instance.user.profile
-        comment_count = UserComment.objects.filter(user=instance.user).count()
-        user_profile.comment_count = comment_count
-        user_profile.save(update_fields=['comment_count'])
-
-        # 更新用户偏好
-        update_user_preference(instance.user, instance.anime)
+        services.comment_created(instance)
 
 
 @receiver(post_delete, sender=UserComment)
+@_suspendable
 def handle_comment_deletion(sender, instance, **kwargs):
-    """处理评论删除事件"""
-    # 更新用户评论计数
-    user_profile = instance.user.profile
-    comment_count = UserComment.objects.filter(user=instance.user).count()
-    user_profile.comment_count = comment_count
-    user_profile.save(update_fields=['comment_count'])
-
-    # 更新用户偏好
-    update_user_preference(instance.user, instance.anime)
+    """处理评论(含回复)删除事件"""
+    services.comment_deleted(instance)
 
 
 # =============== 点赞信号处理 ===============
@@ -141,217 +153,172 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import AnimeLike
 @receiver(post_save, sender=AnimeLike)
+@_suspendable
 def handle_anime_like_creation(sender, instance, created, **kwargs):
     """处理动漫点赞创建事件"""
     if created:
-        # 更新动漫点赞计数
-        anime = instance.anime
-        like_count = AnimeLike.objects.filter(anime=anime).count()
-        anime.like_count = like_count
-        anime.save(update_fields=['like_count'])
-
-        # 更新用户偏好 (对点赞动漫的偏好)
-        update_user_preference(instance.user, anime)
+        services.anime_like_added(instance)
+
+
 @receiver(post_delete, sender=AnimeLike)
+@_suspendable
 def handle_anime_like_deletion(sender, instance, **kwargs):
     """处理动漫点赞删除事件"""
-    # 更新动漫点赞计数
-    anime = instance.anime
-    like_count = AnimeLike.objects.filter(anime=anime).count()
-    anime.like_count = like_count
-    anime.save(update_fields=['like_count'])
-
-    # 更新用户偏好
-    update_user_preference(instance.user, anime)
+    services.anime_like_removed(instance)
 
 
-# 修改点赞信号处理
 @receiver(post_save, sender=UserLike)
+@_suspendable
 def handle_like_creation(sender, instance, created, **kwargs):
-    """处理点赞创建事件"""
+    """处理评论点赞创建事件"""
     if created:
-        # 更新评论的点赞计数
-        comment = instance.comment
-        like_count = UserLike.objects.filter(comment=comment).count()
-        comment.like_count = like_count
-        comment.save(update_fields=['like_count'])
-
-        # 更新点赞用户的统计
-        liker_profile = instance.user.profile
-        liker_profile.likes_given_count = UserLike.objects.filter(user=instance.user).count()
-        liker_profile.save(update_fields=['likes_given_count'])
-
-        # 更新被点赞用户的统计
-        liked_user_profile = comment.user.profile
-        liked_user_profile.likes_received_count = UserLike.objects.filter(comment__user=comment.user).count()
-        liked_user_profile.save(update_fields=['likes_received_count'])
-
-        # 更新两位用户的分数
-        liker_profile.calculate_social_activity()
-        liked_user_profile.calculate_influence()
-        liker_profile.save(update_fields=['social_activity_score'])
-        liked_user_profile.save(update_fields=['influence_score'])
-
-        # 创建用户互动记录
-        UserInteraction.objects.create(
-            from_user=instance.user,
-            to_user=comment.user,
-            interaction_type='like',
-            comment=comment,
-            like=instance,
-            strength=0.8  # 点赞互动强度适中
-        )
+        services.comment_like_added(instance)
 
 
 @receiver(post_delete, sender=UserLike)
+@_suspendable
 def handle_like_deletion(sender, instance, **kwargs):
-    """处理点赞删除事件"""
-    # 更新评论的点赞计数
-    comment = instance.comment
-    like_count = UserLike.objects.filter(comment=comment).count()
-    comment.like_count = like_count
-    comment.save(update_fields=['like_count'])
-
-    # 更新点赞用户的统计
-    liker_profile = instance.user.profile
-    liker_profile.likes_given_count = UserLike.objects.filter(user=instance.user).count()
-    liker_profile.save(update_fields=['likes_given_count'])
-
-    # 更新被点赞用户的统计
-    liked_user_profile = comment.user.profile
-    liked_user_profile.likes_received_count = UserLike.objects.filter(comment__user=comment.user).count()
-    liked_user_profile.save(update_fields=['likes_received_count'])
-
-    # 更新两位用户的分数
-    liker_profile.calculate_social_activity()
-    liked_user_profile.calculate_influence()
-    liker_profile.save(update_fields=['social_activity_score'])
-    liked_user_profile.save(update_fields=['influence_score'])
+    """处理评论点赞删除事件"""
+    services.comment_like_removed(instance)
+
+
 # =============== 收藏信号处理 ===============
 
 @receiver(post_save, sender=UserFavorite)
+@_suspendable
 def handle_favorite_creation(sender, instance, created, **kwargs):
     """处理收藏创建事件"""
     if created:
-        # 更新动漫收藏计数
-        anime = instance.anime
-        favorite_count = UserFavorite.objects.filter(anime=anime).count()
-        anime.favorite_count = favorite_count
-        anime.save(update_fields=['favorite_count'])
+        # 动漫收藏计数进入写后缓冲，回写时一并标记热门度待重算
+        counters.increment('anime', instance.anime_id, 'favorite_count', 1)
 
-        # 更新用户偏好
-        update_user_preference(instance.user, anime)
+        # 更新用户偏好，刷新推荐
+        services.interaction_changed(instance.user_id, instance.anime_id)
 
 
 @receiver(post_delete, sender=UserFavorite)
+@_suspendable
 def handle_favorite_deletion(sender, instance, **kwargs):
     """处理收藏删除事件"""
-    # 更新动漫收藏计数
-    anime = instance.anime
-    favorite_count = UserFavorite.objects.filter(anime=anime).count()
-    anime.favorite_count = favorite_count
-    anime.save(update_fields=['favorite_count'])
+    counters.increment('anime', instance.anime_id, 'favorite_count', -1)
 
-    # 更新用户偏好
-    update_user_preference(instance.user, anime)
+    # 更新用户偏好，刷新推荐
+    services.interaction_changed(instance.user_id, instance.anime_id)
 
 
 # =============== 辅助函数 ===============
-def update_user_preference(user, anime):
-    """
-    计算并更新用户对特定动漫的偏好值
-    综合考虑评分、评论、收藏、点赞等行为
+def _recompute_pending(connection, key):
+    """on_commit回调 - 该(用户, 动漫)仍待重算时重算一次，同一事务中后续的重复回调直接跳过"""
+    pending = getattr(connection, '_pending_preferences', None)
+    if not pending or key not in pending:
+        return
+    pending.discard(key)
+    recompute_user_preference(*key)
+
+
+def update_user_preference(user_id, anime_id):
     """
-    # 获取用户对该动漫的各种交互数据
-    try:
-        rating = UserRating.objects.get(user=user, anime=anime).rating
-        rating_weight = rating / 5 * 50  # 评分权重50%
-    except UserRating.DoesNotExist:
-        rating_weight = 0
+    登记用户对特定动漫的偏好值待重算
 
-    # 评论权重10%
-    comment_count = UserComment.objects.filter(user=user, anime=anime).count()
-    comment_weight = min(10, comment_count * 5)  # 最多10%
+    在事务中时记入连接上的待重算集合并注册on_commit回调，提交后同一(用户, 动漫)
+    只重算一次(评分+收藏+评论…合并)；否则立即重算
 
-    # 收藏权重20%
-    has_favorite = UserFavorite.objects.filter(user=user, anime=anime).exists()
-    favorite_weight = 20 if has_favorite else 0
+    每次登记都注册回调: 事务或保存点回滚会丢弃其中注册的回调，
+    只靠首次注册会让集合中的键再也等不到回调
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        recompute_user_preference(user_id, anime_id)
+        return
 
-    # 浏览权重10%
-    try:
-        from users.models import UserBrowsing
-        browsing = UserBrowsing.objects.get(user=user, anime=anime)
-        browse_count = browsing.browse_count
-        browse_weight = min(10, browse_count)  # 最多10%
-    except:
-        browse_weight = 0
-
-    # 动漫点赞权重10%
-    has_anime_like = AnimeLike.objects.filter(user=user, anime=anime).exists()
-    anime_like_weight = 10 if has_anime_like else 0
-
-    # 评论点赞权重5%
-    anime_comments = UserComment.objects.filter(anime=anime)
-    like_count = UserLike.objects.filter(user=user, comment__in=anime_comments).count()
-    like_weight = min(5, like_count * 1)  # 最多5%
-
-    # 计算总偏好值 (0-100)
-    preference_value = rating_weight + comment_weight + favorite_weight + browse_weight + anime_like_weight + like_weight
-
-    # 更新或创建偏好记录
-    UserPreference.objects.update_or_create(
-        user=user,
-        anime=anime,
-        defaults={'preference_value': preference_value}
-    )
+    pending = getattr(connection, '_pending_preferences', None)
+    if pending is None:
+        pending = connection._pending_preferences = set()
+    key = (user_id, anime_id)
+    pending.add(key)
+    transaction.on_commit(partial(_recompute_pending, connection, key))
 
-    # 计算并更新动漫整体热门度
-    update_anime_popularity(anime)
 
+def _count_subquery(queryset):
+    return Subquery(
+        queryset.order_by().values('user').annotate(total=Count('pk')).values('total')[:1],
+        output_field=IntegerField())
 
-def update_anime_popularity(anime):
+
+def preference_value_expression(user_ref, anime_ref):
     """
-    更新动漫热门度指数
-    热门度 = 平均评分*0.4 + 标准化评分数*0.3 + 标准化浏览数*0.2 + 标准化收藏数*0.1
+    偏好值(0-100)的SQL表达式 - 单条重算与批量对账共用
+
+    Args:
+        user_ref / anime_ref: 用户ID、动漫ID，可为常量或OuterRef
     """
-    # 获取基础指标
-    rating_avg = anime.rating_avg or 0
-    rating_count = anime.rating_count or 0
-    view_count = anime.view_count or 0
-    favorite_count = anime.favorite_count or 0
-
-    # 获取系统平均值作为归一化基准 (简化版，实际可能需要更复杂的计算)
-    from django.db.models import Avg, Max
-    metrics = Anime.objects.aggregate(
-        avg_rating_count=Avg('rating_count'),
-        max_rating_count=Max('rating_count'),
-        avg_view_count=Avg('view_count'),
-        max_view_count=Max('view_count'),
-        avg_favorite_count=Avg('favorite_count'),
-        max_favorite_count=Max('favorite_count'),
+    from users.models import UserBrowsing
+
+    def weight(expression, cap):
+        return Least(expression, Value(float(cap)))
+
+    rating = Subquery(UserRating.objects.filter(user_id=user_ref, anime_id=anime_ref).values('rating')[:1],
+                      output_field=FloatField())
+    comment_count = _count_subquery(UserComment.objects.filter(user_id=user_ref, anime_id=anime_ref))
+    browse_count = Subquery(
+        UserBrowsing.objects.filter(user_id=user_ref, anime_id=anime_ref).values('browse_count')[:1],
+        output_field=IntegerField())
+    comment_like_count = _count_subquery(UserLike.objects.filter(user_id=user_ref, comment__anime_id=anime_ref))
+    components = (
+        # 评分权重50%
+        Coalesce(rating / Value(5.0) * Value(50.0), Value(0.0)),
+        # 评论权重10%
+        weight(Coalesce(comment_count, 0) * Value(5.0), 10),
+        # 收藏权重20%
+        Case(When(Exists(UserFavorite.objects.filter(user_id=user_ref, anime_id=anime_ref)), then=Value(20.0)),
+             default=Value(0.0)),
+        # 浏览权重10%
+        weight(Coalesce(browse_count, 0) * Value(1.0), 10),
+        # 动漫点赞权重10%
+        Case(When(Exists(AnimeLike.objects.filter(user_id=user_ref, anime_id=anime_ref)), then=Value(10.0)),
+             default=Value(0.0)),
+        # 评论点赞权重5%
+        weight(Coalesce(comment_like_count, 0) * Value(1.0), 5),
     )
+    total = components[0]
+    for component in components[1:]:
+        total = total + component
+    return ExpressionWrapper(total, output_field=FloatField())
 
-    # 防止除零错误
-    max_rating_count = max(1, metrics['max_rating_count'] or 1)
-    max_view_count = max(1, metrics['max_view_count'] or 1)
-    max_favorite_count = max(1, metrics['max_favorite_count'] or 1)
-
-    # 归一化各指标 (0-1)
-    norm_rating_count = rating_count / max_rating_count
-    norm_view_count = view_count / max_view_count
-    norm_favorite_count = favorite_count / max_favorite_count
-
-    # 归一化评分 (0-1)
-    norm_rating_avg = rating_avg / 5
-
-    # 计算热门度 (0-1)
-    popularity = (
-            norm_rating_avg * 0.4 +
-            norm_rating_count * 0.3 +
-            norm_view_count * 0.2 +
-            norm_favorite_count * 0.1
-    )
 
-    # 更新热门度
-    anime.popularity = popularity
-    anime.save(update_fields=['popularity'])
\ No newline at end of file
+def recompute_user_preference(user_id, anime_id):
+    """
+    计算并更新用户对特定动漫的偏好值
+    综合考虑评分、评论、收藏、点赞等行为
+
+    偏好值由一条带子查询注解的SQL算出，随后一条UPDATE(首次为INSERT)写入偏好
+    """
+    try:
+        inputs = Anime.objects.filter(pk=anime_id).annotate(
+            user_exists=Exists(User.objects.filter(pk=user_id)),
+            preference_value=preference_value_expression(user_id, OuterRef('pk')),
+        ).values('user_exists', 'preference_value').first()
+
+        # 用户或动漫已被删除(级联删除触发的信号)
+        if not inputs or not inputs['user_exists']:
+            return
+        preference_value = inputs['preference_value']
+
+        # 更新或创建偏好记录 - 已存在时只需一条UPDATE
+        updated = UserPreference.objects.filter(user_id=user_id, anime_id=anime_id).update(
+            preference_value=preference_value, last_updated=timezone.now())
+        if not updated:
+            try:
+                with transaction.atomic():
+                    UserPreference.objects.create(user_id=user_id, anime_id=anime_id,
+                                                  preference_value=preference_value)
+            except IntegrityError:
+                # 并发请求已创建
+                UserPreference.objects.filter(user_id=user_id, anime_id=anime_id).update(
+                    preference_value=preference_value, last_updated=timezone.now())
+
+        # 热门度只标记待重算，由周期任务批量重算(anime.popularity.recompute_popularity)
+        mark_popularity_dirty(anime_id)
+    except Exception as e:
+        logger.error(f"更新用户偏好失败: user={user_id}, anime={anime_id}, 错误: {str(e)}")
+        logger.error(traceback.format_exc())
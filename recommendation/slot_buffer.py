@@ -0,0 +1,87 @@
+# recommendation/slot_buffer.py
+# 缓存中的顺序槽位日志 - 写入方原子分配槽位号后写入内容，回写方从游标起按槽位号批量读取；
+# 计数缓冲(recommendation.counters)与浏览事件日志(users.browse_log)共用
+
+import logging
+import time
+
+logger = logging.getLogger('django')
+
+
+def incr(cache, key, delta):
+    """原子累加 - 键不存在时用add创建(不过期)，并发创建失败的一方改为累加"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+class SlotLog:
+    """
+    顺序槽位日志
+
+    槽位号先分配、内容后写入，两步之间写入方可能崩溃或写入失败，留下永远空着的槽位。
+    读取遇到空槽位时先停下等待(写入方可能只是还没写完)，空槽位首次发现超过gap_timeout秒后跳过，
+    避免一个空槽位让后续所有槽位永远无法回写
+    """
+
+    def __init__(self, prefix, gap_timeout=60):
+        self.prefix = prefix
+        self.seq_key = f'{prefix}:seq'
+        self.cursor_key = f'{prefix}:cursor'
+        self.gap_timeout = gap_timeout
+
+    def slot_key(self, slot):
+        return f'{self.prefix}:slot:{slot}'
+
+    def gap_key(self, slot):
+        return f'{self.prefix}:gap:{slot}'
+
+    def append(self, cache, value):
+        """分配槽位号并写入内容，返回槽位号"""
+        slot = incr(cache, self.seq_key, 1)
+        cache.set(self.slot_key(slot), value, timeout=None)
+        return slot
+
+    def read(self, cache):
+        """
+        读取游标之后已写入的槽位 - 调用方需持有回写锁
+
+        Returns:
+            (内容列表, 可推进到的槽位号)；停在尚未超时的空槽位之前，超时的空槽位计入推进范围
+        """
+        cursor = cache.get(self.cursor_key, 0)
+        seq = cache.get(self.seq_key, 0)
+        if seq <= cursor:
+            return [], cursor
+
+        slots = cache.get_many([self.slot_key(n) for n in range(cursor + 1, seq + 1)])
+        values = []
+        end = cursor
+        now = time.time()
+        for n in range(cursor + 1, seq + 1):
+            key = self.slot_key(n)
+            if key in slots:
+                values.append(slots[key])
+                end = n
+                continue
+
+            gap_key = self.gap_key(n)
+            cache.add(gap_key, now, timeout=None)
+            if now - cache.get(gap_key, now) < self.gap_timeout:
+                # 槽位号已分配但内容尚未写入 - 停在这里，下一轮继续
+                break
+            logger.warning(f"槽位超过{self.gap_timeout}秒未写入，跳过: {key}")
+            end = n
+        return values, end
+
+    def advance(self, cache, end):
+        """回写成功后推进游标到end，删除已处理的槽位与空槽位标记"""
+        cursor = cache.get(self.cursor_key, 0)
+        if end <= cursor:
+            return
+        cache.set(self.cursor_key, end, timeout=None)
+        slots = range(cursor + 1, end + 1)
+        cache.delete_many([self.slot_key(n) for n in slots] + [self.gap_key(n) for n in slots])
@@ -1,3 +1,464 @@
-from django.test import TestCase
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from anime.counter_shards import fold, totals
+from anime.models import Anime, AnimeType
+from recommendation import counters, services
+from recommendation.bulk_import import bulk_import, reconcile_aggregates
+from recommendation.models import AnimeLike, UserComment, UserFavorite, UserInteraction, UserLike, UserRating
+from recommendation.scrapers.myanimelist_scraper import MyAnimeListScraper
+from recommendation.scrapers.pipeline import CrawlPipeline
+from recommendation.scrapers.stub_server import StubAnimeSite
+from recommendation.scrapers.text_normalization import cache_clear, fix_mojibake, normalize_text
+from recommendation.signals import suspend_signals
+from recommendation.slot_buffer import SlotLog, incr
+from users.models import Profile, UserBrowsing, UserPreference
 
 # Create your tests here.
+
+# 已知乱码语料: (原文, 乱码形态)
+MOJIBAKE_CORPUS = [
+    ('动漫', 'å\x8a¨æ¼«'),                                      # UTF-8 按 Latin-1 解码
+    ('动漫', 'åŠ¨æ¼«'),                                          # UTF-8 按 cp1252 解码
+    ('动漫', 'Ã¥Â\x8aÂ¨Ã¦Â¼Â«'),                                # 两次按 Latin-1 解码
+    ('动漫', '鍔ㄦ极'),                                          # UTF-8 按 GBK 解码
+    ('进击的巨人', 'è¿›å‡»çš„å·¨äºº'),
+    ('鬼滅の刃', 'é¬¼æ»\x85ã\x81®å\x88\x83'),
+    ('Pokémon', 'PokÃ©mon'),
+    ('Pokémon', 'PokÃ\x83Â©mon'),
+    ('Café – ‘quoted’', 'CafÃ© â€“ â€˜quotedâ€™'),
+    ('進撃の巨人 Season 2', 'é\x80²æ\x92\x83ã\x81®å·¨äºº Season 2'),
+]
+
+# 正常文本 - 必须原样保留
+CLEAN_CORPUS = [
+    'Shingeki no Kyojin',
+    '进击的巨人',
+    '鬼滅の刃',
+    'Pokémon',
+    'Café au lait – ‘quoted’',
+    '千与千寻',
+    '魔法少女小圆',
+    '一拳超人',
+    '猫',
+    'Ａｎｉｍｅ（全角）',
+]
+
+
+class TextNormalizationTests(SimpleTestCase):
+    def setUp(self):
+        cache_clear()
+
+    def test_repairs_known_mojibake(self):
+        for expected, broken in MOJIBAKE_CORPUS:
+            with self.subTest(broken=broken):
+                self.assertEqual(fix_mojibake(broken), expected)
+
+    def test_keeps_clean_text(self):
+        for text in CLEAN_CORPUS:
+            with self.subTest(text=text):
+                self.assertEqual(fix_mojibake(text), text)
+
+    def test_unrecoverable_text_is_left_alone(self):
+        # cp1252宽容解码时已丢失字节(出现U+FFFD)，无法还原也不应被改坏
+        broken = 'é¬¼æ»…ã�®åˆƒ'
+        self.assertEqual(fix_mojibake(broken), broken)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text(None), '')
+        self.assertEqual(normalize_text(b'\xe5\x8a\xa8\xe6\xbc\xab'), '动漫')
+        self.assertEqual(normalize_text('鬼滅の刃'.encode('shift-jis')), '鬼滅の刃')
+        self.assertEqual(normalize_text('a\u200bb\x00\r\nc\t'), 'ab\r\nc\t')
+        self.assertEqual(normalize_text('e\u0301'), '\u00e9')
+        self.assertEqual(normalize_text('åŠ¨æ¼«\x07'), '动漫')
+
+    def test_repeated_strings_are_memoized(self):
+        fix_mojibake('åŠ¨æ¼«')
+        fix_mojibake('åŠ¨æ¼«')
+        self.assertEqual(fix_mojibake.cache_info().hits, 1)
+
+
+class ScraperStubSiteTests(SimpleTestCase):
+    """爬虫对本地模拟站点 - 并发抓取下的令牌桶限速、429/Retry-After退避与ETag重新验证"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+
+    def start_site(self, **kwargs):
+        site = StubAnimeSite(**kwargs)
+        site.start()
+        self.addCleanup(site.stop)
+        return site
+
+    def test_concurrent_fetch_is_rate_limited_and_revalidated(self):
+        site = self.start_site(anime_count=8, max_rps=5)
+        # 4个线程共享每秒4个请求的令牌桶，不应触发服务端的每秒5个限制
+        scraper = MyAnimeListScraper(delay=0.25, concurrency=4, max_rate=4, http_cache_dir=self.cache_dir)
+        scraper.base_url = site.base_url
+        urls = [f'{site.base_url}/anime/{n}' for n in range(1, 9)]
+
+        first = scraper.fetch_many(urls)
+        self.assertTrue(all(response is not None and response.status_code == 200 for response in first))
+        self.assertEqual(site.throttled, 0)
+        self.assertEqual(site.not_modified, 0)
+
+        timestamps = sorted(ts for ts, _ in site.requests)
+        for earlier, later in zip(timestamps, timestamps[4:]):
+            # 任意连续5个请求至少跨越1秒(留出调度抖动)
+            self.assertGreaterEqual(later - earlier, 0.9)
+
+        # 第二轮带If-None-Match，全部304并返回缓存正文
+        second = scraper.fetch_many(urls)
+        self.assertEqual(site.not_modified, len(urls))
+        self.assertEqual([response.text for response in second], [response.text for response in first])
+        self.assertEqual(len(site.requests), 2 * len(urls))
+
+    def test_backs_off_on_retry_after(self):
+        site = self.start_site(anime_count=6, max_rps=2, retry_after=1)
+        scraper = MyAnimeListScraper(delay=0.1, max_retries=5, concurrency=3)
+        scraper.base_url = site.base_url
+        urls = [f'{site.base_url}/anime/{n}' for n in range(1, 7)]
+
+        responses = scraper.fetch_many(urls)
+        self.assertTrue(all(response is not None and response.status_code == 200 for response in responses))
+        self.assertGreater(site.throttled, 0)
+        self.assertEqual(len(site.requests), len(urls))
+        state = scraper.rate_limiter.snapshot()[f'127.0.0.1:{site.base_url.rsplit(":", 1)[1]}']
+        self.assertGreaterEqual(state['decreases'], 1)
+
+    def test_pipeline_abort_with_full_queues_does_not_hang(self):
+        site = self.start_site(anime_count=20, page_size=20)
+        scraper = MyAnimeListScraper(delay=0, concurrency=2)
+        scraper.base_url = site.base_url
+        pipeline = CrawlPipeline(scraper, parse_workers=0, queue_size=1)
+
+        def failing_write(write_queue, *args):
+            # 等上游把各阶段队列都塞满(背压)，再模拟写入阶段异常
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and not all(stage.inbox.full() for stage in pipeline.stages[1:]):
+                time.sleep(0.01)
+            self.assertTrue(all(stage.inbox.full() for stage in pipeline.stages[1:]))
+            raise RuntimeError('写入失败')
+
+        errors = []
+
+        def run():
+            try:
+                pipeline.run(max_pages=1, incremental=False, do_import=False)
+            except RuntimeError as e:
+                errors.append(e)
+
+        with mock.patch.object(pipeline, '_write', side_effect=failing_write):
+            runner = threading.Thread(target=run, daemon=True)
+            runner.start()
+            runner.join(timeout=10)
+        self.assertFalse(runner.is_alive(), '中止后上游阶段未退出')
+        self.assertEqual(len(errors), 1)
+
+
+class CounterBufferTests(TestCase):
+    """计数缓冲 - 空槽位超时后跳过，缓冲或写库失败不丢失也不重复计数，回写后归零的键会过期"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with suspend_signals():
+            anime_type = AnimeType.objects.create(name='TV')
+            cls.anime = Anime.objects.create(title='Test', type=anime_type, description='x',
+                                             release_date='2020-01-01')
+            author = User.objects.create_user('author', password='x')
+            cls.comment = UserComment.objects.create(user=author, anime=cls.anime, content='hi')
+
+    def setUp(self):
+        self.cache = caches[settings.COUNTER_CACHE_ALIAS]
+        self.cache.clear()
+        self.cache.add(counters.FLUSH_DUE_KEY, 1, timeout=None)
+
+    def increment(self, delta=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment('anime', self.anime.pk, 'view_count', delta)
+
+    def test_abandoned_slot_is_skipped_after_timeout(self):
+        # 写入方分配槽位号后未写入内容
+        incr(self.cache, SlotLog(counters.KEY_PREFIX).seq_key, 1)
+        self.increment(2)
+        self.assertEqual(counters.flush(), 0)
+
+        with mock.patch('recommendation.slot_buffer.time.time', return_value=time.time() + 61):
+            self.assertEqual(counters.flush(), 1)
+        self.assertEqual(totals([self.anime.pk])[self.anime.pk]['view_count'], 2)
+        self.assertEqual(counters.pending('anime', [self.anime.pk], ['view_count']), {})
+
+        # 归零的累加键带过期时间，再次累加后恢复为不过期
+        plus_key = counters._keys(counters._member('anime', self.anime.pk, 'view_count'))[0]
+        self.assertIsNotNone(self.cache._expire_info[self.cache.make_and_validate_key(plus_key)])
+        self.increment()
+        self.assertIsNone(self.cache._expire_info[self.cache.make_and_validate_key(plus_key)])
+        self.assertEqual(counters.flush(), 1)
+
+    def test_failed_buffer_writes_through_and_clears_dirty_marker(self):
+        with mock.patch.object(SlotLog, 'append', side_effect=ConnectionError):
+            self.increment()
+        self.assertEqual(totals([self.anime.pk])[self.anime.pk]['view_count'], 1)
+        self.assertEqual(counters.pending('anime', [self.anime.pk], ['view_count']), {})
+
+        # 下一次累加重新登记槽位，能正常回写
+        self.increment()
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(totals([self.anime.pk])[self.anime.pk]['view_count'], 2)
+
+    def test_failed_flush_is_retried_without_double_counting(self):
+        def like_count():
+            """数据库值 + 未回写增量"""
+            comment = UserComment.objects.get(pk=self.comment.pk)
+            return comment.like_count + sum(counters.pending('comment', [comment.pk], ['like_count']).values())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment('comment', self.comment.pk, 'like_count', 3)
+        with mock.patch.object(counters, '_apply', side_effect=DatabaseError):
+            self.assertEqual(counters.flush(), 0)
+        self.assertEqual(UserComment.objects.get(pk=self.comment.pk).like_count, 0)
+        self.assertEqual(like_count(), 3)
+
+        # 失败后又有新增量 - 该计数项登记在两个槽位，回写只取一次
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment('comment', self.comment.pk, 'like_count', 1)
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(UserComment.objects.get(pk=self.comment.pk).like_count, 4)
+        self.assertEqual(counters.pending('comment', [self.comment.pk], ['like_count']), {})
+
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(like_count(), 4)
+
+
+class WriteServiceQueryCountTests(TransactionTestCase):
+    """
+    每个动作的查询数固定 - 副作用只执行一次，不再由视图和信号重复写入
+
+    动作真实提交，查询数包含提交后执行的回调(计数缓冲、偏好重算)
+    """
+
+    def setUp(self):
+        with suspend_signals():
+            anime_type = AnimeType.objects.create(name='TV')
+            self.anime = Anime.objects.create(title='Test', type=anime_type, description='x',
+                                              release_date='2020-01-01')
+            self.author = User.objects.create_user('author', password='x')
+            self.reader = User.objects.create_user('reader', password='x')
+            self.comment = UserComment.objects.create(user=self.author, anime=self.anime, content='hi')
+
+        cache = caches[settings.COUNTER_CACHE_ALIAS]
+        cache.clear()
+        # 计数只进缓冲，不在动作中顺带回写，查询数才确定
+        cache.add(counters.FLUSH_DUE_KEY, 1, timeout=None)
+        caches['default'].clear()
+        # 推荐刷新任务只记录入队，不连接消息代理
+        patcher = mock.patch('anime_rec_system.celery.update_recommendations.apply_async')
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def buffered_like_count(self, obj, target):
+        """重新读取实例后叠加未回写的增量(current会修改传入的实例)"""
+        return counters.current(type(obj).objects.get(pk=obj.pk), target, 'like_count')
+
+    def test_add_reply(self):
+        # 事务(2) + 插入回复、档案计数与分数、父评论回复数、互动记录(4) + 读回回复数(1)
+        # + 偏好: 计算、更新、首次插入(3)、热门度标记(6)
+        with self.assertNumQueries(13):
+            reply = services.add_reply(self.reader, self.comment, 'reply')
+        self.assertEqual(self.comment.reply_count, 1)
+        self.assertEqual(UserInteraction.objects.filter(comment=reply, interaction_type='reply').count(), 1)
+        profile = Profile.objects.get(user=self.reader)
+        self.assertEqual((profile.comment_count, profile.replies_count), (1, 1))
+        self.assertAlmostEqual(profile.social_activity_score, 0.7)
+
+    def test_toggle_anime_like(self):
+        # 事务与get_or_create(6) + 点赞数叠加分片(1) + 偏好(6)；计数只进缓冲，不访问数据库
+        with self.assertNumQueries(13):
+            liked, like_count = services.toggle_anime_like(self.reader, self.anime)
+        self.assertTrue(liked)
+        self.assertEqual(like_count, 1)
+        # 删除后只剩点赞数叠加分片与偏好重算(偏好行已存在)；与视图一样重新读取(返回的点赞数叠加在实例上)
+        anime = Anime.objects.get(pk=self.anime.pk)
+        with self.assertNumQueries(8):
+            liked, like_count = services.toggle_anime_like(self.reader, anime)
+        self.assertFalse(liked)
+        self.assertEqual(like_count, 0)
+        self.assertEqual(self.buffered_like_count(self.anime, 'anime'), 0)
+        self.assertFalse(AnimeLike.objects.exists())
+
+    def test_toggle_comment_like(self):
+        # 事务与get_or_create(6) + 互动记录(1) + 偏好(6)；评论与双方档案计数只进缓冲
+        with self.assertNumQueries(13):
+            liked, like_count = services.toggle_comment_like(self.reader, self.comment)
+        self.assertTrue(liked)
+        self.assertEqual(like_count, 1)
+        self.assertEqual(UserInteraction.objects.filter(interaction_type='like').count(), 1)
+        # 互动记录随点赞级联删除
+        comment = UserComment.objects.get(pk=self.comment.pk)
+        with self.assertNumQueries(8):
+            liked, like_count = services.toggle_comment_like(self.reader, comment)
+        self.assertFalse(liked)
+        self.assertEqual(like_count, 0)
+        self.assertEqual(self.buffered_like_count(self.comment, 'comment'), 0)
+        self.assertFalse(UserLike.objects.exists())
+        self.assertFalse(UserInteraction.objects.exists())
+
+        # 回写后档案计数与分数在同一条UPDATE中更新
+        services.toggle_comment_like(self.reader, self.comment)
+        counters.flush()
+        reader, author = Profile.objects.get(user=self.reader), Profile.objects.get(user=self.author)
+        self.assertEqual((reader.likes_given_count, author.likes_received_count), (1, 1))
+        self.assertAlmostEqual(reader.social_activity_score, 0.3)
+        self.assertAlmostEqual(author.influence_score, 0.5)
+
+    # 单分片: 首个评分补建分片行后，后续写入的查询数固定
+    @override_settings(ANIME_COUNTER_SHARDS=1)
+    def test_rate_anime(self):
+        other = User.objects.create_user('other', password='x')
+        services.rate_anime(other, self.anime, 2.0)
+        # 与视图一样每次请求重新读取动漫(服务在读到的统计上合并增量)
+        anime = Anime.objects.get(pk=self.anime.pk)
+
+        # 事务(2) + 读取旧评分(1) + 插入(3) + 读取分片(1) + 写入分片(1) + 档案计数(1) + 偏好(6)；
+        # 不再读回平均评分
+        with self.assertNumQueries(15):
+            created, previous, avg = services.rate_anime(self.reader, anime, 4.0)
+        self.assertEqual((created, previous), (True, None))
+        self.assertAlmostEqual(avg, 3.0)
+
+        # 修改: 事务(2) + 读取旧评分(1) + 更新(1) + 读取分片(1) + 写入分片(1) + 偏好(3，偏好行已存在)
+        anime = Anime.objects.get(pk=self.anime.pk)
+        with self.assertNumQueries(9):
+            created, previous, avg = services.rate_anime(self.reader, anime, 5.0)
+        self.assertEqual((created, previous), (False, 4.0))
+        self.assertAlmostEqual(avg, 3.5)
+        self.assertEqual(UserRating.objects.get(user=self.reader).rating, 5.0)
+        self.assertEqual(Profile.objects.get(user=self.reader).rating_count, 1)
+        # 同一用户窗口内的第二次评分不再入队
+        self.assertEqual(self.refresh.call_count, 2)
+
+    @override_settings(RECOMMENDATION_REFRESH_DEBOUNCE=30)
+    def test_recommendation_refresh_is_debounced(self):
+        for _ in range(3):
+            services.toggle_anime_like(self.reader, self.anime)
+        self.refresh.assert_called_once_with((self.reader.pk,), countdown=30)
+
+        # 任务开始执行时清除标记，之后的交互重新入队
+        with mock.patch('recommendation.engine.recommendation_engine.recommendation_engine'
+                        '.update_recommendations_cache') as update_cache:
+            services.run_recommendation_refresh(self.reader.pk)
+        update_cache.assert_called_once_with(self.reader.pk)
+        services.toggle_anime_like(self.reader, self.anime)
+        self.assertEqual(self.refresh.call_count, 2)
+
+
+class BulkImportReconcileTests(TransactionTestCase):
+    """批量导入 - 代码块内不触发信号级联，对账后的计数、互动与偏好与逐行信号路径的结果一致"""
+
+    def setUp(self):
+        cache = caches[settings.COUNTER_CACHE_ALIAS]
+        cache.clear()
+        cache.add(counters.FLUSH_DUE_KEY, 1, timeout=None)
+        patcher = mock.patch('anime_rec_system.celery.update_recommendations.apply_async')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_scenario(self, tag):
+        with suspend_signals():
+            anime_type = AnimeType.objects.create(name=f'TV-{tag}')
+            animes = [Anime.objects.create(title=f'{tag}-{n}', type=anime_type, description='x',
+                                           release_date='2020-01-01') for n in range(3)]
+        users = [User.objects.create_user(f'{tag}-{n}', password='x') for n in range(3)]
+        return animes, users
+
+    def write_rows(self, animes, users):
+        """评分(新增/修改/删除)、收藏、动漫点赞、评论与回复、评论点赞、浏览记录"""
+        UserBrowsing.objects.create(user=users[2], anime=animes[2], browse_count=4)
+        rating = UserRating.objects.create(user=users[0], anime=animes[0], rating=4.0)
+        UserRating.objects.create(user=users[1], anime=animes[0], rating=2.0)
+        UserRating.objects.create(user=users[2], anime=animes[2], rating=5.0)
+        rating.rating = 5.0
+        rating.save()
+        UserFavorite.objects.create(user=users[0], anime=animes[1])
+        UserRating.objects.create(user=users[0], anime=animes[1], rating=3.0).delete()
+        AnimeLike.objects.create(user=users[2], anime=animes[0])
+        comment = UserComment.objects.create(user=users[0], anime=animes[0], content='a')
+        reply = UserComment.objects.create(user=users[1], anime=animes[0], content='b',
+                                           is_reply=True, parent_comment=comment)
+        UserLike.objects.create(user=users[1], comment=comment)
+        UserLike.objects.create(user=users[2], comment=comment)
+        return [comment, reply]
+
+    def snapshot(self, animes, users, comments):
+        """按在场景中的序号(而不是主键)汇总冗余字段，便于两份数据对比"""
+        user_index = {user.pk: n for n, user in enumerate(users)}
+        anime_index = {anime.pk: n for n, anime in enumerate(animes)}
+        comment_index = {comment.pk: n for n, comment in enumerate(comments)}
+        return {
+            'anime': [
+                (round(anime.rating_avg, 6), anime.rating_count, anime.like_count, anime.favorite_count)
+                for anime in Anime.objects.filter(pk__in=anime_index).order_by('pk')
+            ],
+            'comment': [
+                (comment.like_count, comment.reply_count)
+                for comment in UserComment.objects.filter(pk__in=comment_index).order_by('pk')
+            ],
+            'profile': [
+                (profile.rating_count, profile.comment_count, profile.replies_count, profile.likes_given_count,
+                 profile.likes_received_count, round(profile.influence_score, 6),
+                 round(profile.social_activity_score, 6))
+                for profile in Profile.objects.filter(user__in=user_index).order_by('user_id')
+            ],
+            'interaction': sorted(
+                (user_index[row.from_user_id], user_index[row.to_user_id], row.interaction_type,
+                 comment_index[row.comment_id], row.strength)
+                for row in UserInteraction.objects.filter(from_user__in=user_index)
+            ),
+            'preference': {
+                (user_index[row.user_id], anime_index[row.anime_id]): round(row.preference_value, 6)
+                for row in UserPreference.objects.filter(user__in=user_index)
+            },
+        }
+
+    def test_reconciled_values_match_signal_path(self):
+        # 逐行信号路径: 提交后回调已执行，回写计数缓冲并折叠分片后得到落库值
+        animes, users = self.create_scenario('signal')
+        comments = self.write_rows(animes, users)
+        counters.flush()
+        fold()
+        expected = self.snapshot(animes, users, comments)
+        self.assertEqual(expected['anime'][0], (3.5, 2, 1, 0))
+        self.assertEqual(len(expected['interaction']), 3)
+
+        # 批量导入: 代码块内不更新任何冗余字段
+        animes, users = self.create_scenario('bulk')
+        with bulk_import(reconcile=False):
+            comments = self.write_rows(animes, users)
+        imported = self.snapshot(animes, users, comments)
+        self.assertEqual(imported['anime'], [(0, 0, 0, 0)] * 3)
+        self.assertEqual(imported['comment'], [(0, 0)] * 2)
+        self.assertEqual(imported['interaction'], [])
+        self.assertEqual(imported['preference'], {})
+        self.assertEqual(counters.pending('anime', [anime.pk for anime in animes], ['like_count']), {})
+        self.assertEqual(totals(anime.pk for anime in animes), {})
+
+        reconcile_aggregates()
+        self.assertEqual(self.snapshot(animes, users, comments), expected)
+
+        # 对账对逐行路径写出的数据不做改动，重复对账不重复补建互动
+        signal_animes = list(Anime.objects.filter(title__startswith='signal-').order_by('pk'))
+        signal_users = list(User.objects.filter(username__startswith='signal-').order_by('pk'))
+        signal_comments = list(UserComment.objects.filter(anime__in=signal_animes).order_by('pk'))
+        self.assertEqual(self.snapshot(signal_animes, signal_users, signal_comments), expected)
+        reconcile_aggregates()
+        self.assertEqual(UserInteraction.objects.count(), 6)
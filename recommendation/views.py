@@ -6,8 +6,10 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 import os
 from anime.models import Anime
+from anime.covers import cover_thumbnail_url
 from .models import RecommendationCache, UserRating
 from .engine.recommendation_engine import recommendation_engine
+from . import counters, services
 from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse
@@ -36,25 +38,10 @@ def toggle_anime_like(request, anime_id):
     """
     try:
         anime = get_object_or_404(Anime, id=anime_id)
-        from recommendation.models import AnimeLike
-        # 检查是否已点赞
-        like, created = AnimeLike.objects.get_or_create(
-            user=request.user,
-            anime=anime
-        )
 
-        if not created:
-            # 已点赞，取消点赞
-            like.delete()
-            action = 'removed'
-            message = '已取消点赞'
-        else:
-            # 新增点赞
-            action = 'added'
-            message = '点赞成功'
-        from recommendation.models import AnimeLike
-        # 获取最新点赞数
-        like_count = AnimeLike.objects.filter(anime=anime).count()
+        # 点赞记录、计数与偏好由写入服务一次完成
+        liked, like_count = services.toggle_anime_like(request.user, anime)
+        action, message = ('added', '点赞成功') if liked else ('removed', '已取消点赞')
 
         return JsonResponse({
             'success': True,
@@ -78,38 +65,16 @@ def toggle_like_comment(request, comment_id):
     try:
         comment = get_object_or_404(UserComment, id=comment_id)
 
-        # 检查用户是否已点赞
-        like, created = UserLike.objects.get_or_create(
-            user=request.user,
-            comment=comment
-        )
-
-        if not created:
-            # 已点赞，取消点赞
-            like.delete()
-
-            # 减少评论点赞计数
-            if comment.like_count > 0:
-                comment.like_count -= 1
-                comment.save(update_fields=['like_count'])
+        # 点赞记录、计数与互动记录由写入服务一次完成，点赞数为 数据库值+未回写增量
+        liked, like_count = services.toggle_comment_like(request.user, comment)
+        action, message = ('added', '点赞成功') if liked else ('removed', '已取消点赞')
 
-            return JsonResponse({
-                'success': True,
-                'action': 'removed',
-                'like_count': comment.like_count,
-                'message': '已取消点赞'
-            })
-        else:
-            # 新增点赞
-            comment.like_count += 1
-            comment.save(update_fields=['like_count'])
-
-            return JsonResponse({
-                'success': True,
-                'action': 'added',
-                'like_count': comment.like_count,
-                'message': '点赞成功'
-            })
+        return JsonResponse({
+            'success': True,
+            'action': action,
+            'like_count': like_count,
+            'message': message
+        })
     except Exception as e:
         logger.error(f"评论点赞操作失败: {str(e)}\n{traceback.format_exc()}")
         return JsonResponse({
@@ -365,7 +330,7 @@ def dashboard_likes_api(request):
                 'animeSlug': like.anime.slug,
                 'animeTitle': like.anime.title,
                 'date': like.timestamp.strftime('%Y-%m-%d %H:%M'),
-                'coverUrl': request.build_absolute_uri(like.anime.cover.url) if like.anime.cover else None
+                'coverUrl': request.build_absolute_uri(cover_thumbnail_url(like.anime.cover, 'card')) if like.anime.cover else None
             })
 
         return JsonResponse({
@@ -478,6 +443,7 @@ def user_activity_dashboard(request):
         # 获取用户评论数据
         user_comments = UserComment.objects.filter(user=request.user).select_related('anime').order_by('-timestamp')[
                         :10]
+        user_comments = counters.apply_pending('comment', user_comments, ['like_count'])
 
         # 转换为JSON格式，用于前端渲染
         ratings_data = []
@@ -517,7 +483,7 @@ def user_activity_dashboard(request):
                     'animeSlug': like.anime.slug,
                     'animeTitle': like.anime.title,
                     'date': like.timestamp.strftime('%Y-%m-%d %H:%M'),
-                    'coverUrl': request.build_absolute_uri(like.anime.cover.url) if like.anime.cover else None
+                    'coverUrl': request.build_absolute_uri(cover_thumbnail_url(like.anime.cover, 'card')) if like.anime.cover else None
                 })
         except Exception as like_error:
             # 记录点赞数据获取失败，但不中断整个仪表盘
@@ -613,7 +579,7 @@ class RecommendationAPIView(APIView):
                     result.append({
                         'id': anime.id,
                         'title': anime.title,
-                        'cover_url': request.build_absolute_uri(anime.cover.url) if anime.cover else None,
+                        'cover_url': request.build_absolute_uri(cover_thumbnail_url(anime.cover, 'card')) if anime.cover else None,
                         'rating': anime.rating_avg,
                         'score': round(score * 100),  # 转换为百分比
                         'url': request.build_absolute_uri(f'/anime/{anime.slug}/')
@@ -739,7 +705,7 @@ def dashboard_seasonal_api(request):
             result.append({
                 'id': anime.id,
                 'title': anime.title,
-                'image': request.build_absolute_uri(anime.cover.url) if anime.cover else None,
+                'image': request.build_absolute_uri(cover_thumbnail_url(anime.cover, 'card')) if anime.cover else None,
                 'slug': anime.slug,
                 'type': anime.type.name if anime.type else None,
                 'release_date': anime.release_date.strftime('%Y-%m-%d') if anime.release_date else None
@@ -862,7 +828,7 @@ def dashboard_similar_api(request):
             result.append({
                 'id': anime.id,
                 'title': anime.title,
-                'image': request.build_absolute_uri(anime.cover.url) if anime.cover else None,
+                'image': request.build_absolute_uri(cover_thumbnail_url(anime.cover, 'card')) if anime.cover else None,
                 'slug': anime.slug,
                 'type': anime.type.name if anime.type else None
             })
@@ -917,7 +883,7 @@ def dashboard_classics_api(request):
             result.append({
                 'id': anime.id,
                 'title': anime.title,
-                'image': request.build_absolute_uri(anime.cover.url) if anime.cover else None,
+                'image': request.build_absolute_uri(cover_thumbnail_url(anime.cover, 'card')) if anime.cover else None,
                 'slug': anime.slug,
                 'type': anime.type.name if anime.type else None,
                 'rating': anime.rating_avg
@@ -1052,28 +1018,8 @@ def heart_rating(request, anime_id):
                 'error': '评分必须在1到5之间'
             }, status=400)
 
-        # 更新或创建评分
-        was_new = False
-        try:
-            user_rating = UserRating.objects.get(user=request.user, anime=anime)
-            old_rating = user_rating.rating
-            user_rating.rating = rating
-            user_rating.save(update_fields=['rating', 'timestamp'])
-        except UserRating.DoesNotExist:
-            UserRating.objects.create(
-                user=request.user,
-                anime=anime,
-                rating=rating
-            )
-            was_new = True
-            old_rating = 0
-
-        # 计算并更新动漫的平均评分
-        from django.db.models import Avg
-        new_avg = UserRating.objects.filter(anime=anime).aggregate(Avg('rating'))['rating__avg'] or 0
-
-        anime.rating_avg = new_avg
-        anime.save(update_fields=['rating_avg'])
+        # 评分服务完成upsert与增量统计，直接返回合并后的平均评分
+        was_new, old_rating, new_avg = services.rate_anime(request.user, anime, rating)
 
         # 返回更新后的信息
         return JsonResponse({
@@ -1081,7 +1027,7 @@ def heart_rating(request, anime_id):
             'message': '评分已提交',
             'rating': rating,
             'was_new': was_new,
-            'old_rating': old_rating,
+            'old_rating': old_rating or 0,
             'new_avg': round(new_avg, 1)
         })
     except Exception as e:
@@ -1128,7 +1074,7 @@ def dashboard_recommendations_api(request):
                 result.append({
                     'id': anime.id,
                     'title': anime.title,
-                    'image': request.build_absolute_uri(anime.cover.url) if anime.cover else None,
+                    'image': request.build_absolute_uri(cover_thumbnail_url(anime.cover, 'card')) if anime.cover else None,
                     'confidence': round(score * 100),
                     'url': f"/anime/{anime.slug}/"
                 })
@@ -1172,6 +1118,7 @@ def dashboard_comments_api(request):
     try:
         # 获取用户评论
         user_comments = UserComment.objects.filter(user=request.user).select_related('anime').order_by('-timestamp')[:10]
+        user_comments = counters.apply_pending('comment', user_comments, ['like_count'])
 
         # 构建响应数据
         comments = []
@@ -2055,27 +2002,8 @@ def add_comment_reply(request, comment_id):
                 'error': '回复内容不能为空'
             }, status=400)
 
-        # 创建新回复
-        reply = UserComment.objects.create(
-            user=request.user,
-            anime=parent_comment.anime,
-            content=content,
-            is_reply=True,
-            parent_comment=parent_comment
-        )
-
-        # 更新父评论的回复计数
-        parent_comment.reply_count = UserComment.objects.filter(parent_comment=parent_comment).count()
-        parent_comment.save(update_fields=['reply_count'])
-
-        # 创建互动记录
-        UserInteraction.objects.create(
-            from_user=request.user,
-            to_user=parent_comment.user,
-            interaction_type='reply',
-            comment=reply,
-            strength=1.2  # 回复互动强度较高
-        )
+        # 创建新回复 - 回复数、档案计数、互动记录与偏好由写入服务一次完成
+        reply = services.add_reply(request.user, parent_comment, content)
 
         # 返回成功响应
         return JsonResponse({
@@ -2522,6 +2450,8 @@ def top_interactive_users(request):
         # 获取用户详细信息
         users_info = []
         user_objects = User.objects.filter(id__in=top_user_ids).select_related('profile')
+        counters.apply_pending('profile', [user.profile for user in user_objects],
+                               ['likes_received_count', 'likes_given_count'])
 
         for user in user_objects:
             # 获取用户的统计数据
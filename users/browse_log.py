@@ -0,0 +1,174 @@
+# users/browse_log.py
+# 浏览事件日志 - 详情页只把(用户, 动漫, 时间)追加到缓存中的顺序槽位，按间隔批量插入 BrowseEvent；
+# 周期任务把事件汇总进 UserBrowsing 的浏览次数/最近浏览时间与动漫浏览数(计数分片)，然后删除已汇总的事件
+
+import logging
+import traceback
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from recommendation.slot_buffer import SlotLog
+
+logger = logging.getLogger('django')
+
+KEY_PREFIX = 'browse'
+FLUSH_LOCK_KEY = f'{KEY_PREFIX}:flush-lock'
+FLUSH_DUE_KEY = f'{KEY_PREFIX}:flush-due'
+ROLLUP_LOCK_KEY = f'{KEY_PREFIX}:rollup-lock'
+
+_slots = SlotLog(KEY_PREFIX)
+
+
+def _cache():
+    # 与计数缓冲共用不淘汰、不过期的缓存
+    return caches[getattr(settings, 'COUNTER_CACHE_ALIAS', 'default')]
+
+
+def _flush_interval():
+    return getattr(settings, 'BROWSE_EVENT_FLUSH_INTERVAL', 10)
+
+
+def record(user_id, anime_id, browsed_at=None):
+    """
+    追加一条浏览事件 - 不访问数据库；缓冲间隔到期时由当前进程顺带批量插入
+
+    缓存不可用时直接插入一条事件，浏览记录不丢失
+    """
+    event = (user_id, anime_id, browsed_at or timezone.now())
+    cache = _cache()
+    try:
+        _slots.append(cache, event)
+    except Exception as e:
+        logger.error(f"浏览事件缓冲失败，直接写库: 用户 {user_id}, 动漫 {anime_id}, 错误: {str(e)}")
+        _insert([event])
+        return
+
+    if cache.add(FLUSH_DUE_KEY, 1, timeout=_flush_interval()):
+        flush()
+
+
+def _insert(events):
+    from users.models import BrowseEvent
+
+    BrowseEvent.objects.bulk_create(
+        [BrowseEvent(user_id=user_id, anime_id=anime_id, browsed_at=browsed_at)
+         for user_id, anime_id, browsed_at in events],
+        batch_size=1000)
+
+
+def _drop_orphans(events):
+    from django.contrib.auth.models import User
+    from anime.models import Anime
+
+    user_ids = set(User.objects.filter(pk__in={event[0] for event in events}).values_list('pk', flat=True))
+    anime_ids = set(Anime.objects.filter(pk__in={event[1] for event in events}).values_list('pk', flat=True))
+    return [event for event in events if event[0] in user_ids and event[1] in anime_ids]
+
+
+def flush():
+    """
+    把缓冲中的浏览事件批量插入 BrowseEvent
+
+    插入成功后才推进游标并删除槽位；失败时事件留在缓冲中，下一轮重试
+
+    Returns:
+        取出的事件数(含因用户/动漫已删除而丢弃的，不含超时跳过的空槽位)
+    """
+    cache = _cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, timeout=60):
+        return 0
+    try:
+        events, end = _slots.read(cache)
+        if not events:
+            _slots.advance(cache, end)
+            return 0
+
+        try:
+            try:
+                with transaction.atomic():
+                    _insert(events)
+            except IntegrityError:
+                # 缓冲期间用户或动漫已被删除 - 丢弃这些事件后重试，避免整批一直卡在缓冲中
+                with transaction.atomic():
+                    _insert(_drop_orphans(events))
+        except Exception as e:
+            logger.error(f"浏览事件写库失败: {str(e)}")
+            logger.error(traceback.format_exc())
+            return 0
+
+        _slots.advance(cache, end)
+        return len(events)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def rollup(chunk_size=5000):
+    """
+    把浏览事件汇总进 UserBrowsing 与动漫浏览数
+
+    按主键区间分块，每块在一个事务内: 分组统计(用户, 动漫)的次数与最近时间 → 已有浏览记录
+    bulk_update累加、缺失的bulk_create → 动漫浏览数写入计数分片 → 删除该块事件
+
+    Returns:
+        {'events': 汇总的事件数, 'records': 更新或创建的浏览记录数}
+    """
+    from anime.counter_shards import add_many
+    from users.models import BrowseEvent, UserBrowsing
+
+    cache = _cache()
+    if not cache.add(ROLLUP_LOCK_KEY, 1, timeout=600):
+        return {'events': 0, 'records': 0}
+    stats = {'events': 0, 'records': 0}
+    try:
+        flush()
+        bounds = BrowseEvent.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        start_id, last_id = (bounds['first'] or 1) - 1, bounds['last']
+        while last_id is not None and start_id < last_id:
+            end_id = min(start_id + chunk_size, last_id)
+            with transaction.atomic():
+                events = BrowseEvent.objects.filter(pk__gt=start_id, pk__lte=end_id)
+                rows = events.order_by().values_list('user_id', 'anime_id').annotate(
+                    count=Count('pk'), last=Max('browsed_at'))
+                pairs = {(user_id, anime_id): (count, last) for user_id, anime_id, count, last in rows}
+
+                if pairs:
+                    views = defaultdict(int)
+                    for (_, anime_id), (count, _) in pairs.items():
+                        views[anime_id] += count
+
+                    missing = dict(pairs)
+                    existing = UserBrowsing.objects.select_for_update().filter(
+                        user_id__in={user_id for user_id, _ in pairs},
+                        anime_id__in={anime_id for _, anime_id in pairs})
+                    updated = []
+                    for record in existing:
+                        key = (record.user_id, record.anime_id)
+                        if key not in missing:
+                            continue
+                        count, last = missing.pop(key)
+                        record.browse_count += count
+                        record.last_browsed = max(record.last_browsed, last)
+                        updated.append(record)
+                    UserBrowsing.objects.bulk_update(updated, ['browse_count', 'last_browsed'], batch_size=1000)
+                    # 新记录的 last_browsed 为 auto_now，取汇总时间(最多晚一个汇总周期)
+                    UserBrowsing.objects.bulk_create(
+                        [UserBrowsing(user_id=user_id, anime_id=anime_id, browse_count=count)
+                         for (user_id, anime_id), (count, _) in missing.items()],
+                        batch_size=1000)
+                    stats['records'] += len(pairs)
+
+                    add_many({anime_id: {'view_count': count} for anime_id, count in views.items()})
+
+                stats['events'] += events.delete()[0]
+            start_id = end_id
+
+        if stats['events']:
+            logger.info(f"浏览事件汇总完成: 事件 {stats['events']} 条, 浏览记录 {stats['records']} 条")
+        return stats
+    finally:
+        cache.delete(ROLLUP_LOCK_KEY)
@@ -0,0 +1,16 @@
+# users/management/commands/rollup_browse_events.py
+from django.core.management.base import BaseCommand
+
+from users.browse_log import rollup
+
+
+class Command(BaseCommand):
+    help = '把浏览事件汇总进浏览记录与动漫浏览数 - 供cron等未启用Celery beat的环境定期调用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='每个事务汇总的事件主键区间')
+
+    def handle(self, *args, **options):
+        stats = rollup(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"浏览事件汇总完成: 事件 {stats['events']} 条, 浏览记录 {stats['records']} 条"))
@@ -0,0 +1,30 @@
+# 浏览事件表 - 详情页只追加事件，周期汇总进浏览记录
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anime', '0004_animecounters'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrowseEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('browsed_at', models.DateTimeField(verbose_name='浏览时间')),
+                ('anime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='browse_events', to='anime.anime', verbose_name='动漫')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='browse_events', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '浏览事件',
+                'verbose_name_plural': '浏览事件列表',
+            },
+        ),
+    ]
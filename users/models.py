@@ -44,6 +44,12 @@ class Profile(TimeStampedModel):
     # 用户影响力（基于获得的点赞、评论和回复）
     influence_score = models.FloatField(default=0, verbose_name="用户影响力")
 
+    # 分数权重 - 计数字段: 权重，calculate_*与批量对账(recommendation.bulk_import)共用
+    # 影响力: 获得点赞 0.5，获得回复 0.8
+    INFLUENCE_WEIGHTS = (('likes_received_count', 0.5), ('comment_count', 0.8))
+    # 社交活跃度: 发出点赞 0.3，发出回复 0.7
+    SOCIAL_ACTIVITY_WEIGHTS = (('likes_given_count', 0.3), ('replies_count', 0.7))
+
     class Meta:
         verbose_name = "用户档案"
         verbose_name_plural = "用户档案列表"
@@ -51,23 +57,40 @@ class Profile(TimeStampedModel):
     def __str__(self):
         return f"{self.user.username}的档案"
 
+    @classmethod
+    def counter_updates(cls, **deltas):
+        """
+        计数增量的UPDATE子句 - 计数与受影响的分数在同一条UPDATE中按F()更新，不读档案
+
+        分数子句排在计数之前: MySQL按从左到右的顺序求值SET子句，
+        分数必须与其他数据库一样基于更新前的计数加增量计算
+        """
+        from django.db.models import F, Value
+        from django.db.models.functions import Greatest
+
+        counts = {
+            field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items() if delta
+        }
+        updates = {}
+        for score, weights in (('influence_score', cls.INFLUENCE_WEIGHTS),
+                               ('social_activity_score', cls.SOCIAL_ACTIVITY_WEIGHTS)):
+            if any(field in counts for field, _ in weights):
+                total = Value(0.0)
+                for field, weight in weights:
+                    total = total + counts.get(field, F(field)) * Value(weight)
+                updates[score] = total
+        updates.update(counts)
+        return updates
+
     def calculate_influence(self):
         """计算用户影响力分数"""
-        # 获得点赞权重：0.5
-        like_factor = self.likes_received_count * 0.5
-        # 获得回复权重：0.8
-        reply_factor = self.comment_count * 0.8
-        # 计算总分
-        self.influence_score = like_factor + reply_factor
+        self.influence_score = sum(getattr(self, field) * weight for field, weight in self.INFLUENCE_WEIGHTS)
         return self.influence_score
     def calculate_social_activity(self):
         """计算社交活跃度"""
-        # 发出点赞权重：0.3
-        likes_given_factor = self.likes_given_count * 0.3
-        # 发出回复权重：0.7
-        replies_factor = self.replies_count * 0.7
-        # 计算总分
-        self.social_activity_score = likes_given_factor + replies_factor
+        self.social_activity_score = sum(
+            getattr(self, field) * weight for field, weight in self.SOCIAL_ACTIVITY_WEIGHTS)
         return self.social_activity_score
 # 使用信号自动创建用户档案
 @receiver(post_save, sender=User)
@@ -107,6 +130,24 @@ class UserBrowsing(TimeStampedModel):
         return f"{self.user.username} - {self.anime.title}"
 
 
+class BrowseEvent(models.Model):
+    """
+    浏览事件：详情页每次访问追加一条，只插入不修改
+    周期任务(users.browse_log.rollup)汇总进浏览记录与动漫浏览数后删除
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='browse_events', verbose_name="用户")
+    anime = models.ForeignKey('anime.Anime', on_delete=models.CASCADE, related_name='browse_events',
+                              verbose_name="动漫")
+    browsed_at = models.DateTimeField(verbose_name="浏览时间")
+
+    class Meta:
+        verbose_name = "浏览事件"
+        verbose_name_plural = "浏览事件列表"
+
+    def __str__(self):
+        return f"{self.user_id} - {self.anime_id} @ {self.browsed_at}"
+
+
 class UserPreference(TimeStampedModel):
     """
     用户偏好：计算用户对特定动漫的综合兴趣度
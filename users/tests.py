@@ -1,3 +1,71 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.test import TestCase
+from django.utils import timezone
+
+from anime.counter_shards import fold
+from anime.models import Anime, AnimeType
+from recommendation.signals import suspend_signals
+from recommendation.slot_buffer import incr
+from users import browse_log
+from users.models import BrowseEvent, UserBrowsing
+
+
+class BrowseLogTests(TestCase):
+    """浏览事件 - 详情页只追加到缓冲，汇总任务一次性更新浏览记录与动漫浏览数"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with suspend_signals():
+            anime_type = AnimeType.objects.create(name='TV')
+            cls.anime = Anime.objects.create(title='Test', type=anime_type, description='x',
+                                             release_date='2020-01-01')
+            cls.user = User.objects.create_user('viewer', password='x')
+
+    def setUp(self):
+        caches[settings.COUNTER_CACHE_ALIAS].clear()
+
+    def test_record_is_buffered_without_queries(self):
+        caches[settings.COUNTER_CACHE_ALIAS].add(browse_log.FLUSH_DUE_KEY, 1, timeout=None)
+        with self.assertNumQueries(0):
+            browse_log.record(self.user.pk, self.anime.pk)
+        self.assertEqual(browse_log.flush(), 1)
+        self.assertEqual(BrowseEvent.objects.count(), 1)
+
+    def test_abandoned_slot_does_not_block_flush(self):
+        cache = caches[settings.COUNTER_CACHE_ALIAS]
+        cache.add(browse_log.FLUSH_DUE_KEY, 1, timeout=None)
+        # 写入方分配槽位号后未写入事件
+        incr(cache, browse_log._slots.seq_key, 1)
+        browse_log.record(self.user.pk, self.anime.pk)
+        self.assertEqual(browse_log.flush(), 0)
+
+        with mock.patch('recommendation.slot_buffer.time.time', return_value=time.time() + 61):
+            self.assertEqual(browse_log.flush(), 1)
+        self.assertEqual(BrowseEvent.objects.count(), 1)
+        self.assertEqual(browse_log.flush(), 0)
+
+    def test_rollup(self):
+        earlier = timezone.now() - timedelta(hours=1)
+        UserBrowsing.objects.create(user=self.user, anime=self.anime, browse_count=2)
+        UserBrowsing.objects.filter(user=self.user).update(last_browsed=earlier)
+        other = User.objects.create_user('other', password='x')
+        for _ in range(3):
+            browse_log.record(self.user.pk, self.anime.pk)
+        browse_log.record(other.pk, self.anime.pk)
+
+        stats = browse_log.rollup()
+        self.assertEqual(stats, {'events': 4, 'records': 2})
+        self.assertFalse(BrowseEvent.objects.exists())
+        record = UserBrowsing.objects.get(user=self.user, anime=self.anime)
+        self.assertEqual(record.browse_count, 5)
+        self.assertGreater(record.last_browsed, earlier)
+        self.assertEqual(UserBrowsing.objects.get(user=other).browse_count, 1)
 
-# Create your tests here.
+        fold()
+        self.assertEqual(Anime.objects.get(pk=self.anime.pk).view_count, 4)